@@ -0,0 +1,3 @@
+from .runner import run
+from .runner import compare
+from .runner import run_case
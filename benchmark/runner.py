@@ -0,0 +1,309 @@
+from logging import getLogger
+from config import SlimeMoldWindowConfig
+from itertools import product
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+import subprocess
+import resource
+import platform
+import json
+import sys
+import os
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+ENGINES = ['gl', 'numpy']
+
+# the fields that identify a case, results of two runs are compared case by case
+CASE_FIELDS = ('engine', 'agents', 'width', 'height', 'species', 'sensor_size', 'workgroup')
+
+# how many steps of a case are timed per pass, in addition to the timed steps
+PROFILED_STEPS = 20
+
+# the root of the repository, the cases are run from there (the config is read from ./config/ini)
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def case_key(case: dict) -> tuple:
+    """identifies a case independent of its results"""
+    return tuple(case[field] for field in CASE_FIELDS)
+
+
+def parse_size(size: str) -> tuple:
+    """'640x360' -> (640, 360)"""
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+
+def parse_workgroup(workgroup: str) -> tuple:
+    """
+    'default' (the group sizes in the shaders), 'tuned' (the WorkgroupSizeTuner)
+    or '<slime>:<blur x>x<blur y>', e.g. '256:16x16' -> ((256, 1), (16, 16))
+    """
+    slime, blur = workgroup.split(':')
+    return (int(slime), 1), parse_size(blur)
+
+
+def peak_memory() -> float:
+    """the peak resident memory of this process in MiB (ru_maxrss is in KiB on linux and in bytes on macos)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def machine() -> dict:
+    """describes the machine that the benchmark runs on"""
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version()
+    }
+
+
+def benchmark_config(case: dict) -> SlimeMoldWindowConfig:
+    """the config of the windows, with the agents, species and sensor size of the case"""
+    config = SlimeMoldWindowConfig()
+    config.number_of_agents = case['agents']
+    config.species_count = case['species']
+    for species in config.species:
+        species.sensor_size = case['sensor_size']
+    config.spawn_seed = 1  # every run starts from the same agents
+    return config
+
+
+"""
+engines
+"""
+
+
+class PassTimer:
+    """
+    Takes the place of the FrameProfiler of a simulation: every pass is timed on the CPU side after ctx.finish(),
+    like the WorkgroupSizeTuner does, timer queries on standalone contexts are not reliable
+    (Mesa llvmpipe reports a constant elapsed time). The passes are serialized, so this is slower than a step.
+    """
+    def __init__(self, ctx) -> None:
+        self.ctx = ctx
+        self.seconds = {}
+
+    @contextmanager
+    def gpu(self, name: str):
+        start = perf_counter()
+        yield
+        self.ctx.finish()
+        self.seconds[name] = self.seconds.get(name, 0.0) + perf_counter() - start
+
+    def cpu(self, name: str):
+        return nullcontext()
+
+
+def run_gl(case: dict, steps: int, frame_time: float) -> dict:
+    """runs a case on a standalone context (the offscreen runner)"""
+    from slime_mold_window.offscreen import OffscreenSlimeMoldRunner
+
+    runner = OffscreenSlimeMoldRunner(benchmark_config(case), (case['width'], case['height']),
+                                      tune_group_sizes=case['workgroup'] == 'tuned')
+    simulation = runner.simulation
+    if case['workgroup'] not in ('default', 'tuned'):
+        simulation.slime_group_size, simulation.blur_group_size = parse_workgroup(case['workgroup'])
+        simulation.load_programs(simulation.shader_directory)
+
+    runner.step(1, frame_time)  # warm up
+    steps_per_second = runner.step(steps, frame_time)
+
+    simulation.profiler = PassTimer(runner.ctx)
+    for _ in range(PROFILED_STEPS):
+        simulation.step(frame_time)
+
+    result = {
+        'renderer': runner.ctx.info['GL_RENDERER'],
+        'group_sizes': {'slime': list(simulation.slime_group_size), 'blur': list(simulation.blur_group_size)},
+        'steps_per_second': steps_per_second,
+        'passes': {name: seconds / PROFILED_STEPS * 1e3 for name, seconds in simulation.profiler.seconds.items()}
+    }
+    runner.release()
+    return result
+
+
+def run_numpy(case: dict, steps: int, frame_time: float) -> dict:
+    """runs a case on the numpy engine, the passes are timed with perf_counter"""
+    from slime_mold_window.numpy_engine import NumpySlimeMoldEngine
+
+    engine = NumpySlimeMoldEngine(benchmark_config(case), (case['width'], case['height']), seed=1)
+    engine.step(frame_time)  # warm up
+    steps_per_second = engine.run(steps, frame_time)
+
+    passes = {'blur': 0.0, 'slime': 0.0}
+    for _ in range(PROFILED_STEPS):
+        start = perf_counter()
+        engine.blur(frame_time)
+        passes['blur'] += perf_counter() - start
+
+        start = perf_counter()
+        engine.move_agents(frame_time)
+        passes['slime'] += perf_counter() - start
+
+    return {
+        'renderer': 'numpy',
+        'steps_per_second': steps_per_second,
+        'passes': {name: seconds / PROFILED_STEPS * 1e3 for name, seconds in passes.items()}
+    }
+
+
+def run_case(case: dict, steps: int, frame_time: float) -> dict:
+    """runs a single case in this process and adds the results to it"""
+    try:
+        result = (run_gl if case['engine'] == 'gl' else run_numpy)(case, steps, frame_time)
+    except Exception as e:  # e.g. no OpenGL 4.3 context on this machine
+        logger.exception(e)
+        result = {'error': f'{type(e).__name__}: {e}'}
+
+    return {**case, **result, 'steps': steps, 'peak_memory_mib': peak_memory()}
+
+
+"""
+benchmark
+"""
+
+
+def run(engines: list, agents: list, sizes: list, species: list, sensor_sizes: list, workgroups: list,
+        steps: int = 100, frame_time: float = 1 / 60) -> dict:
+    """
+    Runs every combination of the given parameters, each case in its own process,
+    so that the peak memory of a case is not inflated by the cases before it.
+    The workgroup configurations only apply to the gl engine.
+    """
+    results = []
+    for engine, agent_count, size, species_count, sensor_size, workgroup in product(
+            engines, agents, sizes, species, sensor_sizes, workgroups):
+        if engine != 'gl' and workgroup != workgroups[0]:
+            continue
+
+        case = {
+            'engine': engine, 'agents': agent_count, 'width': size[0], 'height': size[1],
+            'species': species_count, 'sensor_size': sensor_size,
+            'workgroup': workgroup if engine == 'gl' else 'default'
+        }
+        process = subprocess.run(
+            [sys.executable, '-m', 'benchmark', 'case', json.dumps(case),
+             '--steps', str(steps), '--frame-time', str(frame_time)],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            result = {**case, 'error': process.stderr.strip().splitlines()[-1] if process.stderr else 'crashed'}
+        else:
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+
+        logger.info(f'{result}')
+        print(format_result(result), flush=True)
+        results.append(result)
+
+    return {'created': datetime.now().isoformat(timespec='seconds'), 'machine': machine(), 'results': results}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list:
+    """
+    Compares the results of two runs case by case, returns the regressions:
+    the steps per second dropped or the peak memory grew by more than the threshold (relative).
+    """
+    baseline_results = {case_key(result): result for result in baseline['results'] if 'error' not in result}
+
+    regressions = []
+    for result in current['results']:
+        reference = baseline_results.get(case_key(result))
+        if reference is None:
+            continue
+
+        if 'error' in result:
+            regressions.append((result, 'error', reference['steps_per_second'], None))
+            continue
+
+        if result['steps_per_second'] < reference['steps_per_second'] * (1 - threshold):
+            regressions.append((result, 'steps_per_second', reference['steps_per_second'],
+                                result['steps_per_second']))
+        if result['peak_memory_mib'] > reference['peak_memory_mib'] * (1 + threshold):
+            regressions.append((result, 'peak_memory_mib', reference['peak_memory_mib'], result['peak_memory_mib']))
+
+    return regressions
+
+
+def format_result(result: dict) -> str:
+    """one line per case"""
+    case = f'{result["engine"]:>5} {result["agents"]:>8} agents {result["width"]}x{result["height"]} ' \
+           f'species {result["species"]} sensor {result["sensor_size"]} workgroup {result["workgroup"]}'
+    if 'error' in result:
+        return f'{case}: {result["error"]}'
+
+    passes = ', '.join(f'{name} {milliseconds:.3f} ms' for name, milliseconds in result['passes'].items())
+    return f'{case}: {result["steps_per_second"]:.2f} steps/s ({passes}), peak {result["peak_memory_mib"]:.0f} MiB'
+
+
+def main() -> None:
+    """the command line interface: python -m benchmark run|compare|case"""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='benchmark the slime mold simulation and compare the results')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run every combination of the given parameters')
+    run_parser.add_argument('--engines', nargs='+', default=ENGINES, choices=ENGINES)
+    run_parser.add_argument('--agents', nargs='+', type=int, default=[100000, 1000000])
+    run_parser.add_argument('--sizes', nargs='+', type=parse_size, default=[(640, 360), (1920, 1080)])
+    run_parser.add_argument('--species', nargs='+', type=int, default=[1])
+    run_parser.add_argument('--sensor-sizes', nargs='+', type=int, default=[1])
+    run_parser.add_argument('--workgroups', nargs='+', default=['default'],
+                            help="default, tuned or <slime>:<blur x>x<blur y>, e.g. 256:16x16 (gl only)")
+    run_parser.add_argument('--steps', type=int, default=100)
+    run_parser.add_argument('--frame-time', type=float, default=1 / 60)
+    run_parser.add_argument('--output', default=None, help='write the results to a JSON file')
+    run_parser.add_argument('--baseline', default=None, help='compare the results with a saved run')
+    run_parser.add_argument('--threshold', type=float, default=0.1)
+
+    compare_parser = commands.add_parser('compare', help='flag the regressions of a run against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative, 0.1: 10%%')
+
+    case_parser = commands.add_parser('case', help='run a single case (used by run, one process per case)')
+    case_parser.add_argument('case')
+    case_parser.add_argument('--steps', type=int, default=100)
+    case_parser.add_argument('--frame-time', type=float, default=1 / 60)
+
+    arguments = parser.parse_args()
+
+    if arguments.command == 'case':
+        print(json.dumps(run_case(json.loads(arguments.case), arguments.steps, arguments.frame_time)))
+        sys.exit(0)
+
+    if arguments.command == 'run':
+        current_run = run(arguments.engines, arguments.agents, arguments.sizes, arguments.species,
+                          arguments.sensor_sizes, arguments.workgroups, arguments.steps, arguments.frame_time)
+        if arguments.output is not None:
+            Path(arguments.output).write_text(json.dumps(current_run, indent=4))
+        if arguments.baseline is None:
+            sys.exit(0)
+        baseline_run = json.loads(Path(arguments.baseline).read_text())
+    else:
+        baseline_run = json.loads(Path(arguments.baseline).read_text())
+        current_run = json.loads(Path(arguments.current).read_text())
+
+    found_regressions = compare(baseline_run, current_run, arguments.threshold)
+    for regression_result, metric, before, after in found_regressions:
+        print(f'REGRESSION {format_result(regression_result)}\n    {metric}: {before} -> {after}')
+    print(f'{len(found_regressions)} regression(s), threshold {arguments.threshold:.0%}')
+    sys.exit(1 if found_regressions else 0)
@@ -1,3 +1,5 @@
 from .manager import TextureShaderWindowConfig
+from .manager import TextureShaderConfig
 from .manager import SlimeMoldWindowConfig
 from .manager import MandelbrotSetWindowConfig
+from .manager import WorkgroupSizeConfig
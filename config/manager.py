@@ -1,23 +1,50 @@
-from configparser import ConfigParser
+from configparser import ConfigParser, SectionProxy
+from pathlib import Path
 
 
 class ConfigManager:
     """
     A simple manager created using the configparser module providing some utility functions
     for creating and managing config files.
+    A config file of an earlier version may miss sections and keys, they are filled in from the defaults.
     """
+    # {section: {key: value}}
+    defaults = {}
+
     def __init__(self, path_to_configfile: str = './config/ini/config.ini') -> None:
         """Creates a configparser and reads the config from the given file."""
         self.path_to_configfile = path_to_configfile
         self.config = ConfigParser()
         self.config.read(path_to_configfile, encoding='utf-8')
 
+        self.migrate()
+        self.fill_defaults()
+
+    def migrate(self) -> None:
+        """Converts the sections and keys of a config file of an earlier version (nothing to convert by default)."""
+
+    def fill_defaults(self) -> None:
+        """Adds the sections and keys of the defaults that are missing from the config."""
+        for section, values in self.defaults.items():
+            if not self.config.has_section(section):
+                self.config.add_section(section)
+            for key, value in values.items():
+                if not self.config.has_option(section, key):
+                    self.config[section][key] = value
+
 
 class TextureShaderWindowConfig(ConfigManager):
     """
     Child of the ConfigManager class.
     Provides functions for reading, formatting and saving to the windows main config file.
     """
+    defaults = {
+        'compute_shader': {'directory': 'waves'},
+        'color_fg': {'red': '1.0', 'green': '1.0', 'blue': '1.0'},
+        'color_bg': {'red': '0.0', 'green': '0.0', 'blue': '0.0'},
+        'frame_pacing': {'vsync': 'True', 'fps_cap': '0', 'stutter_factor': '2.5'}
+    }
+
     def __init__(self) -> None:
         """Creates a configparser, reads the config from the given file and formats it."""
         super().__init__(path_to_configfile='./config/ini/texture_shader_window.ini')
@@ -33,6 +60,10 @@ class TextureShaderWindowConfig(ConfigManager):
                            float(self.config['color_bg']['green']),
                            float(self.config['color_bg']['blue']))
 
+        self.frame_pacing_vsync = self.config['frame_pacing'].getboolean('vsync')
+        self.frame_pacing_fps_cap = int(self.config['frame_pacing']['fps_cap'])  # 0: no cap
+        self.frame_pacing_stutter_factor = float(self.config['frame_pacing']['stutter_factor'])  # x the median
+
     def save(self) -> None:
         """Reformats the updated config and writes it to the given file."""
         self.config['compute_shader']['directory'] = self.most_recent_shader_directory
@@ -45,16 +76,104 @@ class TextureShaderWindowConfig(ConfigManager):
         self.config['color_bg']['green'] = str(self.clr_bg_rgb[1])
         self.config['color_bg']['blue'] = str(self.clr_bg_rgb[2])
 
+        self.config['frame_pacing']['vsync'] = str(self.frame_pacing_vsync)
+        self.config['frame_pacing']['fps_cap'] = str(self.frame_pacing_fps_cap)
+        self.config['frame_pacing']['stutter_factor'] = str(self.frame_pacing_stutter_factor)
+
         with open(self.path_to_configfile, 'w') as configfile:
             self.config.write(configfile)
             configfile.close()
 
 
+class TextureShaderConfig(ConfigManager):
+    """
+    Child of the ConfigManager class.
+    Reads the shader.ini of a shader directory of the texture shader window, which declares how it is rendered.
+    A shader directory without a shader.ini is stateful and animated: its compute shader runs every frame.
+    """
+    def __init__(self, shader_directory: Path) -> None:
+        """Creates a configparser, reads the config from the shader directory and formats it."""
+        super().__init__(path_to_configfile=str(Path(shader_directory) / 'shader.ini'))
+
+        # ----------
+
+        if not self.config.has_section('shader'):
+            self.config.add_section('shader')
+
+        # stateless: rendered by direct_fragment_shader.glsl in a single pass, without a texture
+        self.stateless = self.config['shader'].getboolean('stateless', fallback=False)
+        # animated: the image changes with the time, otherwise the compute shader only runs when something changed
+        self.animated = self.config['shader'].getboolean('animated', fallback=True)
+
+
+class SlimeSpeciesConfig:
+    """
+    The parameters of a single slime species, read from and written to a [species_<index>] section.
+    """
+    def __init__(self, section: SectionProxy) -> None:
+        """Reads and formats the section."""
+        self.section = section
+
+        self.clr_rgb = (float(section['red']),
+                        float(section['green']),
+                        float(section['blue']))
+
+        self.movement_speed = float(section['movement_speed'])
+        self.rotation_speed = float(section['rotation_speed'])
+
+        self.sensor_angle = float(section['sensor_angle'])
+        self.sensor_distance = int(section['sensor_distance'])
+        self.sensor_size = int(section['sensor_size'])
+
+    def save(self) -> None:
+        """Reformats the updated values and writes them to the section."""
+        self.section['red'] = str(self.clr_rgb[0])
+        self.section['green'] = str(self.clr_rgb[1])
+        self.section['blue'] = str(self.clr_rgb[2])
+
+        self.section['movement_speed'] = str(self.movement_speed)
+        self.section['rotation_speed'] = str(self.rotation_speed)
+
+        self.section['sensor_angle'] = str(self.sensor_angle)
+        self.section['sensor_distance'] = str(self.sensor_distance)
+        self.section['sensor_size'] = str(self.sensor_size)
+
+
 class SlimeMoldWindowConfig(ConfigManager):
     """
     Child of the ConfigManager class.
     Provides functions for reading, formatting and saving to the windows main config file.
     """
+    # every species deposits into its own channel of the trail map (at most rgba)
+    max_species_count = 4
+    # the trail map holds half or single precision floats
+    trail_precisions = (16, 32)
+
+    # the keys of a [species_<index>] section, a config file of an earlier version had them in [agent]
+    species_keys = ('movement_speed', 'rotation_speed', 'sensor_angle', 'sensor_distance', 'sensor_size')
+    species_colors = ((1.0, 1.0, 1.0), (1.0, 0.3, 0.2), (0.2, 0.6, 1.0), (0.9, 0.9, 0.2))
+
+    defaults = {
+        'compute_shader': {'directory': 'slime normal'},
+        'color_bg': {'red': '0.0', 'green': '0.0', 'blue': '0.0'},
+        'simulation': {'time_step': str(1 / 60), 'substeps': '1'},
+        'agent': {'count': '1000000', 'species_count': '1', 'spawn_layout': 'uniform', 'seed': '0',
+                  'storage': 'float', 'sort_interval': '0'},
+        **{
+            f'species_{index}': {'red': str(red), 'green': str(green), 'blue': str(blue),
+                                 'movement_speed': '0.188', 'rotation_speed': '0.142', 'sensor_angle': '0.835',
+                                 'sensor_distance': '4', 'sensor_size': '1'}
+            for index, (red, green, blue) in enumerate(species_colors)
+        },
+        'blur': {'diffusion_speed': '10.0', 'evaporation_speed': '5.0'},
+        'trail': {'precision': '16', 'palette': 'none'},
+        'checkpoint': {'path': './checkpoints/slime_mold_window.ckpt', 'compression': 'none',
+                       'save_on_close': 'False'},
+        'quality': {'adaptive': 'False', 'target_frame_time': '16.6', 'min_resolution_scale': '0.5',
+                    'max_resolution_scale': '3.0', 'min_agent_fraction': '0.25'},
+        'frame_pacing': {'vsync': 'True', 'fps_cap': '0', 'simulation_only': 'False', 'stutter_factor': '2.5'}
+    }
+
     def __init__(self) -> None:
         """Creates a configparser, reads the config from the given file and formats it."""
         super().__init__(path_to_configfile='./config/ini/slime_mold_window.ini')
@@ -63,49 +182,103 @@ class SlimeMoldWindowConfig(ConfigManager):
 
         self.most_recent_shader_directory = self.config['compute_shader']['directory']
 
-        self.clr_fg_rgb = (float(self.config['color_fg']['red']),
-                           float(self.config['color_fg']['green']),
-                           float(self.config['color_fg']['blue']))
         self.clr_bg_rgb = (float(self.config['color_bg']['red']),
                            float(self.config['color_bg']['green']),
                            float(self.config['color_bg']['blue']))
 
-        self.number_of_agents = int(self.config['agent']['count'])
+        self.simulation_time_step = float(self.config['simulation']['time_step'])
+        self.simulation_substeps = int(self.config['simulation']['substeps'])
 
-        self.slime_movement_speed = float(self.config['agent']['movement_speed'])
-        self.slime_rotation_speed = float(self.config['agent']['rotation_speed'])
+        self.number_of_agents = int(self.config['agent']['count'])
+        self.species_count = int(self.config['agent']['species_count'])
+        self.spawn_layout = self.config['agent']['spawn_layout']
+        self.spawn_seed = int(self.config['agent']['seed'])  # 0: a new seed on every restart
+        self.agent_storage = self.config['agent']['storage']  # float (16 bytes per agent) or packed (8 bytes)
+        self.agent_sort_interval = int(self.config['agent']['sort_interval'])  # 0: the agents are never sorted
 
-        self.slime_sensor_angle = float(self.config['agent']['sensor_angle'])
-        self.slime_sensor_distance = int(self.config['agent']['sensor_distance'])
-        self.slime_sensor_size = int(self.config['agent']['sensor_size'])
+        self.species = [SlimeSpeciesConfig(self.config[f'species_{index}'])
+                        for index in range(self.max_species_count)]
 
         self.blur_diffusion_speed = float(self.config['blur']['diffusion_speed'])
         self.blur_evaporation_speed = float(self.config['blur']['evaporation_speed'])
 
+        self.trail_precision = int(self.config['trail']['precision'])  # 16 or 32 bits per channel
+        self.trail_palette = self.config['trail']['palette']  # none: the colors of the species
+
+        self.checkpoint_path = self.config['checkpoint']['path']
+        self.checkpoint_compression = self.config['checkpoint']['compression']  # none or zlib
+        self.checkpoint_save_on_close = self.config['checkpoint'].getboolean('save_on_close')
+
+        # the adaptive quality controller lowers and raises the resolution, the simulated agents and the substeps
+        self.quality_adaptive = self.config['quality'].getboolean('adaptive')
+        self.quality_target_frame_time = float(self.config['quality']['target_frame_time'])  # ms
+        self.quality_min_resolution_scale = float(self.config['quality']['min_resolution_scale'])
+        self.quality_max_resolution_scale = float(self.config['quality']['max_resolution_scale'])
+        self.quality_min_agent_fraction = float(self.config['quality']['min_agent_fraction'])
+
+        self.frame_pacing_vsync = self.config['frame_pacing'].getboolean('vsync')
+        self.frame_pacing_fps_cap = int(self.config['frame_pacing']['fps_cap'])  # 0: no cap
+        # the simulation runs uncapped, the window is only redrawn a few times per second
+        self.frame_pacing_simulation_only = self.config['frame_pacing'].getboolean('simulation_only')
+        self.frame_pacing_stutter_factor = float(self.config['frame_pacing']['stutter_factor'])  # x the median
+
+    def migrate(self) -> None:
+        """
+        A config file of an earlier version had a single species:
+        its parameters in [agent] and its color in [color_fg] become the first species.
+        """
+        if self.config.has_section('species_0') or not self.config.has_section('agent'):
+            return
+
+        species = {key: self.config['agent'].pop(key) for key in self.species_keys if key in self.config['agent']}
+        if self.config.has_section('color_fg'):
+            species.update(self.config['color_fg'])
+            self.config.remove_section('color_fg')
+        if species:
+            self.config['species_0'] = species
+
     def save(self) -> None:
         """Reformats the updated config and writes it to the given file."""
         self.config['compute_shader']['directory'] = self.most_recent_shader_directory
 
-        self.config['color_fg']['red'] = str(self.clr_fg_rgb[0])
-        self.config['color_fg']['green'] = str(self.clr_fg_rgb[1])
-        self.config['color_fg']['blue'] = str(self.clr_fg_rgb[2])
-
         self.config['color_bg']['red'] = str(self.clr_bg_rgb[0])
         self.config['color_bg']['green'] = str(self.clr_bg_rgb[1])
         self.config['color_bg']['blue'] = str(self.clr_bg_rgb[2])
 
-        self.config['agent']['count'] = str(self.number_of_agents)
+        self.config['simulation']['time_step'] = str(self.simulation_time_step)
+        self.config['simulation']['substeps'] = str(self.simulation_substeps)
 
-        self.config['agent']['movement_speed'] = str(self.slime_movement_speed)
-        self.config['agent']['rotation_speed'] = str(self.slime_rotation_speed)
+        self.config['agent']['count'] = str(self.number_of_agents)
+        self.config['agent']['species_count'] = str(self.species_count)
+        self.config['agent']['spawn_layout'] = self.spawn_layout
+        self.config['agent']['seed'] = str(self.spawn_seed)
+        self.config['agent']['storage'] = self.agent_storage
+        self.config['agent']['sort_interval'] = str(self.agent_sort_interval)
 
-        self.config['agent']['sensor_angle'] = str(self.slime_sensor_angle)
-        self.config['agent']['sensor_distance'] = str(self.slime_sensor_distance)
-        self.config['agent']['sensor_size'] = str(self.slime_sensor_size)
+        for species in self.species:
+            species.save()
 
         self.config['blur']['diffusion_speed'] = str(self.blur_diffusion_speed)
         self.config['blur']['evaporation_speed'] = str(self.blur_evaporation_speed)
 
+        self.config['trail']['precision'] = str(self.trail_precision)
+        self.config['trail']['palette'] = self.trail_palette
+
+        self.config['checkpoint']['path'] = self.checkpoint_path
+        self.config['checkpoint']['compression'] = self.checkpoint_compression
+        self.config['checkpoint']['save_on_close'] = str(self.checkpoint_save_on_close)
+
+        self.config['quality']['adaptive'] = str(self.quality_adaptive)
+        self.config['quality']['target_frame_time'] = str(self.quality_target_frame_time)
+        self.config['quality']['min_resolution_scale'] = str(self.quality_min_resolution_scale)
+        self.config['quality']['max_resolution_scale'] = str(self.quality_max_resolution_scale)
+        self.config['quality']['min_agent_fraction'] = str(self.quality_min_agent_fraction)
+
+        self.config['frame_pacing']['vsync'] = str(self.frame_pacing_vsync)
+        self.config['frame_pacing']['fps_cap'] = str(self.frame_pacing_fps_cap)
+        self.config['frame_pacing']['simulation_only'] = str(self.frame_pacing_simulation_only)
+        self.config['frame_pacing']['stutter_factor'] = str(self.frame_pacing_stutter_factor)
+
         with open(self.path_to_configfile, 'w') as configfile:
             self.config.write(configfile)
             configfile.close()
@@ -116,12 +289,38 @@ class MandelbrotSetWindowConfig(ConfigManager):
     Child of the ConfigManager class.
     Provides functions for reading, formatting and saving to the windows main config file.
     """
+    defaults = {
+        'compute_shader': {'directory': 'mandelbrot'},
+        'view': {'center_x': '-0.5', 'center_y': '0.0', 'zoom_level': '0'},
+        'iteration': {'max_iter': '1000', 'iterations_per_pass': '256', 'budget': '50.0', 'backend': 'gl',
+                      'workers': '0'},
+        'cache': {'memory_limit': '256', 'directory': './cache/mandelbrot_set_window', 'disk_limit': '1024'},
+        'color_fg': {'red': '1.0', 'green': '1.0', 'blue': '1.0'},
+        'color_bg': {'red': '0.0', 'green': '0.0', 'blue': '0.0'}
+    }
+
     def __init__(self) -> None:
         """Creates a configparser, reads the config from the given file and formats it."""
-        super().__init__(path_to_configfile='./config/ini/texture_shader_window.ini')
+        super().__init__(path_to_configfile='./config/ini/mandelbrot_set_window.ini')
 
         # ----------
 
+        self.most_recent_shader_directory = self.config['compute_shader']['directory']
+
+        self.view_center = (float(self.config['view']['center_x']),
+                            float(self.config['view']['center_y']))
+        self.view_zoom_level = int(self.config['view']['zoom_level'])
+
+        self.max_iter = int(self.config['iteration']['max_iter'])
+        self.iterations_per_pass = int(self.config['iteration']['iterations_per_pass'])
+        self.iteration_budget = float(self.config['iteration']['budget'])  # million pixel-iterations per frame
+        self.backend = self.config['iteration']['backend']  # gl (compute shader) or numpy (cpu)
+        self.workers = int(self.config['iteration']['workers'])  # processes of the numpy backend, 0: all cores
+
+        self.cache_memory_limit = int(self.config['cache']['memory_limit'])  # MiB
+        self.cache_directory = self.config['cache']['directory']  # the disk tier, empty: no disk tier
+        self.cache_disk_limit = int(self.config['cache']['disk_limit'])  # MiB
+
         self.clr_fg_rgb = (float(self.config['color_fg']['red']),
                            float(self.config['color_fg']['green']),
                            float(self.config['color_fg']['blue']))
@@ -131,6 +330,22 @@ class MandelbrotSetWindowConfig(ConfigManager):
 
     def save(self) -> None:
         """Reformats the updated config and writes it to the given file."""
+        self.config['compute_shader']['directory'] = self.most_recent_shader_directory
+
+        self.config['view']['center_x'] = repr(self.view_center[0])
+        self.config['view']['center_y'] = repr(self.view_center[1])
+        self.config['view']['zoom_level'] = str(self.view_zoom_level)
+
+        self.config['iteration']['max_iter'] = str(self.max_iter)
+        self.config['iteration']['iterations_per_pass'] = str(self.iterations_per_pass)
+        self.config['iteration']['budget'] = str(self.iteration_budget)
+        self.config['iteration']['backend'] = self.backend
+        self.config['iteration']['workers'] = str(self.workers)
+
+        self.config['cache']['memory_limit'] = str(self.cache_memory_limit)
+        self.config['cache']['directory'] = self.cache_directory
+        self.config['cache']['disk_limit'] = str(self.cache_disk_limit)
+
         self.config['color_fg']['red'] = str(self.clr_fg_rgb[0])
         self.config['color_fg']['green'] = str(self.clr_fg_rgb[1])
         self.config['color_fg']['blue'] = str(self.clr_fg_rgb[2])
@@ -142,3 +357,33 @@ class MandelbrotSetWindowConfig(ConfigManager):
         with open(self.path_to_configfile, 'w') as configfile:
             self.config.write(configfile)
             configfile.close()
+
+
+class WorkgroupSizeConfig(ConfigManager):
+    """
+    Child of the ConfigManager class.
+    Caches the compute shader work group sizes found by the tuner, one section per GL renderer.
+    """
+    def __init__(self) -> None:
+        """Creates a configparser and reads the cached work group sizes from the given file."""
+        super().__init__(path_to_configfile='./config/ini/workgroup_sizes.ini')
+
+    def get_group_size(self, renderer: str, program: str) -> tuple:
+        """Returns the cached work group size of the program on the given renderer or None."""
+        if not self.config.has_option(renderer, program):
+            return None
+
+        return tuple(int(size) for size in self.config[renderer][program].split(','))
+
+    def set_group_size(self, renderer: str, program: str, group_size: tuple) -> None:
+        """Caches the work group size of the program on the given renderer."""
+        if not self.config.has_section(renderer):
+            self.config.add_section(renderer)
+
+        self.config[renderer][program] = ', '.join(str(size) for size in group_size)
+
+    def save(self) -> None:
+        """Writes the cached work group sizes to the given file."""
+        with open(self.path_to_configfile, 'w') as configfile:
+            self.config.write(configfile)
+            configfile.close()
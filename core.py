@@ -1,28 +1,62 @@
+from time import perf_counter
+launcher_start = perf_counter()  # the startup time of the launcher is measured from here
+
 from logger import LogManager
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton
-from multiprocessing import Process
-
-from texture_shader_window import TextureShaderWindow
-from slime_mold_window import SlimeMoldWindow
-from mandelbrot_set_window import MandelbrotSetWindow
+from multiprocessing import get_context
+from importlib import import_module
+import sys
 
 
 """
 logging
 """
 
-# create a logger
+# the logger is created by main(), spawned worker processes import this module as well
 logging = LogManager(logfile_directory='./logger/log')
-logger = logging.init_logger(name=__name__)
-
-logging.remove_old_log_files(remaining=3)
+logger = None
 
 
 """
-application as global variable
+simulations
 """
-application = QApplication([])
+
+# name: (button text, module, window class), the modules are only imported by the worker processes
+SIMULATIONS = {
+    'tsw': ('Texture Shaders', 'texture_shader_window', 'TextureShaderWindow'),
+    'smw': ('Slime Mold Simulation', 'slime_mold_window', 'SlimeMoldWindow'),
+    'mbsw': ('Mandelbrot Set', 'mandelbrot_set_window', 'MandelbrotSetWindow')
+}
+
+# the modules that every simulation window needs, a spare worker imports them while it waits
+PREWARMED_MODULES = ['numpy', 'moderngl', 'moderngl_window', 'moderngl_window.integrations.imgui', 'imgui', 'rendering']
+
+# fresh interpreters instead of forks of the launcher, the Qt application must not be inherited
+process_context = get_context('spawn')
+
+
+def run_worker(connection, logfilename: str, metrics: bool = False) -> None:
+    """
+    A spare worker process: imports the heavy modules and waits for the launcher to hand it a simulation.
+    The simulation module itself is imported after the handoff, so it reads the current config files.
+    With metrics, the per-frame numbers of the simulation are written next to the logfile.
+    """
+    worker_logging = LogManager(logfile_directory='./logger/log')
+    worker_logging.init_logger(name=__name__, logfilename=logfilename, mode='a')
+    for module in PREWARMED_MODULES:
+        import_module(module)
+
+    simulation = connection.recv()  # None: the launcher was closed
+    if simulation is None:
+        return
+
+    if metrics:
+        worker_logging.init_metrics(name=simulation)
+
+    _, module, window_class = SIMULATIONS[simulation]
+    sys.argv = sys.argv[:1]  # the window parses the command line
+    getattr(import_module(module), window_class).run()
 
 
 """
@@ -35,6 +69,7 @@ class VisualSimulationsLauncher(QMainWindow):
         super().__init__(parent)
 
         self.subprocess = None
+        self.spare_worker = None  # (process, connection), ready to run the next simulation
 
         self.setGeometry(0, 0, 854, 480)
         self.setWindowTitle('Visual Simulations Launcher')
@@ -46,88 +81,50 @@ class VisualSimulationsLauncher(QMainWindow):
         self.vbox = QVBoxLayout(self.widget)
         self.vbox.setAlignment(Qt.AlignCenter)
 
-        self.open_ts_window_btn = QPushButton('Texture Shaders', self)
-        self.open_ts_window_btn.setMinimumWidth(200)
-        self.open_ts_window_btn.setMinimumHeight(50)
-        self.open_ts_window_btn.clicked.connect(self.open_ts_window)
-        self.vbox.addWidget(self.open_ts_window_btn)
-
-        self.open_sm_window_btn = QPushButton('Slime Mold Simulation', self)
-        self.open_sm_window_btn.setMinimumWidth(200)
-        self.open_sm_window_btn.setMinimumHeight(50)
-        self.open_sm_window_btn.clicked.connect(self.open_sm_window)
-        self.vbox.addWidget(self.open_sm_window_btn)
-
-        self.open_mbs_window_btn = QPushButton('Mandelbrot Set', self)
-        self.open_mbs_window_btn.setMinimumWidth(200)
-        self.open_mbs_window_btn.setMinimumHeight(50)
-        self.open_mbs_window_btn.clicked.connect(self.open_mbs_window)
-        self.vbox.addWidget(self.open_mbs_window_btn)
+        self.buttons = {}
+        for simulation, (text, _, _) in SIMULATIONS.items():
+            button = QPushButton(text, self)
+            button.setMinimumWidth(200)
+            button.setMinimumHeight(50)
+            button.clicked.connect(lambda checked, name=simulation: self.open_simulation(name))
+            self.vbox.addWidget(button)
+            self.buttons[simulation] = button
 
         self.setCentralWidget(self.widget)
 
-    def open_ts_window(self) -> None:
-        if self.subprocess:
-            self.subprocess.terminate()
-
-            if self.subprocess.name == 'smw':
-                self.open_sm_window_btn.setText('Slime Mold Simulation')
-                self.open_sm_window_btn.setEnabled(True)
-
-            else:
-                self.open_mbs_window_btn.setText('Mandelbrot Set')
-                self.open_mbs_window_btn.setEnabled(True)
-
-        self.subprocess = Process(name='tsw', target=TextureShaderWindow.run, args=())
-        self.subprocess.start()
+    def start_spare_worker(self) -> None:
+        """start a worker process in the background, it is handed the next simulation"""
+        receiving_connection, sending_connection = process_context.Pipe(duplex=False)
+        process = process_context.Process(target=run_worker,
+                                          args=(receiving_connection, logging.logfilename, '--metrics' in sys.argv))
+        process.start()
+        self.spare_worker = process, sending_connection
 
-        self.open_ts_window_btn.setText('Currently Running')
-        self.open_ts_window_btn.setDisabled(True)
-
-        # application.closeAllWindows()  # close the launcher
-        # application.exit(0)
-
-    def open_sm_window(self) -> None:
+    def open_simulation(self, simulation: str) -> None:
+        """run the given simulation in the spare worker (the running simulation is terminated)"""
         if self.subprocess:
             self.subprocess.terminate()
 
-            if self.subprocess.name == 'tsw':
-                self.open_ts_window_btn.setText('Texture Shaders')
-                self.open_ts_window_btn.setEnabled(True)
-
-            else:
-                self.open_mbs_window_btn.setText('Mandelbrot Set')
-                self.open_mbs_window_btn.setEnabled(True)
-
-        self.subprocess = Process(name='smw', target=SlimeMoldWindow.run, args=())
-        self.subprocess.start()
-
-        self.open_sm_window_btn.setText('Currently Running')
-        self.open_sm_window_btn.setDisabled(True)
-
-        # application.closeAllWindows()  # close the launcher
-        # application.exit(0)
-
-    def open_mbs_window(self) -> None:
-        if self.subprocess:
-            self.subprocess.terminate()
+            self.buttons[self.subprocess.name].setText(SIMULATIONS[self.subprocess.name][0])
+            self.buttons[self.subprocess.name].setEnabled(True)
 
-            if self.subprocess.name == 'tsw':
-                self.open_ts_window_btn.setText('Texture Shaders')
-                self.open_ts_window_btn.setEnabled(True)
+        if self.spare_worker is None or not self.spare_worker[0].is_alive():
+            self.start_spare_worker()
+        process, connection = self.spare_worker
+        connection.send(simulation)
+        process.name = simulation
+        self.subprocess = process
 
-            else:
-                self.open_sm_window_btn.setText('Slime Mold Simulation')
-                self.open_sm_window_btn.setEnabled(True)
+        self.start_spare_worker()  # warm up the next one
 
-        self.subprocess = Process(name='mbsw', target=MandelbrotSetWindow().run, args=())
-        self.subprocess.start()
+        self.buttons[simulation].setText('Currently Running')
+        self.buttons[simulation].setDisabled(True)
 
-        self.open_mbs_window_btn.setText('Currently Running')
-        self.open_mbs_window_btn.setDisabled(True)
-
-        # application.closeAllWindows()  # close the launcher
-        # application.exit(0)
+    def closeEvent(self, event) -> None:
+        """let the spare worker exit (a running simulation stays open)"""
+        if self.spare_worker is not None:
+            self.spare_worker[1].send(None)
+        super().closeEvent(event)
 
 
 """
@@ -135,7 +132,26 @@ executing
 """
 
 
-if __name__ == '__main__':
+def main() -> None:
+    global logger
+    logger = logging.init_logger(name=__name__)
+    logging.remove_old_log_files(remaining=3)
+
+    application = QApplication([])
     window = VisualSimulationsLauncher()
     window.show()
+
+    def started() -> None:  # the first iteration of the event loop: the launcher is on screen
+        logger.info(f'launcher started in {perf_counter() - launcher_start:.3f} s')
+        if '--startup-time' in sys.argv:  # measure the startup only
+            print(f'{perf_counter() - launcher_start:.3f}')
+            application.quit()
+            return
+        window.start_spare_worker()
+
+    QTimer.singleShot(0, started)
     application.exec()
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,4 @@
 from .manager import LogManager
+from .manager import RepeatFilter
+from .metrics import MetricsChannel
+from .metrics import get_metrics
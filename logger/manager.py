@@ -1,6 +1,12 @@
 import logging.config
+from logging.handlers import QueueHandler, QueueListener
+from .metrics import MetricsChannel, set_metrics
 from os import walk, remove
+from pathlib import Path
+from queue import SimpleQueue
+from time import monotonic
 from datetime import datetime
+import atexit
 
 
 """
@@ -28,10 +34,54 @@ report suppressed errors without raising exceptions:
     logger.error() or
     logger.exception() or
     logger.critical()
+
+report per-frame numbers (frame times, step counts):
+    get_metrics().record()
 ----------
 """
 
 
+"""
+filters
+"""
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Rate limits repeated records, e.g. an error that is logged every frame after a shader swap.
+    Records are repeated if they come from the same line with the same level and message (template).
+    The first `burst` records within `interval` seconds pass, the rest are counted and dropped.
+    The first repeat after the interval passes with the number of dropped records appended.
+    """
+    def __init__(self, interval: float = 10.0, burst: int = 1) -> None:
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.repeats = {}  # key: [start of the interval, records in the interval, dropped records]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = record.name, record.levelno, record.pathname, record.lineno, str(record.msg)
+        now = monotonic()
+        repeat = self.repeats.get(key)
+        if repeat is None or now - repeat[0] >= self.interval:
+            if repeat is not None and repeat[2]:
+                record.msg = f'{record.getMessage()} (repeated {repeat[2]} more times in {now - repeat[0]:.0f} s)'
+                record.args = None
+            self.repeats[key] = [now, 1, 0]
+            return True
+
+        repeat[1] += 1
+        if repeat[1] <= self.burst:
+            return True
+        repeat[2] += 1
+        return False
+
+
+"""
+manager
+"""
+
+
 class LogManager:
     """
     A simple manager created using the logging module providing some utility functions
@@ -39,43 +89,95 @@ class LogManager:
     """
     def __init__(self, logfile_directory: str = './logger/log') -> None:
         self.logfile_directory = logfile_directory
+        self.logfilename = None
         self.logger = None
+        self.listener = None
+        self.metrics = None
+
+    def init_logger(self, name: str = __name__, logfilename: str = None, mode: str = 'w',
+                    asynchronous: bool = True) -> logging.Logger:
+        """
+        Initializes a logger.
+        By default, a new logfile is created. Child processes can append to the logfile of their parent instead.
+        Asynchronous: the handlers of logging.ini run on a listener thread, logging a record only puts it into a
+        queue (the render loops never wait for the console or the disk). Repeated records are rate limited.
+        """
+        self.logfilename = logfilename if logfilename is not None \
+            else f'./logger/log/{datetime.now().strftime("%Y-%m-%d_-_%H-%M-%S")}.log'
 
-    def init_logger(self, name: str = __name__) -> logging.Logger:
-        """Initializes a logger."""
         logging.config.fileConfig(
             'logger/logging.ini',
             encoding='utf-8',
             defaults={
-                'logfilename':
-                    f'./logger/log/{datetime.now().strftime("%Y-%m-%d_-_%H-%M-%S")}.log'
+                'logfilename': self.logfilename,
+                'logfilemode': mode
             }
         )
 
+        if asynchronous:
+            self.start_listener()
+
         self.logger = logging.getLogger(name)
         return self.logger
 
+    def start_listener(self) -> None:
+        """move the handlers of the configured loggers behind a queue that is emptied by a listener thread"""
+        loggers = [logging.getLogger()] + [
+            logger for logger in logging.Logger.manager.loggerDict.values()
+            if isinstance(logger, logging.Logger) and logger.handlers
+        ]
+        handlers = list(dict.fromkeys(handler for logger in loggers for handler in logger.handlers))
+
+        queue = SimpleQueue()
+        queue_handler = QueueHandler(queue)
+        queue_handler.addFilter(RepeatFilter())
+        for logger in loggers:
+            logger.handlers = [queue_handler]
+
+        self.listener = QueueListener(queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop_listener)  # write the queued records before the process exits
+
+    def stop_listener(self) -> None:
+        """write the queued records and stop the listener thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def init_metrics(self, name: str = 'main', format_: str = 'jsonl') -> MetricsChannel:
+        """
+        Opens the metrics channel of this process (see get_metrics()) next to the logfile,
+        <logfile>.<name>.metrics.jsonl or .csv, e.g. one per simulation of a session.
+        """
+        self.metrics = MetricsChannel(Path(self.logfilename).with_suffix(f'.{name}.metrics.{format_}'), format_)
+        set_metrics(self.metrics)
+        atexit.register(self.metrics.close)
+        return self.metrics
+
+    def logfile_path(self, logfile: str) -> str:
+        return f'{self.logfile_directory.rstrip("/")}/{logfile}'
+
+    def remove_log_files(self, logfiles: list) -> None:
+        """remove the given logfiles and the metrics files of their sessions"""
+        files = next(walk(self.logfile_directory), (None, None, []))[2]
+        for logfile in logfiles:
+            remove(self.logfile_path(logfile))
+            session = Path(logfile).stem
+            for file in files:
+                if file.startswith(f'{session}.') and '.metrics.' in file:
+                    remove(self.logfile_path(file))
+
     def remove_old_log_files(self, remaining: int = 3) -> None:
-        """Leave x logfiles in the logfile directory, remove the rest."""
-        logfiles = list(filter(lambda file: file.endswith('.log'),
-                               next(walk(self.logfile_directory), (None, None, []))[2]))
+        """Leave x logfiles in the logfile directory, remove the rest (the oldest)."""
+        logfiles = sorted(filter(lambda file: file.endswith('.log'),
+                                 next(walk(self.logfile_directory), (None, None, []))[2]))
 
         if len(logfiles) > remaining:
-            for logfile in logfiles[0:len(logfiles) - remaining]:
-                remove(
-                    self.logfile_directory if self.logfile_directory.endswith("/")
-                    else f"{self.logfile_directory}/"
-                         + logfile
-                )
+            self.remove_log_files(logfiles[0:len(logfiles) - remaining])
 
     def remove_all_log_files(self) -> None:
         """Remove all logfiles from the logfile directory."""
         logfiles = list(filter(lambda file: file.endswith('.log'),
                                next(walk(self.logfile_directory), (None, None, []))[2]))
 
-        for logfile in logfiles:
-            remove(
-                self.logfile_directory if self.logfile_directory.endswith("/")
-                else f"{self.logfile_directory}/"
-                     + logfile
-            )
+        self.remove_log_files(logfiles)
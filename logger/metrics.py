@@ -0,0 +1,115 @@
+from logging import getLogger
+from queue import Queue, Full
+from threading import Thread
+from pathlib import Path
+from time import perf_counter
+import json
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+metrics
+"""
+
+
+# the number of records that can wait for the writer thread, further records are dropped
+METRICS_QUEUE_SIZE = 4096
+
+# the formats of the metrics files
+METRICS_FORMATS = ('jsonl', 'csv')
+
+
+class MetricsChannel:
+    """
+    A cheap structured channel for per-frame numbers (frame times, step counts, ...), separate from the log.
+    record() only puts a tuple into a bounded queue, a writer thread formats the records and writes them to
+    a JSON lines or CSV file. Nothing on the calling thread touches the disk, and if the writer falls behind,
+    records are dropped (and counted) instead of stalling the caller.
+    Records are appended to the file (or replace it), the CSV columns are defined by the first record of an empty file.
+    """
+    def __init__(self, path: Path, format_: str = 'jsonl', append: bool = True) -> None:
+        """Opens the file and starts the writer thread."""
+        if format_ not in METRICS_FORMATS:
+            raise ValueError(f'unknown metrics format {format_}, expected one of {METRICS_FORMATS}')
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.format = format_
+        self.columns = None
+
+        self.queue = Queue(maxsize=METRICS_QUEUE_SIZE)
+        self.dropped = 0
+        self.start = perf_counter()
+
+        self.file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+        self.thread = Thread(target=self.write_records, name=f'metrics {self.path.name}', daemon=True)
+        self.thread.start()
+
+    def record(self, channel: str, **values) -> None:
+        """queue a record: the name of the channel and its values (numbers or strings)"""
+        try:
+            self.queue.put_nowait((perf_counter() - self.start, channel, values))
+        except Full:
+            self.dropped += 1
+
+    def write_records(self) -> None:
+        """runs on the writer thread until close() queues None"""
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+
+            time, channel, values = record
+            if self.format == 'jsonl':
+                self.file.write(json.dumps({'time': round(time, 6), 'channel': channel, **values}) + '\n')
+            else:
+                if self.columns is None:
+                    self.columns = list(values)
+                    if self.file.tell() == 0:
+                        self.file.write('time,channel,' + ','.join(self.columns) + '\n')
+                self.file.write(f'{time:.6f},{channel},' +
+                                ','.join(str(values.get(column, '')) for column in self.columns) + '\n')
+
+    def close(self) -> None:
+        """write the remaining records and close the file, the dropped records are logged"""
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+        if self.dropped:
+            logger.warning('%d records were dropped, because the writer of %s could not keep up',
+                           self.dropped, self.path)
+
+
+class NullMetricsChannel:
+    """the channel of a process without a metrics file: records are discarded"""
+    path = None
+    dropped = 0
+
+    def record(self, channel: str, **values) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# the metrics channel of this process, opened by LogManager.init_metrics()
+metrics_channel = NullMetricsChannel()
+
+
+def get_metrics():
+    """the metrics channel of this process (it discards the records if there is no metrics file)"""
+    return metrics_channel
+
+
+def set_metrics(channel) -> None:
+    global metrics_channel
+    metrics_channel = channel
@@ -1 +1,9 @@
-from .mandelbrot_set_window import MandelbrotSetWindow
+from .tile_cache import TileCache
+
+
+def __getattr__(name: str):
+    """the window is imported when it is first used, the worker processes of the numpy engine do not need it"""
+    if name == 'MandelbrotSetWindow':
+        from .mandelbrot_set_window import MandelbrotSetWindow
+        return MandelbrotSetWindow
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,5 +1,20 @@
 from logging import getLogger
 from config import MandelbrotSetWindowConfig
+from logger import get_metrics
+from rendering import group_size_defines, group_count, DEFAULT_GROUP_SIZE_2D
+from rendering import ProgramCache, enable_driver_shader_cache
+from .numpy_engine import NumpyMandelbrotEngine, palette
+from .tile_cache import TileCache
+from pathlib import Path
+from os import walk
+from math import ceil
+import struct
+import numpy
+import moderngl as mgl
+from moderngl_window import WindowConfig
+import moderngl_window.integrations.imgui
+from moderngl_window.geometry import quad_fs
+import imgui
 
 
 """
@@ -18,20 +33,464 @@ config
 # read and format the config
 config = MandelbrotSetWindowConfig()
 
+# the driver keeps the compiled programs on disk across launches (it reads this when the context is created)
+enable_driver_shader_cache()
+
+# gl: the compute shader, numpy: the tiled cpu engine (a process pool)
+BACKENDS = ['gl', 'numpy']
+
 
 """
 rendering and gui
 """
 
 
-class MandelbrotSetWindow:
-    def __init__(self) -> None:
-        pass
+class MandelbrotSetWindow(WindowConfig):
+    title = 'Visual Simulations - Mandelbrot Set'
+    gl_version = (4, 3)
+
+    window_size = (1440, 720)
+    aspect_ratio = None
+
+    resource_dir = (Path(__file__).parent / 'shader').resolve()
+    # get a list of all the available shaders in the resource dir
+    shader_dirs = list(next(walk(resource_dir), ([], None, None))[1])
+
+    # progressive refinement: every level computes one pixel per block and fills the block, coarse to fine
+    block_sizes = (8, 4, 2, 1)
+    # the size of a pixel in the complex plane at zoom level 0, every zoom level is a factor of 2^(1/4)
+    base_pixel_size = 3.0 / 720
+    # below this pixel size, single precision can not tell neighbouring pixels apart anymore
+    double_precision_threshold = 1e-6
+
+    def __init__(self, **kwargs) -> None:
+        """initialization"""
+        super().__init__(**kwargs)
+
+        # initialize imgui context
+        imgui.create_context()
+        # initialize a renderer for rendering the imgui elements in the moderngl-window window
+        self.imgui_renderer = moderngl_window.integrations.imgui.ModernglWindowRenderer(self.wnd)
+
+        # the texture follows the size of the window, one pixel per texel
+        self.texture_dimensions = self.wnd.buffer_size
+        self.displayed_texture = None
+        self.iteration_texture = None  # the smooth iteration counts, read from and written to the tile cache
+        self.framebuffer = None
+        self.buffer_state = None  # the state of the iteration of every pixel
+        self.buffer_active = self.ctx.buffer(reserve=4)  # the number of pixels that are still iterating
+
+        # per-frame numbers, written by a background thread (discarded if the process has no metrics file)
+        self.metrics = get_metrics()
+        self.create_textures()
+
+        # quad fragments
+        self.quad_fs = quad_fs()
+
+        self.group_size = DEFAULT_GROUP_SIZE_2D
+        self.use_double = self.pixel_size < self.double_precision_threshold
+
+        self.texture_renderer = None
+        self.compute_shader = None
+        self.programs = ProgramCache(self.ctx, self.resource_dir)
+        self.load_programs(config.most_recent_shader_directory)
+
+        # compile the programs of every shader directory over the next frames, switching between them is instant then
+        for shader_dir in self.shader_dirs:
+            self.precompile_programs(shader_dir)
+
+        # computed tiles, a view is assembled from the cache first and only the missing tiles are computed
+        self.cache = TileCache(memory_limit=config.cache_memory_limit * 2 ** 20,
+                               directory=config.cache_directory or None,
+                               disk_limit=config.cache_disk_limit * 2 ** 20)
+        self.view_origin = (0, 0)  # the global pixel of the bottom left pixel of the view
+        self.missing_tiles = []  # the rectangles of the view that are computed
+
+        self.engine = None  # the cpu backend
+        self.select_backend(config.backend)
+
+        # progress of the refinement
+        self.level_index = 0
+        self.pass_index = 0
+        self.finished = False
+        self.check_active = False  # whether the active counter of the last pass is worth reading
+
+        self.mouse_position = (0, 0)
+        self.restart()
+
+    def create_textures(self) -> None:
+        """(re)create the texture and the state buffer with the size of the window"""
+        if self.displayed_texture is not None:
+            self.framebuffer.release()
+            self.displayed_texture.release()
+            self.iteration_texture.release()
+            self.buffer_state.release()
+
+        self.displayed_texture = self.ctx.texture(self.texture_dimensions, 4)
+        self.displayed_texture.repeat_x, self.displayed_texture.repeat_y = False, False
+        self.displayed_texture.filter = mgl.NEAREST, mgl.NEAREST
+        self.framebuffer = self.ctx.framebuffer(color_attachments=[self.displayed_texture])
+        self.iteration_texture = self.ctx.texture(self.texture_dimensions, 1, dtype='f4')
+
+        # State struct: 32 bytes in double precision (dvec2 z, float iteration, float done, padding), 16 in single
+        self.buffer_state = self.ctx.buffer(reserve=self.texture_dimensions[0] * self.texture_dimensions[1] * 32)
+
+    def load_programs(self, shader_dir: str) -> None:
+        """load the programs of the given shader directory"""
+        # textured quad rendering
+        self.texture_renderer = self.programs.program(
+            f'{shader_dir}/vertex_shader.glsl',
+            f'{shader_dir}/fragment_shader.glsl'
+        )
+
+        # compute shader
+        self.compute_shader = self.programs.compute_shader(
+            f'{shader_dir}/compute_shader.glsl',
+            self.compute_shader_defines(self.use_double)
+        )
+
+    def compute_shader_defines(self, use_double: bool) -> dict:
+        """the defines of the compute shader"""
+        return {
+            'use_double': int(use_double),
+            **group_size_defines(self.group_size)
+        }
+
+    def precompile_programs(self, shader_dir: str) -> None:
+        """queue the programs of a shader directory in the program cache, in both precisions"""
+        self.programs.precompile_program(f'{shader_dir}/vertex_shader.glsl', f'{shader_dir}/fragment_shader.glsl')
+        for use_double in (False, True):
+            self.programs.precompile_compute_shader(f'{shader_dir}/compute_shader.glsl',
+                                                    self.compute_shader_defines(use_double))
+
+    def select_backend(self, backend: str) -> None:
+        """switch between the compute shader and the cpu engine"""
+        config.backend = backend
+        if backend == 'numpy' and self.engine is None:
+            self.engine = NumpyMandelbrotEngine(self.texture_dimensions, config.workers or None)
+            logger.info(f'rendering on {self.engine.workers} cpu worker(s)')
+        elif backend != 'numpy' and self.engine is not None:
+            self.engine.release()
+            self.engine = None
+
+    @property
+    def pixel_size(self) -> float:
+        """the size of a pixel in the complex plane"""
+        return self.base_pixel_size * 2 ** (-config.view_zoom_level / 4)
+
+    def restart(self) -> None:
+        """start the refinement from the coarsest level (called whenever the view or the parameters change)"""
+        use_double = self.pixel_size < self.double_precision_threshold
+        if use_double != self.use_double:
+            self.use_double = use_double
+            self.load_programs(config.most_recent_shader_directory)
+            logger.info(f'iterating in {"double" if use_double else "single"} precision')
+
+        # the view sits on the pixel grid of its zoom level, so its tiles line up with the cached ones
+        pixel_size = self.pixel_size
+        width, height = self.texture_dimensions
+        self.view_origin = (round(config.view_center[0] / pixel_size - width / 2),
+                            round(config.view_center[1] / pixel_size - height / 2))
+        config.view_center = ((self.view_origin[0] + width / 2) * pixel_size,
+                              (self.view_origin[1] + height / 2) * pixel_size)
+
+        # draw the cached tiles right away
+        known, self.missing_tiles = self.cache.read_view(config.view_zoom_level, config.max_iter,
+                                                         self.view_origin, self.texture_dimensions)
+        self.iteration_texture.write(known)
+        self.displayed_texture.write(palette(known, config.clr_fg_rgb, config.clr_bg_rgb))
+
+        self.level_index = 0
+        self.pass_index = 0
+        self.finished = not self.missing_tiles
+        self.check_active = False
+
+        if self.engine is not None:
+            if self.finished:
+                self.engine.cancel()
+            else:
+                self.engine.submit(config.view_center, pixel_size, config.max_iter, known, self.missing_tiles)
+
+    def store_view(self, view: numpy.ndarray) -> None:
+        """store the computed tiles of a finished view in the cache"""
+        self.cache.write_view(config.view_zoom_level, config.max_iter, self.view_origin, view, self.missing_tiles)
+
+    def next_level(self) -> None:
+        """continue with the next finer level"""
+        self.level_index += 1
+        self.pass_index = 0
+        self.check_active = False
+        self.finished = self.level_index >= len(self.block_sizes)
+
+    # ----------
+    # rendering
+    # ----------
+
+    def render(self, time: float, frame_time: float) -> None:
+        """called every frame - render everything"""
+        self.programs.precompile_next()
+
+        self.render_mandelbrot_frame()
+        self.render_ui_frame()
+        self.metrics.record('frame', frame_time=frame_time, finished=self.finished)
+
+    # ----------
+    # rendering: mandelbrot set
+    # ----------
+
+    def render_mandelbrot_frame(self) -> None:
+        """continue the refinement within the iteration budget of a frame and render the texture"""
+        # clear screen (background color)
+        self.ctx.clear(*config.clr_bg_rgb)
+
+        if not self.finished:
+            if self.engine is not None:
+                self.upload_engine_tiles()
+            else:
+                self.run_passes()
+
+        # render texture
+        self.displayed_texture.use(location=0)
+        self.quad_fs.render(self.texture_renderer)
+
+    def run_passes(self) -> None:
+        """
+        Every pass continues the iteration of the unfinished pixels of the current level by iterations_per_pass.
+        Passes are run until the iteration budget of the frame is used up, so every frame takes about the same time,
+        independent of max_iter. A level is finished after max_iter iterations or once no pixel is active anymore.
+        """
+        # the counter belongs to the last pass of the previous frame, reading it does not stall the GPU anymore
+        if self.check_active and struct.unpack('I', self.buffer_active.read())[0] == 0:
+            self.next_level()
+
+        budget = config.iteration_budget * 1e6
+        passes_per_level = ceil(config.max_iter / config.iterations_per_pass)
+
+        self.displayed_texture.bind_to_image(0, read=False, write=True)
+        self.buffer_state.bind_to_storage_buffer(1)
+        self.buffer_active.bind_to_storage_buffer(2)
+        self.iteration_texture.bind_to_image(3, read=True, write=True)
+
+        self.compute_shader['center'] = config.view_center
+        self.compute_shader['pixel_size'] = self.pixel_size
+        self.compute_shader['iterations'] = config.iterations_per_pass
+        self.compute_shader['max_iter'] = config.max_iter
+        self.compute_shader['clr_fg'] = config.clr_fg_rgb
+        self.compute_shader['clr_bg'] = config.clr_bg_rgb
+
+        while not self.finished and budget > 0:
+            block_size = self.block_sizes[self.level_index]
+            blocks = ceil(self.texture_dimensions[0] / block_size), ceil(self.texture_dimensions[1] / block_size)
+
+            self.compute_shader['block_size'] = block_size
+            self.compute_shader['first_level'] = self.level_index == 0
+            self.compute_shader['first_pass'] = self.pass_index == 0
+
+            self.buffer_active.write(struct.pack('I', 0))
+            self.compute_shader.run(*group_count(blocks, self.group_size), 1)
+            self.ctx.memory_barrier()  # the next pass continues the states of this pass
+
+            budget -= blocks[0] * blocks[1] * config.iterations_per_pass
+            self.pass_index += 1
+            self.check_active = True
+            if self.pass_index >= passes_per_level:
+                self.next_level()
+
+        if self.finished:
+            width, height = self.texture_dimensions
+            self.store_view(numpy.frombuffer(self.iteration_texture.read(), dtype=numpy.float32).reshape(height, width))
+
+    def upload_engine_tiles(self) -> None:
+        """show the tiles that the cpu engine has finished so far"""
+        self.finished = self.engine.finished  # before the upload, the last tiles must not be missed
+        self.displayed_texture.write(self.engine.colors(config.clr_fg_rgb, config.clr_bg_rgb))
+        if self.finished:
+            self.store_view(self.engine.iterations)
+
+    # ----------
+    # rendering: imgui ui
+    # ----------
+
+    def render_ui_frame(self) -> None:
+        """create and render rhe ui"""
+        # start new imgui frame context
+        imgui.new_frame()
+
+        # open new window context
+        if imgui.begin('COMPUTE SHADERS'):
+            imgui.push_item_width(imgui.get_window_width() * 0.75)  # max item with: 75% of the window from the left
+
+            visible = True
+            expanded, visible = imgui.collapsing_header('Select a compute shader.', visible)
+            if expanded:  # create a button for every available compute shader
+                for shader_dir in self.shader_dirs:
+                    if imgui.button(shader_dir, -1, 25):  # load the compute shader if the button is clicked
+                        if config.most_recent_shader_directory != shader_dir:  # change the most recent shader dir
+                            config.most_recent_shader_directory = shader_dir   # to the selected shader dir
+
+                        self.load_programs(shader_dir)
+                        self.restart()
+
+            imgui.pop_item_width()
+            imgui.end()  # close current window context
+
+        if imgui.begin('VIEW'):
+            imgui.push_item_width(imgui.get_window_width() * 0.75)
+
+            imgui.text(f'Center: {config.view_center[0]:.15g} {config.view_center[1]:+.15g}i')
+            imgui.text(f'Pixel size: {self.pixel_size:.3g} ({"double" if self.use_double else "single"} precision)')
+            changed, config.view_zoom_level = imgui.input_int('Zoom Level', config.view_zoom_level)
+            if changed:
+                self.restart()
+
+            imgui.text(f'Tile cache: {len(self.cache.tiles)} tiles ({self.cache.memory_usage / 2 ** 20:.0f} MiB), '
+                       f'{self.cache.hits} hits, {self.cache.misses} misses')
+
+            if imgui.button('[RESET]', 0, 25):  # show the whole set again
+                config.view_center, config.view_zoom_level = (-0.5, 0.0), 0
+                self.restart()
+            imgui.same_line()
+            imgui.text('drag to pan, scroll to zoom')
+
+            if self.finished:
+                imgui.text('Refinement: finished')
+            elif self.engine is not None:
+                imgui.text(f'Tiles: {self.engine.progress:.0%} on {self.engine.workers} cpu worker(s)')
+            else:
+                imgui.text(f'Refinement: block size {self.block_sizes[self.level_index]}, '
+                           f'pass {self.pass_index + 1} of {ceil(config.max_iter / config.iterations_per_pass)}')
+
+            imgui.pop_item_width()
+            imgui.end()
+
+        if imgui.begin('ITERATION'):
+            imgui.push_item_width(imgui.get_window_width() * 0.75)
+
+            changed, config.max_iter = imgui.slider_int(
+                'Max Iterations', config.max_iter, 100, 100000
+            )
+            if changed:
+                self.restart()
+            changed, config.iterations_per_pass = imgui.slider_int(
+                'Iterations per Pass', config.iterations_per_pass, 16, 4096
+            )
+            if changed:
+                self.restart()
+            _, config.iteration_budget = imgui.slider_float(
+                'Budget per Frame [M]', config.iteration_budget, 1.0, 1000.0
+            )
+            imgui.text('The budget is the number of iterations (in millions) per frame, \n'
+                       'lower it if panning and zooming feel sluggish.')
+
+            changed, backend_index = imgui.combo('Backend', BACKENDS.index(config.backend), BACKENDS)
+            if changed:
+                self.select_backend(BACKENDS[backend_index])
+                self.restart()
+
+            imgui.pop_item_width()
+            imgui.end()
+
+        if imgui.begin('COLORS'):
+            imgui.push_item_width(imgui.get_window_width() * 0.75)
+
+            imgui.text('Foreground Color')
+            imgui.begin_child('clr_fg', 0, 35, True)  # child region with border
+            changed_fg, config.clr_fg_rgb = imgui.color_edit3(
+                "fg", *config.clr_fg_rgb
+            )
+            imgui.end_child()
+
+            imgui.dummy(0, 5)  # spacing
+
+            imgui.text('Background Color')
+            imgui.begin_child('clr_bg', 0, 35, True)
+            changed_bg, config.clr_bg_rgb = imgui.color_edit3(
+                "bg", *config.clr_bg_rgb
+            )
+            imgui.end_child()
+            if changed_fg or changed_bg:  # the colors are written by the compute shader
+                self.restart()
+
+            imgui.pop_item_width()
+            imgui.end()
+
+        # close imgui frame context
+        imgui.end_frame()
+
+        # pass all drawing commands to the rendering pipeline:
+        #   render imgui elements and display them in the moderngl-window window
+        imgui.render()
+        self.imgui_renderer.render(imgui.get_draw_data())
+
+    # ----------
+    # ui events
+    # ----------
+
+    def window_offset(self, x: int, y: int) -> tuple:
+        """the offset of a window position from the center of the texture in texels (y pointing up)"""
+        return (x * self.wnd.pixel_ratio - self.texture_dimensions[0] / 2,
+                self.texture_dimensions[1] / 2 - y * self.wnd.pixel_ratio)
+
+    def mouse_position_event(self, x, y, dx, dy) -> None:
+        """forward mouse_position_event to imgui"""
+        self.imgui_renderer.mouse_position_event(x, y, dx, dy)
+        self.mouse_position = (x, y)
+
+    def mouse_drag_event(self, x, y, dx, dy) -> None:
+        """forward mouse_drag_event to imgui, pan the view if imgui does not use the mouse"""
+        self.imgui_renderer.mouse_drag_event(x, y, dx, dy)
+        self.mouse_position = (x, y)
+
+        if not imgui.get_io().want_capture_mouse:
+            pixel_size = self.pixel_size * self.wnd.pixel_ratio
+            config.view_center = (config.view_center[0] - dx * pixel_size, config.view_center[1] + dy * pixel_size)
+            self.restart()
+
+    def mouse_scroll_event(self, x_offset, y_offset) -> None:
+        """forward mouse_scroll_event to imgui, zoom in or out around the cursor if imgui does not use the mouse"""
+        self.imgui_renderer.mouse_scroll_event(x_offset, y_offset)
+
+        if not imgui.get_io().want_capture_mouse and y_offset != 0:
+            # the point under the cursor stays where it is
+            offset = self.window_offset(*self.mouse_position)
+            point = (config.view_center[0] + offset[0] * self.pixel_size,
+                     config.view_center[1] + offset[1] * self.pixel_size)
+
+            config.view_zoom_level += 1 if y_offset > 0 else -1
+            config.view_center = (point[0] - offset[0] * self.pixel_size, point[1] - offset[1] * self.pixel_size)
+            self.restart()
+
+    def mouse_press_event(self, x, y, button) -> None:
+        """forward mouse_press_event to imgui"""
+        self.imgui_renderer.mouse_press_event(x, y, button)
+
+    def mouse_release_event(self, x: int, y: int, button: int) -> None:
+        """forward mouse_release_event to imgui"""
+        self.imgui_renderer.mouse_release_event(x, y, button)
+
+    def unicode_char_entered(self, char) -> None:
+        """forward unicode_char_entered to imgui"""
+        self.imgui_renderer.unicode_char_entered(char)
+
+    def resize(self, width: int, height: int) -> None:
+        """forward resize event to imgui, the texture follows the size of the window"""
+        self.imgui_renderer.resize(width, height)
+
+        if min(self.wnd.buffer_size) > 0 and self.wnd.buffer_size != self.texture_dimensions:  # not minimized
+            self.texture_dimensions = self.wnd.buffer_size
+            self.create_textures()
+            if self.engine is not None:
+                self.engine.resize(self.texture_dimensions)
+            self.restart()
 
-    def run(self) -> None:
-        pass
+    def close(self):
+        """stop the cpu workers, close the tile cache and write changes to the config file when the window is closed"""
+        if self.engine is not None:
+            self.engine.release()
+        self.cache.close()
+        self.programs.release()
+        config.save()
 
 
 if __name__ == '__main__':
-    mandelbrot_set_window = MandelbrotSetWindow()
-    mandelbrot_set_window.run()
+    MandelbrotSetWindow.run()
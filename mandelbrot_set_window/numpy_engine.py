@@ -0,0 +1,268 @@
+from logging import getLogger
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+import numpy
+import os
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+ESCAPE_RADIUS = 256.0
+
+# the first 8 bytes of the shared memory hold the generation of the view, the iteration counts follow
+HEADER_SIZE = 8
+
+# the workers check the generation every this many iterations and give up on tiles of a previous view
+GENERATION_CHECK_INTERVAL = 64
+
+# the shared memory block attached to a worker process (by name), only the current one stays attached
+attached_memory = {}
+
+
+def inside_main_bulbs(c_real: numpy.ndarray, c_imag: numpy.ndarray) -> numpy.ndarray:
+    """the main cardioid and the period-2 bulb never escape (the same check as the compute shader)"""
+    x = c_real - 0.25
+    q = x * x + c_imag * c_imag
+    return (q * (q + x) <= 0.25 * c_imag * c_imag) | ((c_real + 1.0) ** 2 + c_imag * c_imag <= 0.0625)
+
+
+def palette(iterations: numpy.ndarray, clr_fg: tuple, clr_bg: tuple) -> numpy.ndarray:
+    """
+    The colors of the compute shader: shades of the foreground color for the escaped points,
+    the background color for the points inside of the set (-1) and the ones that have not been computed yet (nan).
+    Returns rgba as uint8.
+    """
+    rgba = numpy.full(iterations.shape + (4,), 255, dtype=numpy.uint8)
+    rgba[..., :3] = numpy.clip(numpy.array(clr_bg) * 255.0 + 0.5, 0, 255)
+
+    # only the escaped points are shaded, in float32 like the shader
+    escaped = iterations >= 0.0
+    phase = iterations[escaped, None].astype(numpy.float32) * numpy.float32(0.15) + \
+        numpy.array([3.0, 3.6, 4.0], dtype=numpy.float32)
+    shading = numpy.float32(0.5) + numpy.float32(0.5) * numpy.cos(phase)
+    rgba[escaped, :3] = numpy.clip(numpy.array(clr_fg, dtype=numpy.float32) * shading * 255.0 + 0.5, 0, 255)
+    return rgba
+
+
+def attach(name: str, shape: tuple) -> tuple:
+    """the generation and the iteration counts of the shared memory block with the given name"""
+    if name not in attached_memory:
+        # a new name: the engine has been resized, the blocks of the previous sizes are not used anymore
+        for stale_name in list(attached_memory):
+            try:
+                attached_memory.pop(stale_name).close()
+            except BufferError:  # still viewed by an array (not after a finished tile), closed by the process
+                pass
+        attached_memory[name] = SharedMemory(name=name)
+    buffer = attached_memory[name].buf
+    generation = numpy.ndarray((1,), dtype=numpy.int64, buffer=buffer)
+    iterations = numpy.ndarray(shape, dtype=numpy.float32, buffer=buffer, offset=HEADER_SIZE)
+    return generation, iterations
+
+
+def iterate_tile(name: str, shape: tuple, generation: int, tile: tuple,
+                 center: tuple, pixel_size: float, max_iter: int) -> bool:
+    """
+    Runs in a worker process: computes the smooth iteration counts of a tile (x0, y0, x1, y1)
+    and writes them into the shared memory, row 0 is the bottom of the view (like the texture).
+    Only the points that are still active are iterated, the escaped points are compacted away.
+    Returns False if the view changed before the tile was finished.
+    """
+    current_generation, iterations = attach(name, shape)
+    x0, y0, x1, y1 = tile
+    height, width = shape
+
+    # the same coordinates as the compute shader: pixel centers, relative to the center of the view
+    c_real = center[0] + (numpy.arange(x0, x1, dtype=numpy.float64) + 0.5 - width / 2) * pixel_size
+    c_imag = center[1] + (numpy.arange(y0, y1, dtype=numpy.float64) + 0.5 - height / 2) * pixel_size
+    c_real, c_imag = [grid.ravel() for grid in numpy.meshgrid(c_real, c_imag)]
+
+    result = numpy.full(c_real.size, -1.0, dtype=numpy.float32)  # -1: inside of the set
+    index = numpy.flatnonzero(~inside_main_bulbs(c_real, c_imag))  # the active points
+    c_real, c_imag = c_real[index], c_imag[index]
+    z_real, z_imag = numpy.zeros_like(c_real), numpy.zeros_like(c_imag)
+
+    for iteration in range(1, max_iter + 1):
+        if iteration % GENERATION_CHECK_INTERVAL == 0 and current_generation[0] != generation:
+            return False
+        if index.size == 0:
+            break
+
+        # z = z^2 + c
+        z_real_squared = z_real * z_real
+        z_imag_squared = z_imag * z_imag
+        z_imag = 2.0 * z_real * z_imag + c_imag
+        z_real = z_real_squared - z_imag_squared + c_real
+
+        magnitude_squared = z_real * z_real + z_imag * z_imag
+        escaped = magnitude_squared > ESCAPE_RADIUS * ESCAPE_RADIUS
+        if escaped.any():
+            # smooth iteration count, then drop the escaped points from the active set
+            result[index[escaped]] = iteration + 1.0 - numpy.log2(numpy.log(numpy.sqrt(magnitude_squared[escaped])))
+
+            active = ~escaped
+            index, c_real, c_imag = index[active], c_real[active], c_imag[active]
+            z_real, z_imag = z_real[active], z_imag[active]
+
+    if current_generation[0] != generation:
+        return False
+    iterations[y0:y1, x0:x1] = result.reshape(y1 - y0, x1 - x0)
+    return True
+
+
+"""
+engine
+"""
+
+
+class NumpyMandelbrotEngine:
+    """
+    A GPU-free implementation of compute_shader.glsl (always in double precision).
+
+    The view is split into square tiles that are iterated on a pool of worker processes.
+    The workers write their results straight into one shared memory block, so nothing but the tile
+    coordinates is pickled. A tile only iterates the points that are still active: escaped points are
+    compacted away, so the cost of a tile follows the number of points that are still iterating.
+    Tiles are submitted from the center of the view outwards, so the center shows up first.
+    A new view bumps the generation in the shared memory, the tiles of the previous view are dropped.
+    """
+    def __init__(self, dimensions: tuple, workers: int = None, tile_size: int = 64) -> None:
+        """Creates the shared memory block and the worker pool."""
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.tile_size = tile_size
+        self.executor = ProcessPoolExecutor(self.workers)
+
+        self.dimensions = None
+        self.shared_memory = None
+        self.generation = None
+        self.iterations = None
+        self.futures = []
+        self.resize(dimensions)
+
+    def resize(self, dimensions: tuple) -> None:
+        """(re)create the shared memory block for the given size, nothing is computed until the next submit"""
+        self.cancel()
+        if self.shared_memory is not None:
+            self.release_memory()
+
+        self.dimensions = dimensions
+        width, height = dimensions
+        self.shared_memory = SharedMemory(create=True, size=HEADER_SIZE + width * height * 4)
+        self.generation = numpy.ndarray((1,), dtype=numpy.int64, buffer=self.shared_memory.buf)
+        self.generation[0] = 0
+        self.iterations = numpy.ndarray((height, width), dtype=numpy.float32, buffer=self.shared_memory.buf,
+                                        offset=HEADER_SIZE)
+        self.iterations[:] = numpy.nan
+
+    def tiles(self) -> list:
+        """the tiles (x0, y0, x1, y1) covering the view"""
+        width, height = self.dimensions
+        return [(x, y, min(x + self.tile_size, width), min(y + self.tile_size, height))
+                for y in range(0, height, self.tile_size) for x in range(0, width, self.tile_size)]
+
+    def sort_tiles(self, tiles: list) -> list:
+        """sort the tiles by their distance from the center of the view"""
+        width, height = self.dimensions
+        return sorted(tiles, key=lambda tile: ((tile[0] + tile[2] - width) ** 2 + (tile[1] + tile[3] - height) ** 2))
+
+    def cancel(self) -> None:
+        """drop the tiles of the current view: bump the generation and wait for the running tiles to give up"""
+        if self.generation is not None:
+            self.generation[0] += 1
+        for future in self.futures:
+            future.cancel()
+        wait(self.futures)
+        self.futures = []
+
+    def submit(self, center: tuple, pixel_size: float, max_iter: int, known: numpy.ndarray = None,
+               tiles: list = None) -> None:
+        """
+        Start computing a view, the points that have not been computed yet are nan.
+        The known iteration counts (e.g. from a TileCache) are shown right away,
+        only the given tiles (all tiles of the view by default) are computed.
+        """
+        self.cancel()
+        self.iterations[:] = numpy.nan if known is None else known
+
+        shape = self.dimensions[1], self.dimensions[0]
+        self.futures = [
+            self.executor.submit(iterate_tile, self.shared_memory.name, shape, int(self.generation[0]), tile,
+                                 center, pixel_size, max_iter)
+            for tile in self.sort_tiles(self.tiles() if tiles is None else tiles)
+        ]
+
+    @property
+    def progress(self) -> float:
+        """the finished part of the current view"""
+        return sum(future.done() for future in self.futures) / len(self.futures) if self.futures else 1.0
+
+    @property
+    def finished(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    def compute(self, center: tuple, pixel_size: float, max_iter: int) -> numpy.ndarray:
+        """compute a view and wait for it, returns the smooth iteration counts (-1: inside of the set)"""
+        self.submit(center, pixel_size, max_iter)
+        wait(self.futures)
+        for future in self.futures:
+            future.result()  # raise the errors of the workers
+        return self.iterations
+
+    def colors(self, clr_fg: tuple, clr_bg: tuple) -> numpy.ndarray:
+        """the current view in the colors of the compute shader (rgba, uint8)"""
+        return palette(self.iterations.copy(), clr_fg, clr_bg)  # the workers might still write to the view
+
+    def release_memory(self) -> None:
+        self.generation = None
+        self.iterations = None
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+        self.shared_memory = None
+
+    def release(self) -> None:
+        """stop the workers and free the shared memory"""
+        self.cancel()
+        self.executor.shutdown()
+        self.release_memory()
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='render the mandelbrot set on the CPU and report the time')
+    parser.add_argument('--width', type=int, default=1440)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--center', type=float, nargs=2, default=(-0.5, 0.0))
+    parser.add_argument('--zoom-level', type=int, default=0, help='every level zooms in by 2^(1/4)')
+    parser.add_argument('--max-iter', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None, help='the number of processes, all cores by default')
+    parser.add_argument('--tile-size', type=int, default=64)
+    parser.add_argument('--output', default=None, help='save the image as .png (needs pillow)')
+    arguments = parser.parse_args()
+
+    engine = NumpyMandelbrotEngine((arguments.width, arguments.height), arguments.workers, arguments.tile_size)
+    start = perf_counter()
+    engine.compute(tuple(arguments.center), 3.0 / arguments.height * 2 ** (-arguments.zoom_level / 4),
+                   arguments.max_iter)
+    seconds = perf_counter() - start
+    print(f'{arguments.width}x{arguments.height}, max_iter {arguments.max_iter}: '
+          f'{seconds:.3f} s on {engine.workers} worker(s)')
+
+    if arguments.output is not None:
+        from PIL import Image
+        Image.fromarray(engine.colors((1.0, 1.0, 1.0), (0.0, 0.0, 0.0))[::-1]).save(arguments.output)
+
+    engine.release()
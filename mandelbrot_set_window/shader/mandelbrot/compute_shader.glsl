@@ -0,0 +1,133 @@
+#version 430
+
+// local group size (updated by the python program running this)
+#define group_size_x 8
+#define group_size_y 8
+layout( local_size_x = group_size_x, local_size_y = group_size_y ) in;
+
+// precision of the iteration (updated by the python program running this): float or double
+#define use_double 0
+#if use_double
+    #define real double
+    #define real2 dvec2
+#else
+    #define real float
+    #define real2 vec2
+#endif
+
+// output texture: the colors (format!)
+layout( rgba8, binding = 0 ) writeonly uniform image2D destTex;
+
+// the smooth iteration counts of the view (-1: inside of the set): known from the tile cache (nan: unknown),
+// the pixels that are done are written back
+layout( r32f, binding = 3 ) restrict uniform image2D iterTex;
+
+// data type: state - the iteration of a pixel can be continued by the next pass
+struct State {
+    real2 z;
+    float iteration;  // smooth iteration count once the pixel has escaped
+    float done;  // 0: still iterating, 1: escaped, 2: inside of the set
+};
+
+// the state of every pixel, index: y * width + x
+layout( std430, binding = 1 ) restrict buffer buffer_state {
+    State states[];
+} StateBuffer;
+
+// the number of pixels that are still iterating after this pass
+layout( std430, binding = 2 ) restrict buffer buffer_active {
+    uint active_count;
+} ActiveBuffer;
+
+// constants
+#define escape_radius 256.0
+
+// variables to get from the python program running this
+uniform real2 center;
+uniform real pixel_size;
+uniform int block_size;  // every invocation computes the top left pixel of a block and fills the whole block
+uniform bool first_level;  // the first (coarsest) level initializes every pixel it computes
+uniform bool first_pass;  // the first pass of a level initializes the pixels that are new to the level
+uniform int iterations;  // the iteration budget of every pixel in this pass
+uniform int max_iter;
+uniform vec3 clr_fg;
+uniform vec3 clr_bg;
+
+bool inside_main_bulbs( real2 c ) {  // the main cardioid and the period-2 bulb never escape
+    real x = c.x - 0.25;
+    real q = x * x + c.y * c.y;
+    return q * ( q + x ) <= 0.25 * c.y * c.y || ( c.x + 1.0 ) * ( c.x + 1.0 ) + c.y * c.y <= 0.0625;
+}
+
+vec3 palette( float iteration ) {  // cycles through shades of the foreground color
+    return clr_fg * ( 0.5 + 0.5 * cos( 3.0 + iteration * 0.15 + vec3( 0.0, 0.6, 1.0 ) ) );
+}
+
+void fill_block( ivec2 texelPos, ivec2 size, vec3 color ) {
+    for ( int y = 0; y < block_size; y++ ) {
+        for ( int x = 0; x < block_size; x++ ) {
+            ivec2 pos = texelPos + ivec2( x, y );
+            if ( all( lessThan( pos, size ) ) ) {
+                imageStore( destTex, pos, vec4( color, 1.0 ) );
+            }
+        }
+    }
+}
+
+// what will be done for each block
+void main() {
+    ivec2 size = imageSize( destTex );
+    ivec2 texelPos = ivec2( gl_GlobalInvocationID.xy ) * block_size;
+    if ( any( greaterThanEqual( texelPos, size ) ) ) {  // the last work groups can overhang
+        return;
+    }
+    uint index = texelPos.y * size.x + texelPos.x;
+    State state = StateBuffer.states[ index ];
+
+    // the pixels of coarser levels have been finished already, the other pixels are initialized by the first pass
+    bool computed_before = !first_level && all( equal( texelPos % ( block_size * 2 ), ivec2( 0 ) ) );
+    real2 c = center + ( real2( texelPos ) + 0.5 - real2( size ) / 2.0 ) * pixel_size;
+    if ( first_pass && !computed_before ) {
+        float known = imageLoad( iterTex, texelPos ).r;
+        if ( !isnan( known ) ) {  // cached, nothing to iterate
+            StateBuffer.states[ index ] = State( real2( 0.0 ), known, known < 0.0 ? 2.0 : 1.0 );
+            fill_block( texelPos, size, known < 0.0 ? clr_bg : palette( known ) );
+            return;
+        }
+        state = State( real2( 0.0 ), 0.0, inside_main_bulbs( c ) ? 2.0 : 0.0 );
+    }
+    else if ( state.done != 0.0 ) {  // finished by an earlier pass, the block has been filled already
+        return;
+    }
+
+    // continue the iteration: z = z^2 + c
+    real2 z = state.z;
+    int iteration = int( state.iteration );
+    int last_iteration = min( iteration + iterations, max_iter );
+    while ( state.done == 0.0 && iteration < last_iteration ) {
+        z = real2( z.x * z.x - z.y * z.y, 2.0 * z.x * z.y ) + c;
+        iteration++;
+
+        if ( dot( z, z ) > escape_radius * escape_radius ) {
+            state.done = 1.0;
+        }
+    }
+    if ( state.done == 0.0 && iteration >= max_iter ) {
+        state.done = 2.0;
+    }
+
+    state.z = z;
+    if ( state.done == 1.0 ) {  // smooth iteration count
+        state.iteration = float( iteration ) + 1.0 - log2( log( float( length( z ) ) ) );
+    } else {
+        state.iteration = float( iteration );
+    }
+    StateBuffer.states[ index ] = state;
+
+    if ( state.done == 0.0 ) {
+        atomicAdd( ActiveBuffer.active_count, 1 );
+    } else {
+        imageStore( iterTex, texelPos, vec4( state.done == 1.0 ? state.iteration : -1.0 ) );
+        fill_block( texelPos, size, state.done == 1.0 ? palette( state.iteration ) : clr_bg );
+    }
+}
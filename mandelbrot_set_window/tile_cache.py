@@ -0,0 +1,231 @@
+from logging import getLogger
+from collections import OrderedDict
+from pathlib import Path
+import numpy
+import json
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+cache
+"""
+
+
+# the width and height of a tile in pixels
+TILE_SIZE = 64
+
+# the disk tier grows its data file by this many tiles at a time
+DISK_GROWTH = 256
+
+
+class DiskTier:
+    """
+    Tiles in a memory mapped file of fixed size slots (tiles.f32) and an index of the slots (index.json),
+    so the tiles survive restarts. The least recently used tile gives up its slot once the limit is reached.
+    The index is written by flush(), a data file without a matching index is started over.
+    """
+    def __init__(self, directory: str, tile_size: int = TILE_SIZE, limit: int = 2 ** 30) -> None:
+        """Opens (or creates) the data file and reads the index."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.directory / 'tiles.f32'
+        self.index_path = self.directory / 'index.json'
+
+        self.tile_size = tile_size
+        self.capacity = max(1, limit // (tile_size * tile_size * 4))
+        self.slots = OrderedDict()  # key -> slot, least recently used first
+
+        if self.index_path.exists() and self.data_path.exists():
+            index = json.loads(self.index_path.read_text())
+            if index['tile_size'] == tile_size:
+                used = set()
+                for *key, slot in index['slots']:
+                    if slot < self.capacity and slot not in used:  # a smaller limit drops the slots beyond it
+                        self.slots[tuple(key)] = slot
+                        used.add(slot)
+            else:
+                logger.info(f'the tile size of {self.directory} changed, starting over')
+        if not self.slots:
+            self.data_path.write_bytes(b'')
+
+        # the slots below next_slot that no tile uses (the index of a larger limit leaves gaps)
+        self.next_slot = max(self.slots.values(), default=-1) + 1
+        self.free_slots = set(range(self.next_slot)) - set(self.slots.values())
+
+        self.data = None
+        self.length = 0
+        self.grow(self.next_slot)
+
+    def grow(self, length: int) -> None:
+        """make room for at least the given number of slots"""
+        length = min(self.capacity, max(length, self.length + DISK_GROWTH))
+        if self.data is not None:
+            self.data.flush()
+            del self.data
+
+        with open(self.data_path, 'r+b') as file:
+            file.truncate(max(length * self.tile_size * self.tile_size * 4, self.data_path.stat().st_size))
+        self.data = numpy.memmap(self.data_path, dtype=numpy.float32, mode='r+',
+                                 shape=(length, self.tile_size, self.tile_size))
+        self.length = length
+
+    def get(self, key: tuple):
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        self.slots.move_to_end(key)
+        return numpy.array(self.data[slot])
+
+    def put(self, key: tuple, tile: numpy.ndarray) -> None:
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+            elif self.next_slot < self.capacity:
+                slot = self.next_slot
+                self.next_slot += 1
+            else:
+                _, slot = self.slots.popitem(last=False)
+        if slot >= self.length:
+            self.grow(slot + 1)
+
+        self.data[slot] = tile
+        self.slots[key] = slot
+
+    def flush(self) -> None:
+        self.data.flush()
+        self.index_path.write_text(json.dumps({
+            'tile_size': self.tile_size,
+            'slots': [[*key, slot] for key, slot in self.slots.items()]
+        }))
+
+    def close(self) -> None:
+        self.flush()
+        del self.data
+        self.data = None
+
+
+class TileCache:
+    """
+    Caches the smooth iteration counts of fixed size tiles (float32, -1: inside of the set, nan: unknown),
+    keyed by (zoom level, tile x, tile y, max_iter). The tiles sit on a grid that is global for a zoom level,
+    tile (x, y) covers the pixels [x * tile_size, (x + 1) * tile_size) in both directions.
+
+    The tiles in memory are evicted least recently used first once memory_limit (bytes) is exceeded.
+    With a directory, every tile is also written to a DiskTier, tiles evicted from memory are read back from there.
+    """
+    def __init__(self, tile_size: int = TILE_SIZE, memory_limit: int = 2 ** 28, directory: str = None,
+                 disk_limit: int = 2 ** 30) -> None:
+        """Creates the in-memory LRU and opens the disk tier, if there is a directory."""
+        self.tile_size = tile_size
+        self.memory_limit = memory_limit
+        self.tiles = OrderedDict()
+        self.memory_usage = 0
+        self.disk = DiskTier(directory, tile_size, disk_limit) if directory else None
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: tuple):
+        """the tile with the given key or None, without counting a hit or a miss"""
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+        elif self.disk is not None:
+            tile = self.disk.get(key)
+            if tile is not None:
+                self.insert(key, tile)
+        return tile
+
+    def get(self, key: tuple):
+        """the tile with the given key or None, the tile must not be changed (put a copy)"""
+        tile = self.lookup(key)
+        if tile is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return tile
+
+    def put(self, key: tuple, tile: numpy.ndarray) -> None:
+        self.insert(key, tile)
+        if self.disk is not None:
+            self.disk.put(key, tile)
+
+    def insert(self, key: tuple, tile: numpy.ndarray) -> None:
+        """insert into the memory tier, evicting the least recently used tiles"""
+        previous = self.tiles.pop(key, None)
+        if previous is not None:
+            self.memory_usage -= previous.nbytes
+
+        self.tiles[key] = tile
+        self.memory_usage += tile.nbytes
+        while self.memory_usage > self.memory_limit and self.tiles:
+            _, evicted = self.tiles.popitem(last=False)
+            self.memory_usage -= evicted.nbytes
+
+    def tile_range(self, origin: tuple, dimensions: tuple) -> tuple:
+        """the tiles (x range, y range) that overlap a view, origin: the global pixel of its bottom left pixel"""
+        return (range(origin[0] // self.tile_size, (origin[0] + dimensions[0] - 1) // self.tile_size + 1),
+                range(origin[1] // self.tile_size, (origin[1] + dimensions[1] - 1) // self.tile_size + 1))
+
+    def overlap(self, origin: tuple, dimensions: tuple, tile_x: int, tile_y: int) -> tuple:
+        """the overlap of a tile and a view as (x0, y0, x1, y1), in pixels of the view and in pixels of the tile"""
+        x0 = max(tile_x * self.tile_size, origin[0])
+        y0 = max(tile_y * self.tile_size, origin[1])
+        x1 = min((tile_x + 1) * self.tile_size, origin[0] + dimensions[0])
+        y1 = min((tile_y + 1) * self.tile_size, origin[1] + dimensions[1])
+        return ((x0 - origin[0], y0 - origin[1], x1 - origin[0], y1 - origin[1]),
+                (x0 - tile_x * self.tile_size, y0 - tile_y * self.tile_size,
+                 x1 - tile_x * self.tile_size, y1 - tile_y * self.tile_size))
+
+    def read_view(self, zoom_level: int, max_iter: int, origin: tuple, dimensions: tuple) -> tuple:
+        """
+        Assembles a view (rows from the bottom) from the cached tiles, unknown pixels are nan.
+        Returns the view and the rectangles (x0, y0, x1, y1) of the tiles that are not complete.
+        """
+        view = numpy.full((dimensions[1], dimensions[0]), numpy.nan, dtype=numpy.float32)
+        missing = []
+        tiles_x, tiles_y = self.tile_range(origin, dimensions)
+        for tile_y in tiles_y:
+            for tile_x in tiles_x:
+                (x0, y0, x1, y1), (u0, v0, u1, v1) = self.overlap(origin, dimensions, tile_x, tile_y)
+                tile = self.get((zoom_level, tile_x, tile_y, max_iter))
+                if tile is not None:
+                    view[y0:y1, x0:x1] = tile[v0:v1, u0:u1]
+                if tile is None or numpy.isnan(view[y0:y1, x0:x1]).any():
+                    missing.append((x0, y0, x1, y1))
+
+        return view, missing
+
+    def write_view(self, zoom_level: int, max_iter: int, origin: tuple, view: numpy.ndarray,
+                   rectangles: list = None) -> None:
+        """stores the tiles of a view, only the tiles overlapping the given rectangles (all by default)"""
+        dimensions = view.shape[1], view.shape[0]
+        tiles_x, tiles_y = self.tile_range(origin, dimensions)
+        for tile_y in tiles_y:
+            for tile_x in tiles_x:
+                (x0, y0, x1, y1), (u0, v0, u1, v1) = self.overlap(origin, dimensions, tile_x, tile_y)
+                if rectangles is not None and (x0, y0, x1, y1) not in rectangles:
+                    continue
+
+                key = zoom_level, tile_x, tile_y, max_iter
+                tile = self.lookup(key)  # the parts outside of the view might be known already
+                tile = numpy.full((self.tile_size, self.tile_size), numpy.nan, dtype=numpy.float32) \
+                    if tile is None else tile.copy()
+                tile[v0:v1, u0:u1] = view[y0:y1, x0:x1]
+                self.put(key, tile)
+
+        if self.disk is not None:
+            self.disk.flush()
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
@@ -0,0 +1,22 @@
+from .shader_source import apply_defines
+from .shader_source import load_shader_source
+from .workgroup_tuner import WorkgroupSizeTuner
+from .workgroup_tuner import group_size_defines
+from .workgroup_tuner import group_count
+from .workgroup_tuner import DEFAULT_GROUP_SIZE_1D
+from .workgroup_tuner import DEFAULT_GROUP_SIZE_2D
+from .workgroup_tuner import GROUP_SIZES_1D
+from .workgroup_tuner import GROUP_SIZES_2D
+from .simulation_clock import SimulationClock
+from .capture import FrameCapture
+from .capture import WindowCapture
+from .capture import CAPTURE_FORMATS
+from .capture import capture_path
+from .profiler import FrameProfiler
+from .program_cache import ProgramCache
+from .program_cache import enable_driver_shader_cache
+from .parameter_block import ParameterBlock
+from .parameter_block import glsl_fields
+from .quality_controller import AdaptiveQualityController
+from .frame_pacing import FramePacer
+from .frame_pacing import HISTOGRAM_BINS
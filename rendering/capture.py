@@ -0,0 +1,257 @@
+from logging import getLogger
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from pathlib import Path
+import subprocess
+import numpy
+import moderngl as mgl
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+# png: one file per frame, y4m: uncompressed yuv 4:4:4 video, raw: rgba8 frames without a header,
+# ffmpeg: rgba8 frames piped into an ffmpeg process (h264 by default)
+CAPTURE_FORMATS = ['png', 'y4m', 'raw', 'ffmpeg']
+
+# rgb -> ycbcr (bt.601, studio range), rows: y, cb, cr
+YCBCR_MATRIX = numpy.array([
+    [65.481, 128.553, 24.966],
+    [-37.797, -74.203, 112.0],
+    [112.0, -93.786, -18.214]
+], dtype=numpy.float32) / 255
+YCBCR_OFFSET = numpy.array([16.0, 128.0, 128.0], dtype=numpy.float32)
+
+
+def rgb_to_ycbcr_planes(image: numpy.ndarray) -> bytes:
+    """converts an rgb(a) image (height, width, 3 or 4) into planar ycbcr 4:4:4 bytes (y plane, cb plane, cr plane)"""
+    planes = numpy.tensordot(YCBCR_MATRIX, image[..., :3].astype(numpy.float32), axes=([1], [2]))
+    planes += YCBCR_OFFSET[:, None, None]
+    return numpy.clip(numpy.rint(planes), 0, 255).astype(numpy.uint8).tobytes()
+
+
+def capture_path(directory: Path, name: str, capture_format: str) -> Path:
+    """a new path for a recording: a directory of frames (png) or a single file (numbered if the path exists)"""
+    stem = f'{name}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}'
+    suffix = {'png': '', 'y4m': '.y4m', 'raw': '.rgba', 'ffmpeg': '.mp4'}[capture_format]
+    path, number = Path(directory) / f'{stem}{suffix}', 1
+    while path.exists():  # e.g. a recording that was restarted within the same second
+        path, number = Path(directory) / f'{stem}_{number}{suffix}', number + 1
+    return path
+
+
+"""
+capture
+"""
+
+
+class FrameCapture:
+    """
+    Records frames from a texture or a framebuffer without stalling the render thread.
+    Every frame is copied into the next pixel buffer of a ring (on the GPU, the call returns immediately),
+    a buffer is only read back ring_size frames later, when the copy has long been completed.
+    Encoding and writing runs in a thread pool: png frames are encoded in parallel,
+    the streamed formats (y4m, raw, ffmpeg) are written by a single worker to keep the frames in order.
+    If the workers fall behind by more than max_pending frames, new frames are dropped (and counted)
+    instead of blocking the render thread.
+    """
+    def __init__(self, ctx: mgl.Context, size: tuple, path: Path, capture_format: str = 'png',
+                 ring_size: int = 3, workers: int = 4, fps: int = 60, max_pending: int = None) -> None:
+        if capture_format not in CAPTURE_FORMATS:
+            raise ValueError(f'unknown capture format: {capture_format} (available: {", ".join(CAPTURE_FORMATS)})')
+
+        self.ctx = ctx
+        self.size = tuple(size)
+        self.path = Path(path)
+        self.capture_format = capture_format
+        self.fps = fps
+
+        self.file = None
+        self.process = None
+        self.open_output()  # first, ffmpeg might be missing
+
+        # one pixel buffer per slot of the ring, the frame number of the frame in it (None: empty)
+        self.buffers = [ctx.buffer(reserve=self.size[0] * self.size[1] * 4) for _ in range(ring_size)]
+        self.slots = [None] * ring_size
+        self.index = 0
+
+        workers = workers if capture_format == 'png' else 1
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='frame_capture')
+        self.pending = deque()
+        self.max_pending = max_pending if max_pending is not None else workers * 2
+
+        self.frames = 0  # frames that have been captured
+        self.dropped = 0  # frames that have been dropped, because the workers could not keep up
+        self.written = 0  # frames that have been written to disk (counted by the workers)
+        self.lock = Lock()
+
+        logger.info(f'capturing {self.size[0]}x{self.size[1]} frames to {self.path} ({capture_format})')
+
+    def open_output(self) -> None:
+        """create the output directory, file or ffmpeg process"""
+        if self.capture_format == 'png':
+            self.path.mkdir(parents=True, exist_ok=True)
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.capture_format == 'ffmpeg':
+            self.process = subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-y',
+                 '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{self.size[0]}x{self.size[1]}', '-r', str(self.fps),
+                 '-i', '-', '-pix_fmt', 'yuv420p', str(self.path)],
+                stdin=subprocess.PIPE
+            )
+            return
+
+        self.file = open(self.path, 'wb')
+        if self.capture_format == 'y4m':
+            self.file.write(f'YUV4MPEG2 W{self.size[0]} H{self.size[1]} F{self.fps}:1 Ip A1:1 C444\n'.encode())
+
+    @property
+    def recording(self) -> bool:
+        """whether frames are accepted"""
+        return self.executor is not None
+
+    def capture(self, source) -> None:
+        """
+        Queue the copy of a frame into the ring (mgl.Texture: the whole texture, mgl.Framebuffer: the color
+        attachment, starting at the bottom left corner); the oldest frame of the ring is handed to the workers.
+        """
+        slot = self.index
+        if self.slots[slot] is not None:
+            self.collect(slot)
+
+        if isinstance(source, mgl.Framebuffer):
+            source.read_into(self.buffers[slot], viewport=(0, 0, *self.size), components=4, alignment=1)
+        else:
+            source.read_into(self.buffers[slot], alignment=1)
+
+        self.slots[slot] = self.frames
+        self.frames += 1
+        self.index = (slot + 1) % len(self.slots)
+
+    def collect(self, slot: int, block: bool = False) -> None:
+        """read back the frame in the given slot and hand it to the workers (or drop it if they are busy)"""
+        frame, self.slots[slot] = self.slots[slot], None
+
+        while self.pending and (self.pending[0].done() or (block and len(self.pending) >= self.max_pending)):
+            self.pending.popleft().result()  # raises the exceptions of the workers
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        data = self.buffers[slot].read()
+        self.pending.append(self.executor.submit(self.write_frame, frame, data))
+
+    def write_frame(self, frame: int, data: bytes) -> None:
+        """called by the workers: encode a frame and write it"""
+        # opengl starts at the bottom row, images start at the top row
+        image = numpy.frombuffer(data, dtype=numpy.uint8).reshape(self.size[1], self.size[0], 4)[::-1]
+
+        if self.capture_format == 'png':
+            from PIL import Image  # pillow is a dependency of moderngl-window
+            Image.fromarray(image, 'RGBA').save(self.path / f'frame_{frame:06d}.png', compress_level=1)
+        elif self.capture_format == 'y4m':
+            self.file.write(b'FRAME\n' + rgb_to_ycbcr_planes(image))
+        elif self.capture_format == 'raw':
+            self.file.write(image.tobytes())
+        else:
+            self.process.stdin.write(image.tobytes())
+
+        with self.lock:
+            self.written += 1
+
+    def close(self) -> None:
+        """write the frames that are left in the ring, wait for the workers and close the output"""
+        if not self.recording:
+            return
+
+        for offset in range(len(self.slots)):  # oldest frame first
+            slot = (self.index + offset) % len(self.slots)
+            if self.slots[slot] is not None:
+                self.collect(slot, block=True)
+
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        for future in self.pending:
+            future.result()
+        self.pending.clear()
+
+        if self.file is not None:
+            self.file.close()
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+
+        for buffer in self.buffers:
+            buffer.release()
+
+        logger.info(f'captured {self.frames} frames to {self.path}: {self.written} written, {self.dropped} dropped')
+
+
+class WindowCapture:
+    """
+    Records the framebuffer of a window (without the ui) to a new file or directory of the capture directory.
+    A FrameCapture has a fixed size, so a resize of the window closes the recording and continues it
+    with the new size in a new one.
+    """
+    def __init__(self, ctx: mgl.Context, wnd, directory: Path, name: str) -> None:
+        self.ctx = ctx
+        self.wnd = wnd
+        self.directory = Path(directory)
+        self.name = name  # the prefix of the recordings
+
+        self.capture = None  # None: not recording
+        self.capture_format = CAPTURE_FORMATS[0]
+        self.status = ''
+
+    def start(self) -> bool:
+        """start recording the rendered frames, returns whether the recording has been started"""
+        try:
+            self.capture = FrameCapture(
+                self.ctx, self.wnd.buffer_size,
+                capture_path(self.directory, self.name, self.capture_format), self.capture_format
+            )
+        except (OSError, ValueError) as e:
+            logger.exception(e)
+            self.status = f'capturing failed: {e}'
+        return self.capture is not None
+
+    def stop(self) -> None:
+        """stop recording and write the remaining frames"""
+        if self.capture is None:
+            return
+
+        self.capture.close()
+        self.status = f'{self.capture.written} frames written to {self.capture.path}, {self.capture.dropped} dropped'
+        self.capture = None
+
+    def capture_frame(self) -> None:
+        """record the framebuffer, called before the ui is rendered on top of it"""
+        if self.capture is not None:
+            self.capture.capture(self.wnd.fbo)
+
+    def resize(self) -> None:
+        """called when the window has been resized: a recording continues with the new size in a new file"""
+        size = tuple(self.wnd.buffer_size)
+        if self.capture is None or size == self.capture.size or min(size) == 0:  # 0: minimized
+            return
+
+        self.stop()
+        status = self.status
+        if self.start():
+            self.status = f'{status}, continued at {size[0]}x{size[1]} in {self.capture.path}'
+            logger.info(f'the window has been resized, {self.status}')
@@ -0,0 +1,203 @@
+from logging import getLogger
+from logger import get_metrics
+from collections import deque
+from time import perf_counter, sleep
+from pathlib import Path
+import numpy
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+# the bins of the frame time histogram (ms), the last bin collects every longer frame
+HISTOGRAM_BINS = numpy.linspace(0.0, 66.0, 34)
+
+# the refresh interval that is assumed without an fps cap (s)
+DEFAULT_FRAME_INTERVAL = 1 / 60
+
+# a stutter in the log and the ui (a template, so that the repeat filter of the log can recognize it)
+STUTTER_MESSAGE = 'frame %d: %.1f ms (%.1fx the median %.1f ms), cpu %.1f ms, during: %s'
+
+
+"""
+frame pacing
+"""
+
+
+class FramePacer:
+    """
+    Paces the frames of a window and keeps a record of their times.
+        - vsync: the swap interval of the window (if its window type can change it)
+        - fps_cap: end_frame() sleeps until the next frame is due (0: no cap)
+        - simulation_only: for windows that simulate, a frame runs the simulation uncapped for display_interval
+          seconds, so the window is only redrawn a few times per second
+
+    Every frame is kept for the last history frames: its frame time, the cpu time of render() and the events
+    that happened during it (mark(), e.g. a shader load, a restart or a config change).
+    A frame that takes longer than stutter_factor times the median is a stutter, it is logged with its events
+    and recorded in the metrics channel. diagnosis() tells a gpu-bound from a cpu-bound and a hitch-driven slowdown.
+
+    The frame time that render() gets is the time since the previous frame, so it belongs to the previous frame:
+    begin_frame() files it together with the cpu time and the events of that frame.
+    """
+    def __init__(self, wnd, vsync: bool = True, fps_cap: int = 0, simulation_only: bool = False,
+                 stutter_factor: float = 2.5, history: int = 600, display_interval: float = 0.25) -> None:
+        self.wnd = wnd
+        self.vsync = vsync
+        self.fps_cap = fps_cap
+        self.simulation_only = simulation_only
+        self.stutter_factor = stutter_factor
+        self.history = history
+        self.display_interval = display_interval
+        self.metrics = get_metrics()
+        self.status = ''  # the result of the latest export, shown in the ui
+
+        # per frame: the frame time and the cpu time of render() (ms), whether it stuttered and its events
+        self.frame_times = deque(maxlen=history)
+        self.cpu_times = deque(maxlen=history)
+        self.stuttered = deque(maxlen=history)
+        self.frame_events = deque(maxlen=history)
+        self.stutters = deque(maxlen=16)  # the latest stutters, shown in the ui
+        self.frames = 0
+
+        self.frame_start = None
+        self.cpu_time = 0.0
+        self.events = []  # the events of the current frame
+        self.deadline = perf_counter()
+        self.median = 0.0
+
+        self.set_vsync(vsync)
+
+    def set_vsync(self, vsync: bool) -> None:
+        """set the swap interval of the window"""
+        self.vsync = vsync
+        try:
+            self.wnd.vsync = vsync
+        except NotImplementedError as e:  # e.g. a headless window
+            logger.debug(f'vsync can not be changed: {e}')
+
+    def mark(self, event: str) -> None:
+        """note something that happens during the current frame (it is logged if the frame stutters)"""
+        if event not in self.events:
+            self.events.append(event)
+
+    # ----------
+    # frames
+    # ----------
+
+    def begin_frame(self, frame_time: float) -> None:
+        """called at the start of render() with its frame time (s): files the previous frame"""
+        if self.frame_start is not None and frame_time > 0.0:
+            self.add_frame(frame_time * 1000, self.cpu_time * 1000, self.events)
+        self.events = []
+        self.frame_start = perf_counter()
+
+    def skip_frame(self) -> None:
+        """called instead of begin_frame() for a frame that is not displayed (e.g. of a minimized window)"""
+        self.events = []
+        self.frame_start = None
+
+    def end_frame(self) -> None:
+        """called at the end of render(): measures its cpu time and sleeps until the next frame is due (fps cap)"""
+        now = perf_counter()
+        self.cpu_time = now - self.frame_start
+
+        if self.fps_cap <= 0 or self.simulation_only:
+            self.deadline = now
+            return
+        # the next frame is due one period after the previous deadline, a late frame does not make up for the delay
+        self.deadline = max(self.deadline + 1 / self.fps_cap, now)
+        sleep(self.deadline - now)
+
+    def add_frame(self, frame_time: float, cpu_time: float, events: list) -> None:
+        """keep a frame (ms) and check whether it stuttered"""
+        if self.frames % 30 == 0 and self.frame_times:  # the median changes slowly
+            self.median = float(numpy.median(self.frame_times))
+
+        stuttered = len(self.frame_times) >= 30 and frame_time > self.stutter_factor * self.median
+        self.frame_times.append(frame_time)
+        self.cpu_times.append(cpu_time)
+        self.stuttered.append(stuttered)
+        self.frame_events.append(', '.join(events))
+        self.frames += 1
+
+        if stuttered:
+            cause = ', '.join(events) if events else 'nothing noted'
+            arguments = (self.frames, frame_time, frame_time / self.median, self.median, cpu_time, cause)
+            self.stutters.appendleft(STUTTER_MESSAGE % arguments)
+            logger.warning('stutter: ' + STUTTER_MESSAGE, *arguments)
+            self.metrics.record('stutter', frame=self.frames, frame_time=round(frame_time, 3),
+                                median=round(self.median, 3), cpu_time=round(cpu_time, 3), events=cause)
+
+    # ----------
+    # statistics
+    # ----------
+
+    def histogram(self) -> numpy.ndarray:
+        """the number of frames per bin of HISTOGRAM_BINS (float32, for imgui), longer frames in the last bin"""
+        frame_times = numpy.minimum(numpy.array(self.frame_times, dtype='f4'), HISTOGRAM_BINS[-1] - 1e-3)
+        return numpy.histogram(frame_times, HISTOGRAM_BINS)[0].astype('f4')
+
+    def statistics(self) -> dict:
+        """median and p99 of the frame and cpu times (ms) and the share of the frames that stuttered"""
+        if not self.frame_times:
+            return {'median': 0.0, 'p99': 0.0, 'cpu_median': 0.0, 'stutter_share': 0.0}
+        frame_times = numpy.array(self.frame_times)
+        return {
+            'median': float(numpy.median(frame_times)),
+            'p99': float(numpy.percentile(frame_times, 99)),
+            'cpu_median': float(numpy.median(self.cpu_times)),
+            'stutter_share': sum(self.stuttered) / len(self.stuttered)
+        }
+
+    def diagnosis(self) -> str:
+        """
+        why the frames are slow: the median frame is over budget (1 / fps cap, 60 fps without a cap) and
+        render() takes most of it (cpu-bound) or it waits for the swap (gpu-bound), or the median is fine,
+        but more than 1% of the frames stutter (hitch-driven)
+        """
+        statistics = self.statistics()
+        budget = 1000 / self.fps_cap if self.fps_cap > 0 else DEFAULT_FRAME_INTERVAL * 1000
+        if len(self.frame_times) < 30:
+            return 'measuring'
+        if self.simulation_only:
+            return 'simulation only'
+        if statistics['median'] > budget * 1.2:
+            return 'cpu-bound' if statistics['cpu_median'] > 0.75 * statistics['median'] else 'gpu-bound'
+        if statistics['stutter_share'] > 0.01:
+            return 'hitch-driven'
+        return 'smooth'
+
+    def export(self, path: Path) -> Path:
+        """
+        write the frames to a CSV file (frame, frame time, cpu time, stutter, events)
+        and the histogram next to it (<name>.histogram.csv), returns the path of the frames
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        first = self.frames - len(self.frame_times) + 1
+        lines = ['frame,frame_time_ms,cpu_time_ms,stutter,events']
+        for index, (frame_time, cpu_time, stuttered, events) in enumerate(
+                zip(self.frame_times, self.cpu_times, self.stuttered, self.frame_events)):
+            lines.append(f'{first + index},{frame_time:.3f},{cpu_time:.3f},{int(stuttered)},"{events}"')
+        path.write_text('\n'.join(lines) + '\n')
+
+        histogram = ['bin_start_ms,bin_end_ms,frames']
+        for start, end, count in zip(HISTOGRAM_BINS[:-1], HISTOGRAM_BINS[1:], self.histogram()):
+            histogram.append(f'{start:.1f},{end:.1f},{int(count)}')
+        path.with_suffix('.histogram.csv').write_text('\n'.join(histogram) + '\n')
+
+        logger.info(f'exported {len(self.frame_times)} frame times to {path}')
+        return path
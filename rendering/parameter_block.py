@@ -0,0 +1,143 @@
+from logging import getLogger
+import moderngl as mgl
+import struct
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+std140
+"""
+
+
+# glsl type: (struct format, size, base alignment)
+STD140_TYPES = {
+    'float': ('f', 4, 4),
+    'int': ('i', 4, 4),
+    'uint': ('I', 4, 4),
+    'vec2': ('2f', 8, 8),
+    'vec3': ('3f', 12, 16),
+    'vec4': ('4f', 16, 16),
+    'ivec2': ('2i', 8, 8),
+}
+
+
+def std140_layout(fields: list) -> tuple:
+    """
+    The offsets of the fields of a std140 uniform block, fields: (name, glsl type) or (name, glsl type, array length).
+    Returns {name: (offset, format, stride, length)} (length 0: no array) and the size of the block.
+    """
+    layout = {}
+    offset = 0
+    for name, glsl_type, *length in fields:
+        format_, size, alignment = STD140_TYPES[glsl_type]
+        length = length[0] if length else 0
+        if length:  # array elements are aligned (and strided) like vec4s
+            alignment = size = 16
+        offset = (offset + alignment - 1) // alignment * alignment
+        layout[name] = offset, format_, size, length
+        offset += size * max(length, 1)
+
+    return layout, (offset + 15) // 16 * 16
+
+
+def glsl_fields(fields: list) -> str:
+    """
+    The declarations of the fields of a uniform block on a single line, the value of a #define that the shaders
+    put into their block, e.g. 'vec3 clr_bg; float frame_time; vec3 species_colors[ 4 ];'
+    """
+    return ' '.join(f'{glsl_type} {name}[ {length[0]} ];' if length else f'{glsl_type} {name};'
+                    for name, glsl_type, *length in fields)
+
+
+"""
+parameter block
+"""
+
+
+class ParameterBlock:
+    """
+    Typed parameters in a std140 uniform buffer that is bound to a uniform block binding point,
+    every shader that reads the parameters declares the same block, e.g.:
+        layout( std140, binding = 0 ) uniform Parameters { float frame_time; ... };
+
+    Fields are set like the uniforms of a program (block['frame_time'] = 0.016), only changed values mark a field as
+    dirty. upload() writes the dirty fields (merged into contiguous ranges) once per frame.
+    The programs read the buffer, so a reloaded program sees the current parameters without pushing them again.
+    """
+    def __init__(self, ctx: mgl.Context, fields: list, binding: int = 0) -> None:
+        """Creates the buffer, fields: (name, glsl type) or (name, glsl type, array length)."""
+        self.ctx = ctx
+        self.binding = binding
+        self.layout, self.size = std140_layout(fields)
+
+        self.data = bytearray(self.size)
+        self.values = {}
+        self.dirty = set()
+        self.buffer = ctx.buffer(reserve=self.size)  # zeros, like the data
+        self.bind()
+
+    def __setitem__(self, name: str, value) -> None:
+        if name in self.values and self.values[name] == value:
+            return
+
+        offset, format_, stride, length = self.layout[name]
+        if length:
+            for index, element in enumerate(value[:length]):
+                struct.pack_into(f'<{format_}', self.data, offset + index * stride,
+                                 *(element if isinstance(element, (tuple, list)) else (element,)))
+        else:
+            struct.pack_into(f'<{format_}', self.data, offset,
+                             *(value if isinstance(value, (tuple, list)) else (value,)))
+
+        self.values[name] = value
+        self.dirty.add(name)
+
+    def __getitem__(self, name: str):
+        return self.values[name]
+
+    def update(self, values: dict) -> None:
+        for name, value in values.items():
+            self[name] = value
+
+    def dirty_ranges(self) -> list:
+        """the byte ranges (start, end) of the dirty fields, neighbouring fields are merged"""
+        ranges = []
+        for name in sorted(self.dirty, key=lambda field: self.layout[field][0]):
+            offset, format_, stride, length = self.layout[name]
+            end = offset + stride * max(length, 1)
+            if ranges and offset <= ranges[-1][1] + 16:  # a small gap is cheaper than another write
+                ranges[-1] = ranges[-1][0], max(ranges[-1][1], end)
+            else:
+                ranges.append((offset, end))
+        return ranges
+
+    def upload(self) -> None:
+        """write the dirty fields to the buffer and bind it (the binding point is shared by all programs)"""
+        if self.dirty:
+            for start, end in self.dirty_ranges():
+                self.buffer.write(bytes(self.data[start:end]), offset=start)
+            self.dirty.clear()
+        self.bind()
+
+    def bind(self) -> None:
+        self.buffer.bind_to_uniform_block(self.binding)
+
+    def check(self, program, name: str = 'Parameters') -> None:
+        """raise a ValueError if the block of the program does not have the size of the fields (std140)"""
+        block = program.get(name, None)
+        if block is None:  # the program does not read the parameters, the block has been optimized away
+            return
+        if block.size != self.size:
+            raise ValueError(f'the {name} block of the program has {block.size} bytes, the fields have {self.size} '
+                             f'(the block has to be declared with the fields of the ParameterBlock)')
+
+    def release(self) -> None:
+        self.buffer.release()
@@ -0,0 +1,164 @@
+from logging import getLogger
+from logger import MetricsChannel
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from pathlib import Path
+import numpy
+import moderngl as mgl
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+PERCENTILES = (50, 95, 99)
+
+
+"""
+profiling
+"""
+
+
+class FrameProfiler:
+    """
+    Measures where the frame time goes: GL timer queries around the passes on the GPU and
+    perf_counter around the python side work, summed per frame and kept in rolling buffers of history frames.
+    The results of the timer queries are read latency frames after they have been issued, so reading them
+    does not wait for the GPU (GPU timers can not be nested, because only one timer query can be active).
+    Every frame can be appended to a CSV file (written by the thread of a MetricsChannel, the rows that it drops are
+    counted and logged when the file is closed), every log_interval frames the percentiles can be logged.
+    A disabled profiler does not create any queries, its timers are null contexts.
+    """
+    def __init__(self, ctx: mgl.Context, enabled: bool = True, history: int = 300, latency: int = 3,
+                 csv_path: Path = None, log_interval: int = 0) -> None:
+        self.ctx = ctx
+        self.enabled = enabled
+        self.history = history
+        self.log_interval = log_interval
+
+        # timings in milliseconds per frame: {'gpu': {pass: deque}, 'cpu': {timer: deque}}
+        self.samples = {'gpu': {}, 'cpu': {}}
+        self.frames = 0
+
+        # the queries of the last latency frames: [[(pass, query), ...], ...] and the unused queries
+        self.query_frames = [[] for _ in range(latency)]
+        self.query_index = 0
+        self.free_queries = []
+
+        self.cpu_times = {}  # cpu timings of the current frame
+
+        self.csv_metrics = None
+        if csv_path is not None:
+            self.open_csv(csv_path)
+
+    def open_csv(self, csv_path: Path) -> None:
+        """write one row per frame to the given CSV file, the columns are defined by the first complete frame"""
+        self.close_csv()
+        self.csv_metrics = MetricsChannel(Path(csv_path), 'csv', append=False)
+
+    def close_csv(self) -> None:
+        """close the CSV file"""
+        if self.csv_metrics is not None:
+            self.csv_metrics.close()
+            self.csv_metrics = None
+
+    # ----------
+    # timers
+    # ----------
+
+    def gpu(self, name: str):
+        """context manager: measures the GPU time of the commands that are issued inside of it (not nestable)"""
+        return self.gpu_timer(name) if self.enabled else nullcontext()
+
+    def cpu(self, name: str):
+        """context manager: measures the time that the python code inside of it takes"""
+        return self.cpu_timer(name) if self.enabled else nullcontext()
+
+    @contextmanager
+    def gpu_timer(self, name: str):
+        query = self.free_queries.pop() if self.free_queries else self.ctx.query(time=True)
+        with query:
+            yield
+        self.query_frames[self.query_index].append((name, query))
+
+    @contextmanager
+    def cpu_timer(self, name: str):
+        start = perf_counter()
+        yield
+        self.cpu_times[name] = self.cpu_times.get(name, 0.0) + (perf_counter() - start) * 1e3
+
+    def end_frame(self) -> None:
+        """called once at the end of every frame: collect the timings of the oldest frame in flight"""
+        if not self.enabled:
+            return
+
+        self.query_index = (self.query_index + 1) % len(self.query_frames)
+        gpu_times = {}
+        for name, query in self.query_frames[self.query_index]:  # issued latency frames ago
+            gpu_times[name] = gpu_times.get(name, 0.0) + query.elapsed / 1e6
+            self.free_queries.append(query)
+        self.query_frames[self.query_index] = []
+
+        self.add_samples('gpu', gpu_times)
+        self.add_samples('cpu', self.cpu_times)
+        self.frames += 1
+
+        if self.csv_metrics is not None and gpu_times:
+            self.write_csv(gpu_times, self.cpu_times)
+        if self.log_interval and self.frames % self.log_interval == 0:
+            self.log()
+
+        self.cpu_times = {}
+
+    def add_samples(self, kind: str, times: dict) -> None:
+        for name, milliseconds in times.items():
+            if name not in self.samples[kind]:
+                self.samples[kind][name] = deque(maxlen=self.history)
+            self.samples[kind][name].append(milliseconds)
+
+    # ----------
+    # results
+    # ----------
+
+    def statistics(self, kind: str, name: str) -> tuple:
+        """the percentiles (p50, p95, p99) of a timer in milliseconds"""
+        return tuple(float(value) for value in numpy.percentile(self.samples[kind][name], PERCENTILES))
+
+    def report(self) -> list:
+        """one line per timer: kind, name, mean, p50, p95, p99 (milliseconds)"""
+        return [
+            (kind, name, float(numpy.mean(samples)), *self.statistics(kind, name))
+            for kind in ('gpu', 'cpu') for name, samples in self.samples[kind].items() if samples
+        ]
+
+    def log(self) -> None:
+        """write the percentiles of all timers to the log"""
+        for kind, name, mean, p50, p95, p99 in self.report():
+            logger.info(f'{kind} {name}: mean {mean:.3f} ms, p50 {p50:.3f} ms, p95 {p95:.3f} ms, p99 {p99:.3f} ms')
+
+    def write_csv(self, gpu_times: dict, cpu_times: dict) -> None:
+        """the gpu columns belong to an older frame than the cpu columns (see latency)"""
+        self.csv_metrics.record('frame', frame=self.frames,
+                                **{f'gpu_{name}': f'{value:.4f}' for name, value in gpu_times.items()},
+                                **{f'cpu_{name}': f'{value:.4f}' for name, value in cpu_times.items()})
+
+    def reset(self) -> None:
+        """forget all samples (e.g. after changing a setting)"""
+        self.samples = {'gpu': {}, 'cpu': {}}
+
+    def release(self) -> None:
+        """release the queries and close the CSV file"""
+        self.close_csv()
+        self.free_queries.clear()
+        self.query_frames = [[] for _ in self.query_frames]
@@ -0,0 +1,127 @@
+from logging import getLogger
+from .shader_source import apply_defines
+from collections import deque
+from functools import partial
+from hashlib import sha1
+from pathlib import Path
+import moderngl as mgl
+import os
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+driver shader cache
+"""
+
+
+# the drivers write their compiled programs below this directory
+SHADER_CACHE_DIRECTORY = Path('./cache/shaders')
+
+
+def enable_driver_shader_cache(directory: Path = SHADER_CACHE_DIRECTORY) -> None:
+    """
+    moderngl can neither get nor load program binaries (glGetProgramBinary / glProgramBinary),
+    so the compiled programs are persisted across launches by the disk caches of the drivers instead.
+    Mesa and the NVIDIA driver read these variables when a context is created, so this has to be called before.
+    Variables that are set already are left alone.
+    """
+    directory = Path(directory).resolve()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    os.environ.setdefault('MESA_SHADER_CACHE_DIR', str(directory / 'mesa'))
+    os.environ.setdefault('__GL_SHADER_DISK_CACHE', '1')
+    os.environ.setdefault('__GL_SHADER_DISK_CACHE_PATH', str(directory / 'nvidia'))
+
+
+"""
+program cache
+"""
+
+
+class ProgramCache:
+    """
+    Compiled programs, keyed by the contents of their shader files and the defines,
+    so a shader directory is compiled once however often it is selected (and again once one of its files changes).
+    The programs belong to the cache, they must not be released by the caller.
+
+    Programs can be queued with precompile_*() and are compiled one per call of precompile_next() (once per frame):
+    GL objects have to be created on the thread of the context, so the work is spread over frames
+    instead of running on another thread.
+    """
+    def __init__(self, ctx: mgl.Context, resource_dir: Path) -> None:
+        self.ctx = ctx
+        self.resource_dir = Path(resource_dir)
+        self.programs = {}
+        self.queue = deque()
+
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, path) -> str:
+        """the source of a shader file, relative to the resource dir"""
+        with open(self.resource_dir / path, 'r', encoding='utf-8') as shader_file:
+            return shader_file.read()
+
+    @staticmethod
+    def key(sources: list, defines: dict = None) -> tuple:
+        """the digests of the sources and the defines"""
+        return (tuple(sha1(source.encode('utf-8')).hexdigest() for source in sources),
+                tuple(sorted((name, str(value)) for name, value in (defines or {}).items())))
+
+    def lookup(self, key: tuple, compile_program):
+        """the cached program with the given key, compiled on a miss"""
+        program = self.programs.get(key)
+        if program is None:
+            self.misses += 1
+            program = self.programs[key] = compile_program()
+        else:
+            self.hits += 1
+        return program
+
+    def compute_shader(self, path, defines: dict = None) -> mgl.ComputeShader:
+        """the compute shader of the given file with the given defines"""
+        source = self.read(path)
+        return self.lookup(self.key([source], defines),
+                           lambda: self.ctx.compute_shader(apply_defines(source, defines)))
+
+    def program(self, vertex_shader, fragment_shader, defines: dict = None) -> mgl.Program:
+        """the program of the given vertex and fragment shader files with the given defines"""
+        sources = self.read(vertex_shader), self.read(fragment_shader)
+        return self.lookup(self.key(list(sources), defines),
+                           lambda: self.ctx.program(vertex_shader=apply_defines(sources[0], defines),
+                                                    fragment_shader=apply_defines(sources[1], defines)))
+
+    # ----------
+    # precompilation
+    # ----------
+
+    def precompile_compute_shader(self, path, defines: dict = None) -> None:
+        self.queue.append(partial(self.compute_shader, path, defines))
+
+    def precompile_program(self, vertex_shader, fragment_shader, defines: dict = None) -> None:
+        self.queue.append(partial(self.program, vertex_shader, fragment_shader, defines))
+
+    def precompile_next(self) -> bool:
+        """compile the next queued program (if it is not cached already), returns whether one was queued"""
+        if not self.queue:
+            return False
+
+        try:
+            self.queue.popleft()()
+        except Exception as e:  # a broken shader directory only fails once it is selected
+            logger.warning(f'precompiling failed: {e}')
+        return True
+
+    def release(self) -> None:
+        self.queue.clear()
+        for program in self.programs.values():
+            program.release()
+        self.programs = {}
@@ -0,0 +1,165 @@
+from logging import getLogger
+from collections import deque
+from statistics import median
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+adaptive quality
+"""
+
+
+class AdaptiveQualityController:
+    """
+    Holds a target frame time by stepping quality settings (knobs) down when the frames take too long
+    and up again when there is headroom.
+    knobs: {name: [values from the lowest to the highest quality]}, in the order in which they are lowered.
+    A change is always undone first: lowering takes back the latest raise, raising takes back the latest lowering,
+    beyond that the last knob that is not at its highest quality is raised. So the knobs walk along the same ladder
+    in both directions, e.g. a resolution that has been raised above the start is lowered before the substeps.
+
+    The frame times are collected in windows of window_frames frames and compared by their median (a single stutter
+    does not count). Hysteresis keeps the controller from oscillating:
+        - a knob is lowered after slow_windows windows above target * (1 + tolerance),
+        - it is raised after fast_windows windows below target * (1 - headroom),
+        - the windows right after a change (which include the cost of the change itself) are ignored,
+        - a raise that has to be undone right away doubles the patience for that raise the next time.
+    With vsync, the frame time never drops below the refresh interval, a target at the refresh interval
+    can only lower the quality then.
+    """
+    def __init__(self, knobs: dict, start: dict = None, target_frame_time: float = 1 / 60,
+                 window_frames: int = 30, tolerance: float = 0.1, headroom: float = 0.25,
+                 slow_windows: int = 2, fast_windows: int = 4, cooldown_windows: int = 2) -> None:
+        """Starts every knob at the given value (at its highest quality if it has none)."""
+        self.knobs = {name: list(values) for name, values in knobs.items()}
+        start = start or {}
+        self.levels = {
+            name: values.index(start[name]) if start.get(name) in values else len(values) - 1
+            for name, values in self.knobs.items()
+        }
+
+        self.enabled = False
+        self.target_frame_time = target_frame_time
+        self.window_frames = window_frames
+        self.tolerance = tolerance
+        self.headroom = headroom
+        self.slow_windows = slow_windows
+        self.fast_windows = fast_windows
+        self.cooldown_windows = cooldown_windows
+
+        self.frame_times = []
+        self.measured = 0.0  # the median frame time of the last window (s)
+        self.slow = 0  # consecutive windows above and below the target
+        self.fast = 0
+        self.cooldown = 0
+
+        self.lowered = []  # the knobs that have been lowered and raised (and not taken back yet), the latest last
+        self.raised = []
+        self.last_raise = None  # (name, level, window) of the last raise, to notice a raise that did not fit
+        self.failed_raises = {}  # (name, level): the number of raises to that level that had to be undone
+        self.windows = 0
+        self.decisions = deque(maxlen=8)  # the latest changes, shown in the ui
+
+    @property
+    def values(self) -> dict:
+        """the current value of every knob"""
+        return {name: self.knobs[name][level] for name, level in self.levels.items()}
+
+    def reset(self) -> None:
+        """forget the collected frame times (e.g. after a restart, which stalls a frame)"""
+        self.frame_times.clear()
+        self.slow = self.fast = 0
+        self.cooldown = self.cooldown_windows
+
+    def update(self, frame_time: float) -> dict:
+        """
+        called once per displayed frame with its frame time (s): returns the knobs that have been changed
+        by this frame {name: value}, an empty dict if nothing changed
+        """
+        if not self.enabled or frame_time <= 0.0:
+            return {}
+
+        self.frame_times.append(frame_time)
+        if len(self.frame_times) < self.window_frames:
+            return {}
+
+        self.measured = median(self.frame_times)
+        self.frame_times.clear()
+        self.windows += 1
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return {}
+
+        if self.measured > self.target_frame_time * (1.0 + self.tolerance):
+            self.slow, self.fast = self.slow + 1, 0
+            if self.slow >= self.slow_windows:
+                return self.lower_quality()
+        elif self.measured < self.target_frame_time * (1.0 - self.headroom):
+            self.slow, self.fast = 0, self.fast + 1
+            return self.raise_quality()
+        else:
+            self.slow = self.fast = 0
+        return {}
+
+    def lower_quality(self) -> dict:
+        """take back the latest raise, or lower the first knob that is not at its lowest quality yet"""
+        names = [self.raised[-1]] if self.raised else list(self.levels)
+        for name in names:
+            level = self.levels[name]
+            if level == 0:
+                continue
+
+            if self.raised:
+                self.raised.pop()
+            else:
+                self.lowered.append(name)
+            if self.last_raise is not None and self.last_raise[:2] == (name, level) and \
+                    self.windows - self.last_raise[2] <= self.cooldown_windows + self.slow_windows + 1:
+                self.failed_raises[name, level] = self.failed_raises.get((name, level), 0) + 1
+            self.last_raise = None
+            return self.change(name, level - 1)
+        return {}
+
+    def raise_quality(self) -> dict:
+        """
+        take back the latest lowering, or raise the last knob that is not at its highest quality yet,
+        once there has been headroom long enough
+        """
+        names = [self.lowered[-1]] if self.lowered else list(reversed(self.levels))
+        for name in names:
+            level = self.levels[name]
+            if level == len(self.knobs[name]) - 1:
+                continue
+
+            # a raise that had to be undone before waits twice as long for every failure (up to 64 times)
+            if self.fast < self.fast_windows << min(self.failed_raises.get((name, level + 1), 0), 6):
+                return {}
+            if self.lowered:
+                self.lowered.pop()
+            else:
+                self.raised.append(name)
+            self.last_raise = name, level + 1, self.windows
+            return self.change(name, level + 1)
+        return {}
+
+    def change(self, name: str, level: int) -> dict:
+        """set a knob to a level and record the decision"""
+        previous = self.knobs[name][self.levels[name]]
+        self.levels[name] = level
+        value = self.knobs[name][level]
+
+        decision = f'{name}: {previous} -> {value} (frame time {self.measured * 1000:.1f} ms, ' \
+                   f'target {self.target_frame_time * 1000:.1f} ms)'
+        self.decisions.appendleft(decision)
+        logger.info(f'adaptive quality: {decision}')
+
+        self.reset()
+        return {name: value}
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+
+"""
+shader sources
+"""
+
+
+def apply_defines(source: str, defines: dict = None) -> str:
+    """
+    Replaces the values of the #define directives in the given shader source,
+    just like moderngl-window does for load_compute_shader(..., defines={...}).
+    """
+    if not defines:
+        return source
+
+    lines = source.splitlines()
+    for line_number, line in enumerate(lines):
+        words = line.strip().split()
+        if len(words) >= 2 and words[0] == '#define' and words[1] in defines:
+            lines[line_number] = f'#define {words[1]} {defines[words[1]]}'
+
+    return '\n'.join(lines)
+
+
+def load_shader_source(path: Path, defines: dict = None) -> str:
+    """Reads a shader file and applies the given defines."""
+    with open(path, 'r', encoding='utf-8') as shader_file:
+        return apply_defines(shader_file.read(), defines)
@@ -0,0 +1,63 @@
+"""
+simulation clock
+"""
+
+
+class SimulationClock:
+    """
+    A fixed-timestep clock that decides how many simulation steps are run per displayed frame.
+    The real frame times are accumulated into whole time steps: every time step that is due runs substeps
+    simulation steps (times fast_forward), each of which advances the simulation by time_step.
+    The speed of the simulation is therefore independent of the refresh rate of the display,
+    and at most max_time_steps are caught up per frame, so a stalled frame can not make the agents jump
+    (or make the next frames even slower).
+    """
+    def __init__(self, time_step: float = 1 / 60, substeps: int = 1, max_time_steps: int = 4) -> None:
+        self.time_step = time_step
+        self.substeps = substeps  # simulation steps per time step of real time (per frame at 1 / time_step fps)
+        self.fast_forward = 1  # multiplies the substeps
+        self.max_time_steps = max_time_steps
+
+        self.paused = False
+        self.pending_steps = 0  # single steps that have been requested while paused
+        self.accumulator = 0.0  # the real time that has not been simulated yet (s)
+
+        self.steps = 0  # simulation steps since the start
+        self.time = 0.0  # simulation time since the start
+
+    def toggle_pause(self) -> None:
+        """pause or resume the simulation (the single steps that have not been run yet are dropped)"""
+        self.paused = not self.paused
+        self.pending_steps = 0
+        self.accumulator = 0.0
+
+    def single_step(self) -> None:
+        """advance a paused simulation by exactly one step during the next frame (a running one ignores this)"""
+        if self.paused:
+            self.pending_steps += 1
+
+    def reset(self) -> None:
+        """reset the step counter and the simulation time (e.g. after a restart)"""
+        self.steps = 0
+        self.time = 0.0
+
+    def tick(self, frame_time: float = None) -> int:
+        """
+        called once per displayed frame with its real frame time (s): returns the number of simulation steps
+        to run during this frame; without a frame time a single time step is due (e.g. for running uncapped)
+        """
+        if self.paused:
+            steps, self.pending_steps = self.pending_steps, 0
+        elif frame_time is None:
+            steps = self.substeps * self.fast_forward
+        else:
+            self.accumulator += frame_time
+            time_steps = int(self.accumulator / self.time_step)
+            self.accumulator -= time_steps * self.time_step
+            if time_steps > self.max_time_steps:  # a stall: the rest of it is dropped
+                time_steps, self.accumulator = self.max_time_steps, 0.0
+            steps = time_steps * self.substeps * self.fast_forward
+
+        self.steps += steps
+        self.time += steps * self.time_step
+        return steps
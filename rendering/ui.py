@@ -0,0 +1,137 @@
+from logging import getLogger
+from .capture import CAPTURE_FORMATS, WindowCapture
+from .profiler import FrameProfiler
+from .frame_pacing import FramePacer, HISTOGRAM_BINS
+from datetime import datetime
+from pathlib import Path
+import numpy
+import imgui
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+imgui windows that the simulation windows share
+(not imported by the package, the headless runners do not need imgui)
+"""
+
+
+def render_capture_window(recorder: WindowCapture) -> bool:
+    """the format and the [RECORD] / [STOP] buttons of a recording, returns whether a recording has been started"""
+    started = False
+    if imgui.begin('CAPTURE'):
+        imgui.push_item_width(imgui.get_window_width() * 0.75)
+
+        if recorder.capture is None:
+            capture_format = CAPTURE_FORMATS.index(recorder.capture_format)
+            _, capture_format = imgui.combo('Format', capture_format, CAPTURE_FORMATS)
+            recorder.capture_format = CAPTURE_FORMATS[capture_format]
+
+            if imgui.button('[RECORD]', 0, 25):
+                started = recorder.start()
+            imgui.text(recorder.status)
+        else:
+            if imgui.button('[STOP]', 0, 25):
+                recorder.stop()
+            else:
+                imgui.text(f'{recorder.capture.frames} frames captured, {recorder.capture.written} written, '
+                           f'{recorder.capture.dropped} dropped')
+
+        imgui.pop_item_width()
+        imgui.end()
+    return started
+
+
+def render_performance_window(profiler: FrameProfiler, directory: Path, name: str) -> bool:
+    """
+    the percentiles of the gpu passes and the cpu timers of the last frames,
+    the CSV files are written to <directory>/<name>_performance_<timestamp>.csv; returns whether the window stays open
+    """
+    expanded, opened = imgui.begin('PERFORMANCE', True)
+    if expanded:
+        imgui.columns(5, 'performance')
+        for heading in ('timer', 'mean', 'p50', 'p95', 'p99'):
+            imgui.text(heading)
+            imgui.next_column()
+        imgui.separator()
+        for kind, timer, *milliseconds in profiler.report():
+            imgui.text(f'{kind} {timer}')
+            imgui.next_column()
+            for value in milliseconds:
+                imgui.text(f'{value:.3f} ms')
+                imgui.next_column()
+        imgui.columns(1)
+
+        changed, log_percentiles = imgui.checkbox('Log every 300 frames', profiler.log_interval > 0)
+        if changed:
+            profiler.log_interval = 300 if log_percentiles else 0
+        changed, write_csv = imgui.checkbox('Write CSV', profiler.csv_metrics is not None)
+        if changed and write_csv:
+            timestamp = datetime.now().strftime("%Y-%m-%d_-_%H-%M-%S")
+            profiler.open_csv(Path(directory) / f'{name}_performance_{timestamp}.csv')
+        elif changed:
+            profiler.close_csv()
+        if profiler.csv_metrics is not None and profiler.csv_metrics.dropped:
+            imgui.text(f'{profiler.csv_metrics.dropped} rows dropped (the writer could not keep up)')
+    imgui.end()
+    return opened
+
+
+def export_frame_times(pacer: FramePacer, directory: Path, name: str) -> None:
+    """write the frame times to <directory>/<name>_frame_times_<timestamp>.csv (and the histogram next to it)"""
+    timestamp = datetime.now().strftime("%Y-%m-%d_-_%H-%M-%S")
+    try:
+        path = pacer.export(Path(directory) / f'{name}_frame_times_{timestamp}.csv')
+        pacer.status = f'exported to {path}'
+    except OSError as e:
+        logger.exception(e)
+        pacer.status = f'exporting failed: {e}'
+
+
+def render_frame_pacing_window(pacer: FramePacer, config, directory: Path, name: str,
+                               simulation_only: bool = False) -> bool:
+    """
+    vsync, the fps cap (and the simulation only mode, for windows that simulate) stored in the frame_pacing_* values
+    of the config, the frame times of the last frames and the latest stutters; returns whether the window stays open
+    """
+    expanded, opened = imgui.begin('FRAME PACING', True)
+    if expanded:
+        changed, config.frame_pacing_vsync = imgui.checkbox('VSync', config.frame_pacing_vsync)
+        if changed:
+            pacer.set_vsync(config.frame_pacing_vsync)
+        changed, config.frame_pacing_fps_cap = imgui.slider_int(
+            'FPS Cap (0: none)', config.frame_pacing_fps_cap, 0, 240
+        )
+        if changed:
+            pacer.fps_cap = config.frame_pacing_fps_cap
+        if simulation_only:
+            changed, config.frame_pacing_simulation_only = imgui.checkbox(
+                'Simulation only (uncapped, redrawn 4 times per second)', config.frame_pacing_simulation_only
+            )
+            if changed:
+                pacer.simulation_only = config.frame_pacing_simulation_only
+
+        if pacer.frame_times:
+            imgui.plot_lines('frame times', numpy.array(pacer.frame_times, dtype='f4'),
+                             scale_min=0.0, graph_size=(0, 60))
+            imgui.plot_histogram('histogram', pacer.histogram(),
+                                 overlay_text=f'0 - {HISTOGRAM_BINS[-1]:.0f} ms', graph_size=(0, 60))
+        statistics = pacer.statistics()
+        imgui.text(f'median {statistics["median"]:.1f} ms | p99 {statistics["p99"]:.1f} ms | '
+                   f'cpu {statistics["cpu_median"]:.1f} ms | stutters {statistics["stutter_share"]:.1%} | '
+                   f'{pacer.diagnosis()}')
+        for stutter in pacer.stutters:
+            imgui.text(stutter)
+
+        if imgui.button('[EXPORT]', 0, 25):
+            export_frame_times(pacer, directory, name)
+        imgui.text(pacer.status)
+    imgui.end()
+    return opened
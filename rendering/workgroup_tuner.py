@@ -0,0 +1,122 @@
+from logging import getLogger
+from config import WorkgroupSizeConfig
+from math import ceil
+from time import perf_counter
+import moderngl as mgl
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+# group sizes that are used if there is no tuner
+DEFAULT_GROUP_SIZE_1D = (64, 1)
+DEFAULT_GROUP_SIZE_2D = (8, 8)
+
+# candidates for compute shaders with one invocation per agent (1D grid)
+GROUP_SIZES_1D = [(32, 1), (64, 1), (128, 1), (256, 1), (512, 1), (1024, 1)]
+# candidates for compute shaders with one invocation per texel (2D grid)
+GROUP_SIZES_2D = [(8, 4), (8, 8), (16, 8), (16, 16), (32, 8), (32, 16), (32, 32)]
+
+
+def group_size_defines(group_size: tuple) -> dict:
+    """the defines that set the local group size of a compute shader"""
+    return {
+        'group_size_x': group_size[0],
+        'group_size_y': group_size[1]
+    }
+
+
+def tuning_cache_key(program_name: str, dimensions: tuple = ()) -> str:
+    """the key of a tuned group size in the cache: the program and the size of the dispatch, e.g. 'blur (640x360)'"""
+    return f'{program_name} ({"x".join(str(size) for size in dimensions)})' if dimensions else program_name
+
+
+def group_count(invocations: tuple, group_size: tuple) -> tuple:
+    """the number of work groups that is needed to cover the given number of invocations (x, y)"""
+    return ceil(invocations[0] / group_size[0]), ceil(invocations[1] / group_size[1])
+
+
+"""
+tuning
+"""
+
+
+class WorkgroupSizeTuner:
+    """
+    Benchmarks candidate local group sizes of a compute shader and picks the fastest one.
+    The dispatches are timed on the CPU side after ctx.finish(), because not every driver implements
+    timer queries (Mesa llvmpipe reports a constant elapsed time).
+    The results are cached per GL renderer string and per size of the dispatch (the texture or the number of agents,
+    which change at runtime), so later launches skip the search.
+    """
+    def __init__(self, ctx: mgl.Context, cache: WorkgroupSizeConfig = None, repetitions: int = 5) -> None:
+        self.ctx = ctx
+        self.cache = cache if cache is not None else WorkgroupSizeConfig()
+        self.repetitions = repetitions
+
+        self.renderer = ctx.info['GL_RENDERER']
+        self.max_invocations = ctx.info['GL_MAX_COMPUTE_WORK_GROUP_INVOCATIONS']
+
+    def cached_group_size(self, program_name: str, dimensions: tuple = ()) -> tuple:
+        """the group size that has been tuned before for the program and the size of its dispatch, None if not"""
+        return self.cache.get_group_size(self.renderer, tuning_cache_key(program_name, dimensions))
+
+    def tune(self, program_name: str, compile_program, dispatch, candidates: list, default: tuple,
+             dimensions: tuple = ()) -> tuple:
+        """
+        Returns the fastest group size for the program, or the default if no candidate could be run.
+            compile_program(group_size) -> mgl.ComputeShader: compiles the program with the given group size
+            dispatch(program, group_size): runs the program once with the given group size
+            dimensions: the size of the dispatch, e.g. the texture dimensions or (number of agents,)
+        """
+        group_size = self.cached_group_size(program_name, dimensions)
+        if group_size is not None:
+            return group_size
+
+        timings = {}
+        for candidate in candidates:
+            if candidate[0] * candidate[1] > self.max_invocations:
+                continue
+
+            try:
+                program = compile_program(candidate)
+            except Exception as e:
+                logger.debug(f'{program_name}: group size {candidate} is not supported: {e}')
+                continue
+
+            dispatch(program, candidate)  # warm up
+            self.ctx.finish()
+
+            start = perf_counter()
+            for _ in range(self.repetitions):
+                dispatch(program, candidate)
+            self.ctx.finish()
+            timings[candidate] = (perf_counter() - start) / self.repetitions
+
+            program.release()
+
+        if not timings:  # not cached, the next launch tries again
+            logger.warning(f'{program_name}: none of the group sizes {candidates} could be run on {self.renderer}, '
+                           f'using {default}')
+            return default
+
+        group_size = min(timings, key=timings.get)
+        cache_key = tuning_cache_key(program_name, dimensions)
+        logger.info(f'{cache_key}: fastest group size on {self.renderer} is {group_size} '
+                    f'({timings[group_size] * 1e3:.3f} ms)')
+
+        self.cache.set_group_size(self.renderer, cache_key, group_size)
+        self.cache.save()
+
+        return group_size
@@ -1 +1,9 @@
-from .slime_mold_window import SlimeMoldWindow
+from .simulation import SlimeMoldSimulation
+
+
+def __getattr__(name: str):
+    """the window is imported when it is first used, the headless modules do not need moderngl_window and imgui"""
+    if name == 'SlimeMoldWindow':
+        from .slime_mold_window import SlimeMoldWindow
+        return SlimeMoldWindow
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,150 @@
+import numpy
+import moderngl as mgl
+
+
+"""
+spawn layouts
+"""
+
+
+# the spawn layouts, their index is passed to seed_compute_shader.glsl
+SPAWN_LAYOUTS = ['uniform', 'disc', 'ring', 'centre-facing']
+
+# the number of agents that are generated and uploaded at once by the host fallback
+CHUNK_SIZE = 1 << 16
+
+
+"""
+storage layouts
+"""
+
+
+# the layouts of the agent buffer: the size of an agent in bytes
+#   float:  x, y, angle and species as float32
+#   packed: two uint32, x and y as 24 bit fixed point numbers, the angle in 12 bits and the species in 4 bits
+#           word 0: x << 8 | angle & 0xff, word 1: species << 28 | angle >> 8 << 24 | y
+AGENT_LAYOUTS = {'float': 16, 'packed': 8}
+
+POSITION_BITS = 24
+ANGLE_STEPS = 1 << 12
+
+
+def position_fraction_bits(dimensions: tuple) -> int:
+    """the fractional bits of the packed positions: whatever the integer part of the largest coordinate leaves"""
+    return POSITION_BITS - int(numpy.ceil(numpy.log2(max(dimensions) + 1)))
+
+
+def pack_agents(agents: numpy.ndarray, dimensions: tuple) -> numpy.ndarray:
+    """[[x, y, angle, species], ...] (float32) -> the packed layout (uint32, shape (n, 2)), like pack_agent()"""
+    scale = float(1 << position_fraction_bits(dimensions))
+    limit = (1 << POSITION_BITS) - 1
+    x = numpy.clip(numpy.rint(agents[:, 0] * scale), 0, limit).astype(numpy.uint32)
+    y = numpy.clip(numpy.rint(agents[:, 1] * scale), 0, limit).astype(numpy.uint32)
+    angle = numpy.rint(numpy.mod(agents[:, 2], 2 * numpy.pi) * (ANGLE_STEPS / (2 * numpy.pi))).astype(numpy.int64)
+    angle = (angle % ANGLE_STEPS).astype(numpy.uint32)
+    species = agents[:, 3].astype(numpy.uint32)
+
+    packed = numpy.empty((len(agents), 2), dtype=numpy.uint32)
+    packed[:, 0] = x << 8 | angle & 0xff
+    packed[:, 1] = species << 28 | angle >> 8 << 24 | y
+    return packed
+
+
+def unpack_agents(packed: numpy.ndarray, dimensions: tuple) -> numpy.ndarray:
+    """the packed layout (uint32, shape (n, 2)) -> [[x, y, angle, species], ...] (float32), like unpack_agent()"""
+    scale = float(1 << position_fraction_bits(dimensions))
+    agents = numpy.empty((len(packed), 4), dtype='f4')
+    agents[:, 0] = (packed[:, 0] >> 8) / scale
+    agents[:, 1] = (packed[:, 1] & 0xffffff) / scale
+    agents[:, 2] = ((packed[:, 1] >> 24 & 0xf) << 8 | packed[:, 0] & 0xff) * (2 * numpy.pi / ANGLE_STEPS)
+    agents[:, 3] = packed[:, 1] >> 28
+    return agents
+
+
+def convert_agents(data, source: str, target: str, dimensions: tuple) -> numpy.ndarray:
+    """convert agents (bytes or an array) from one layout to another, returns an array of the target layout"""
+    agents = numpy.frombuffer(data, dtype=numpy.uint32 if source == 'packed' else 'f4') \
+        .reshape(-1, AGENT_LAYOUTS[source] // 4)
+    if source == target:
+        return agents
+
+    agents = unpack_agents(agents, dimensions) if source == 'packed' else agents
+    return pack_agents(agents, dimensions) if target == 'packed' else agents
+
+
+"""
+utility
+"""
+
+
+def generate_agent_data(agent_count: int, dimensions: tuple = (1920, 1080), species_count: int = 1,
+                        layout: str = 'uniform', rng: numpy.random.Generator = None,
+                        start: int = 0, stop: int = None) -> numpy.array:
+    """
+    Generates the agents start to stop (all of them by default) of a population of agent_count agents as float32:
+    array([[x, y, angle, species]
+           [x, y, angle, species]
+           [...]])
+    The agents are grouped by species, so that neighbouring invocations share their parameters.
+    """
+    rng = rng if rng is not None else numpy.random.default_rng()
+    stop = stop if stop is not None else agent_count
+    count = stop - start
+
+    center_x, center_y = numpy.float32(dimensions[0] / 2), numpy.float32(dimensions[1] / 2)
+    max_radius = numpy.float32(min(dimensions) / 2 * 0.9)
+
+    # random values range from 0.0 to 1.0, angles are in radians (2 * pi * random)
+    if layout == 'uniform':
+        x = rng.random(count, dtype='f4')
+        x *= numpy.float32(dimensions[0])
+        y = rng.random(count, dtype='f4')
+        y *= numpy.float32(dimensions[1])
+    else:
+        # the square root makes the density of the disc uniform, the ring is the outer 20% of the disc
+        radius = rng.random(count, dtype='f4')
+        if layout == 'ring':
+            radius *= numpy.float32(0.2)
+            radius += numpy.float32(0.8)
+        else:
+            numpy.sqrt(radius, out=radius)
+        radius *= max_radius
+
+        theta = rng.random(count, dtype='f4')
+        theta *= numpy.float32(2 * numpy.pi)
+        x = numpy.cos(theta)
+        x *= radius
+        x += center_x
+        y = numpy.sin(theta, out=theta)
+        y *= radius
+        y += center_y
+
+    if layout == 'centre-facing':  # every agent looks at the center
+        angle = numpy.arctan2(center_y - y, center_x - x)
+    else:
+        angle = rng.random(count, dtype='f4')
+        angle *= numpy.float32(2 * numpy.pi)
+
+    data = numpy.empty((count, 4), dtype='f4')
+    data[:, 0], data[:, 1], data[:, 2] = x, y, angle
+    # the species index of agent i is i * species_count // agent_count
+    data[:, 3] = numpy.arange(start, stop, dtype=numpy.int64) * species_count // agent_count
+
+    return data
+
+
+def stream_agent_data(buffer: mgl.Buffer, agent_count: int, dimensions: tuple = (1920, 1080),
+                      species_count: int = 1, layout: str = 'uniform', seed: int = None,
+                      agent_layout: str = 'float') -> None:
+    """
+    Writes a new population of agents into the buffer (in the given agent layout), chunk by chunk:
+    the host never holds more than CHUNK_SIZE agents at once.
+    """
+    rng = numpy.random.default_rng(seed)
+    for start in range(0, agent_count, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, agent_count)
+        agents = generate_agent_data(agent_count, dimensions, species_count, layout, rng, start, stop)
+        buffer.write(
+            pack_agents(agents, dimensions) if agent_layout == 'packed' else agents,
+            offset=start * AGENT_LAYOUTS[agent_layout]
+        )
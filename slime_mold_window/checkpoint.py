@@ -0,0 +1,285 @@
+from logging import getLogger
+from config import SlimeMoldWindowConfig
+from .simulation import SlimeMoldSimulation, TRAIL_DTYPES
+from .agents import AGENT_LAYOUTS, convert_agents
+import numpy
+import json
+import zlib
+import struct
+from pathlib import Path
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+file format
+"""
+
+
+# preamble: magic, version, reserved, offset and length of the json header
+#   the header describes the parameters and the blocks (offset, shape, dtype, compression and chunks),
+#   it is written after the blocks, because their compressed sizes are only known once they have been written
+# blocks: the raw data of the agent buffer and the trail texture, every block starts at a page boundary,
+#   so uncompressed blocks can be memory-mapped and uploaded without reading the whole file into memory
+CHECKPOINT_MAGIC = b'SLIMECKP'
+CHECKPOINT_VERSION = 2  # 2: float trail maps with one channel per species (1: rgba8)
+PREAMBLE = struct.Struct('<8sIIQQ')
+ALIGNMENT = 4096
+
+COMPRESSIONS = ['none', 'zlib']
+
+# the number of bytes that is read back, compressed or uploaded at once
+CHUNK_SIZE = 1 << 22
+
+
+"""
+utility
+"""
+
+
+def config_parameters(config: SlimeMoldWindowConfig) -> dict:
+    """the parameters of the simulation that are stored in a checkpoint"""
+    return {
+        'simulation': {
+            'time_step': config.simulation_time_step,
+            'substeps': config.simulation_substeps
+        },
+        'agent': {
+            'count': config.number_of_agents,
+            'species_count': config.species_count,
+            'spawn_layout': config.spawn_layout,
+            'seed': config.spawn_seed,
+            'storage': config.agent_storage,
+            'sort_interval': config.agent_sort_interval
+        },
+        'species': [
+            {
+                'clr_rgb': list(species.clr_rgb),
+                'movement_speed': species.movement_speed,
+                'rotation_speed': species.rotation_speed,
+                'sensor_angle': species.sensor_angle,
+                'sensor_distance': species.sensor_distance,
+                'sensor_size': species.sensor_size
+            } for species in config.species
+        ],
+        'blur': {
+            'diffusion_speed': config.blur_diffusion_speed,
+            'evaporation_speed': config.blur_evaporation_speed
+        },
+        'trail': {
+            'precision': config.trail_precision,
+            'palette': config.trail_palette
+        }
+    }
+
+
+def apply_parameters(config: SlimeMoldWindowConfig, parameters: dict) -> None:
+    """write the parameters of a checkpoint to the config"""
+    config.simulation_time_step = parameters['simulation']['time_step']
+    config.simulation_substeps = parameters['simulation']['substeps']
+
+    config.number_of_agents = parameters['agent']['count']
+    config.species_count = parameters['agent']['species_count']
+    config.spawn_layout = parameters['agent']['spawn_layout']
+    config.spawn_seed = parameters['agent']['seed']
+    config.agent_storage = parameters['agent'].get('storage', 'float')
+    config.agent_sort_interval = parameters['agent'].get('sort_interval', 0)
+
+    for species, values in zip(config.species, parameters['species']):
+        species.clr_rgb = tuple(values['clr_rgb'])
+        species.movement_speed = values['movement_speed']
+        species.rotation_speed = values['rotation_speed']
+        species.sensor_angle = values['sensor_angle']
+        species.sensor_distance = values['sensor_distance']
+        species.sensor_size = values['sensor_size']
+
+    config.blur_diffusion_speed = parameters['blur']['diffusion_speed']
+    config.blur_evaporation_speed = parameters['blur']['evaporation_speed']
+
+    if 'trail' in parameters:  # version 2
+        config.trail_precision = parameters['trail']['precision']
+        config.trail_palette = parameters['trail']['palette']
+
+
+def convert_trail(data, block: dict, simulation: SlimeMoldSimulation):
+    """convert rows of a trail block to the format of the trail map of the simulation (e.g. rgba8 of version 1)"""
+    dtype, channels = TRAIL_DTYPES[simulation.trail_precision], simulation.trail_channels
+    if block['dtype'] == dtype and block['shape'][2] == channels:
+        return data
+
+    rows = numpy.frombuffer(data, dtype=block['dtype']).reshape(-1, *block['shape'][1:]).astype('f4')
+    if block['dtype'] == 'u1':
+        rows /= 255.0
+    converted = numpy.zeros(rows.shape[:2] + (channels,), dtype='f4')
+    converted[..., :min(channels, rows.shape[2])] = rows[..., :channels]
+    return converted.astype(dtype)
+
+
+def pad_to_alignment(file) -> None:
+    """move the end of the file to the next page boundary"""
+    file.write(b'\0' * (-file.tell() % ALIGNMENT))
+
+
+def write_block(file, shape: tuple, dtype: str, read_rows, compression: str) -> dict:
+    """
+    Writes a block of the given shape row by row (along the first axis), returns its description.
+        read_rows(start, stop) -> bytes: reads the given rows from the GPU
+    """
+    pad_to_alignment(file)
+    row_size = int(numpy.prod(shape[1:])) * numpy.dtype(dtype).itemsize
+    chunk_rows = max(1, CHUNK_SIZE // row_size)
+
+    block = {'offset': file.tell(), 'shape': list(shape), 'dtype': dtype, 'compression': compression, 'chunks': []}
+    for start in range(0, shape[0], chunk_rows):
+        stop = min(start + chunk_rows, shape[0])
+        data = read_rows(start, stop)
+
+        if compression == 'zlib':  # every chunk is compressed on its own, so it can be decompressed on its own
+            data = zlib.compress(data, 1)
+        block['chunks'].append([start, stop, file.tell(), len(data)])
+        file.write(data)
+
+    block['size'] = file.tell() - block['offset']
+    return block
+
+
+def read_block(path: Path, block: dict):
+    """
+    Yields the rows of a block chunk by chunk: (start, stop, data).
+    Uncompressed blocks are memory-mapped, only the chunk that is uploaded is paged in.
+    """
+    dtype = numpy.dtype(block['dtype'])
+    shape = tuple(block['shape'])
+
+    if block['compression'] == 'none':
+        rows = numpy.memmap(path, dtype=dtype, mode='r', offset=block['offset'], shape=shape)
+        for start, stop, _, _ in block['chunks']:
+            yield start, stop, numpy.ascontiguousarray(rows[start:stop])
+        del rows
+        return
+
+    with open(path, 'rb') as file:
+        for start, stop, offset, size in block['chunks']:
+            file.seek(offset)
+            yield start, stop, numpy.frombuffer(zlib.decompress(file.read(size)), dtype=dtype)
+
+
+"""
+checkpoints
+"""
+
+
+def save_checkpoint(path: Path, simulation: SlimeMoldSimulation, compression: str = 'none',
+                    extra: dict = None) -> dict:
+    """
+    Writes the agent buffer, the displayed trail texture and the active parameters of the simulation to a file.
+    extra can hold additional state of the caller (e.g. the simulation clock), it is stored in the header.
+    Returns the header.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'unknown checkpoint compression: {compression} (available: {", ".join(COMPRESSIONS)})')
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    width, height = simulation.texture_dimensions
+
+    header = {
+        'version': CHECKPOINT_VERSION,
+        'texture_dimensions': [width, height],
+        'shader_directory': simulation.shader_directory,
+        'seed': simulation.seed,
+        'parameters': config_parameters(simulation.config),
+        'extra': extra if extra is not None else {},
+        'blocks': {}
+    }
+    # the config can hold counts that will only be applied on the next restart
+    header['parameters']['agent']['count'] = simulation.agent_count
+    header['parameters']['agent']['species_count'] = simulation.species_count
+    header['parameters']['agent']['storage'] = simulation.agent_layout
+
+    with open(path, 'wb') as file:
+        file.write(PREAMBLE.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, 0, 0, 0))
+
+        # agent buffer in its layout: [[x, y, angle, species], ...] as float32 or packed into two uint32
+        agent_size = AGENT_LAYOUTS[simulation.agent_layout]
+        header['blocks']['agents'] = write_block(
+            file, (simulation.agent_count, agent_size // 4), 'u4' if simulation.agent_layout == 'packed' else 'f4',
+            lambda start, stop: simulation.buffer_agent_data.read(size=(stop - start) * agent_size,
+                                                                  offset=start * agent_size),
+            compression
+        )
+
+        # trail texture: float texels with one channel per species, read back in bands of rows
+        channels, dtype = simulation.trail_channels, TRAIL_DTYPES[simulation.trail_precision]
+        header['blocks']['trail'] = write_block(
+            file, (height, width, channels), dtype,
+            lambda start, stop: simulation.displayed_framebuffer.read(
+                viewport=(0, start, width, stop - start), components=channels, alignment=1, dtype=dtype
+            ),
+            compression
+        )
+
+        header_offset = file.tell()
+        header_data = json.dumps(header).encode()
+        file.write(header_data)
+
+        file.seek(0)
+        file.write(PREAMBLE.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, 0, header_offset, len(header_data)))
+
+    logger.info(f'saved checkpoint {path} ({simulation.agent_count} agents, {width}x{height}, '
+                f'{path.stat().st_size / 2 ** 20:.1f} MiB)')
+    return header
+
+
+def read_checkpoint_header(path: Path) -> dict:
+    """reads the header of a checkpoint without reading its blocks"""
+    with open(path, 'rb') as file:
+        magic, version, _, header_offset, header_length = PREAMBLE.unpack(file.read(PREAMBLE.size))
+        if magic != CHECKPOINT_MAGIC:
+            raise ValueError(f'{path} is not a slime mold checkpoint')
+        if version > CHECKPOINT_VERSION:
+            raise ValueError(f'{path} has been written by a newer version ({version} > {CHECKPOINT_VERSION})')
+
+        file.seek(header_offset)
+        return json.loads(file.read(header_length))
+
+
+def load_checkpoint(path: Path, simulation: SlimeMoldSimulation) -> dict:
+    """
+    Restores a checkpoint: the parameters are written to the config of the simulation,
+    the agent buffer and the displayed trail texture are uploaded chunk by chunk.
+    The simulation is resized to the texture dimensions of the checkpoint (without reading its state back,
+    the checkpoint overwrites it). Returns the header.
+    """
+    path = Path(path)
+    header = read_checkpoint_header(path)
+
+    width, height = header['texture_dimensions']
+    simulation.resize((width, height), resample=False)
+
+    # (re)allocates the agent and species buffers if their sizes have changed
+    apply_parameters(simulation.config, header['parameters'])
+    simulation.clear()
+
+    agent_layout = 'packed' if header['blocks']['agents']['dtype'] == 'u4' else 'float'
+    for start, stop, data in read_block(path, header['blocks']['agents']):
+        simulation.buffer_agent_data.write(
+            convert_agents(data, agent_layout, simulation.agent_layout, simulation.texture_dimensions),
+            offset=start * AGENT_LAYOUTS[simulation.agent_layout]
+        )
+
+    for start, stop, data in read_block(path, header['blocks']['trail']):
+        simulation.displayed_texture.write(convert_trail(data, header['blocks']['trail'], simulation),
+                                           viewport=(0, start, width, stop - start))
+
+    simulation.seed = header['seed']
+
+    logger.info(f'loaded checkpoint {path} ({simulation.agent_count} agents, {width}x{height})')
+    return header
@@ -0,0 +1,236 @@
+from logging import getLogger
+from config import SlimeMoldWindowConfig
+from .simulation import species_trail_weights
+from .agents import SPAWN_LAYOUTS, generate_agent_data
+import numpy
+from time import perf_counter
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+def random(x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    """the pseudo random function used by the compute shaders, applied to whole arrays"""
+    value = numpy.sin(x * numpy.float32(12.9898) + y * numpy.float32(78.233)) * numpy.float32(43758.5453)
+    return value - numpy.floor(value)
+
+
+def box_sum(values: numpy.ndarray, radius: int, margin: int = 0) -> numpy.ndarray:
+    """
+    Sum every (2 * radius + 1) x (2 * radius + 1) square of the given map.
+    Texels outside of the map count as 0 (like an out-of-bounds imageLoad). The result is extended by
+    margin texels on every side, so result[y + margin, x + margin] is the square centered at (x, y).
+    """
+    height, width = values.shape
+    padding = radius + margin
+    padded = numpy.zeros((height + 2 * padding, width + 2 * padding), dtype=numpy.float32)
+    padded[padding:padding + height, padding:padding + width] = values
+
+    # the box is separable: sum the rows first, then the columns
+    result_width, result_height = width + 2 * margin, height + 2 * margin
+    rows = padded[:, 0:result_width].copy()
+    for offset in range(1, 2 * radius + 1):
+        rows += padded[:, offset:offset + result_width]
+
+    result = rows[0:result_height].copy()
+    for offset in range(1, 2 * radius + 1):
+        result += rows[offset:offset + result_height]
+
+    return result
+
+
+"""
+simulation
+"""
+
+
+class NumpySlimeMoldEngine:
+    """
+    A headless, GPU-free implementation of the simulation step that is performed by
+    blur_compute_shader.glsl and slime_compute_shader.glsl:
+    blur -> diffusion -> evaporation, then three-sensor steering -> movement -> wall handling -> deposit.
+
+    The trail map has one float32 channel per species, like the channels of the displayed texture.
+    Agents are stored as contiguous columns (x, y, angle, species), grouped by species, and every species
+    is updated as a whole array, there are no per-agent python loops.
+    The parameters are read from the given SlimeMoldWindowConfig on every step,
+    so changing the config changes the running simulation (just like the sliders do).
+    """
+    def __init__(self, config: SlimeMoldWindowConfig = None, dimensions: tuple = (640, 360),
+                 agent_count: int = None, seed: int = None) -> None:
+        """Creates the trail map and the agents."""
+        self.config = config if config is not None else SlimeMoldWindowConfig()
+        self.dimensions = dimensions
+        self.agent_count = agent_count if agent_count is not None else self.config.number_of_agents
+        self.rng = numpy.random.default_rng(seed)
+
+        self.species_count = self.config.species_count
+        self.trail_map = None
+        self.agents = None
+
+        self.clear()
+
+    def clear(self) -> None:
+        """Resets the trail map and generates a new set of agents."""
+        self.species_count = self.config.species_count
+        self.trail_map = numpy.zeros((self.species_count, self.dimensions[1], self.dimensions[0]), dtype=numpy.float32)
+
+        # columns: x, y, angle, species (see the Agent struct in slime_compute_shader.glsl)
+        layout = self.config.spawn_layout if self.config.spawn_layout in SPAWN_LAYOUTS else SPAWN_LAYOUTS[0]
+        self.agents = numpy.ascontiguousarray(generate_agent_data(
+            self.agent_count, self.dimensions, self.species_count, layout, self.rng
+        ).T)
+
+    def agent_data(self) -> numpy.ndarray:
+        """Returns the agents in the layout of buffer_agent_data: [[x, y, angle, species], ...]"""
+        return numpy.ascontiguousarray(self.agents.T)
+
+    # ----------
+    # simulation
+    # ----------
+
+    def step(self, frame_time: float) -> None:
+        """Advances the simulation by one step: first blur the trail map, then move the agents."""
+        self.blur(frame_time)
+        self.move_agents(frame_time)
+
+    def run(self, steps: int, frame_time: float) -> float:
+        """Advances the simulation by the given number of steps, returns the achieved steps per second."""
+        start = perf_counter()
+        for _ in range(steps):
+            self.step(frame_time)
+
+        return steps / max(perf_counter() - start, 1e-9)
+
+    def blur(self, frame_time: float) -> None:
+        """blur -> diffusion -> evaporation, see blur_compute_shader.glsl"""
+        frame_time = numpy.float32(frame_time)
+
+        blurred = numpy.stack([box_sum(channel, 1) for channel in self.trail_map])
+        blurred /= numpy.float32(9)
+
+        # diffuse: linearly interpolate between the value and the blurred value
+        diffused = self.trail_map + (blurred - self.trail_map) * (
+                numpy.float32(self.config.blur_diffusion_speed) * frame_time)
+
+        # evaporate: subtract the evaporated quantity, the texture is normalized (0.0 to 1.0)
+        diffused -= numpy.float32(self.config.blur_evaporation_speed) * frame_time
+        self.trail_map = numpy.clip(diffused, 0.0, 1.0, out=diffused)
+
+    @staticmethod
+    def sense(sensor_map: numpy.ndarray, distance: int, x_texel: numpy.ndarray, y_texel: numpy.ndarray,
+              angle: numpy.ndarray) -> numpy.ndarray:
+        """sum the trail map around the sensor centers of the given agents, see get_sensor_value()"""
+        # the offset is truncated towards zero, like the ivec2 conversion in the shader;
+        # the sensor map has a margin of sensor_distance texels, so every index is inside of it
+        x_index = x_texel + (numpy.cos(angle) * distance).astype(numpy.int32)
+        y_index = y_texel + (numpy.sin(angle) * distance).astype(numpy.int32)
+        y_index *= sensor_map.shape[1]
+        y_index += x_index
+
+        return sensor_map.ravel()[y_index]
+
+    def sensor_map(self, index: int) -> numpy.ndarray:
+        """the sensor sums of the given species: the box sums of every channel, weighted by attraction/repulsion"""
+        settings = self.config.species[index]
+        weights = species_trail_weights(self.species_count)[index]
+
+        sensor_map = None
+        for channel, weight in zip(self.trail_map, weights):
+            channel_sum = box_sum(channel, settings.sensor_size, settings.sensor_distance)
+            channel_sum *= weight
+            sensor_map = channel_sum if sensor_map is None else sensor_map + channel_sum
+
+        return sensor_map
+
+    def move_agents(self, frame_time: float) -> None:
+        """three-sensor steering -> movement -> wall handling -> deposit, see slime_compute_shader.glsl"""
+        # the agents are grouped by species: every species is a contiguous slice of the columns
+        boundaries = numpy.searchsorted(self.agents[3], numpy.arange(self.species_count + 1) - 0.5)
+        boundaries[-1] = self.agent_count
+
+        # like a single dispatch, all species sense the trail map before any agent deposits
+        for index in range(self.species_count):
+            self.move_species(index, self.agents[:, boundaries[index]:boundaries[index + 1]], frame_time)
+
+        # deposit: every agent sets its texel to full brightness in the channel of its species
+        for index in range(self.species_count):
+            x, y = self.agents[0:2, boundaries[index]:boundaries[index + 1]]
+            texel_index = y.astype(numpy.int32)
+            texel_index *= self.dimensions[0]
+            texel_index += x.astype(numpy.int32)
+            self.trail_map[index].ravel()[texel_index] = 1.0
+
+    def move_species(self, index: int, agents: numpy.ndarray, frame_time: float) -> None:
+        """three-sensor steering -> movement -> wall handling for the agents of one species"""
+        settings = self.config.species[index]
+        frame_time = numpy.float32(frame_time)
+        width, height = self.dimensions
+        x, y, angle = agents[0], agents[1], agents[2]
+
+        # get the sensor values
+        margin = settings.sensor_distance
+        sensor_map = self.sensor_map(index)
+        x_texel, y_texel = x.astype(numpy.int32) + margin, y.astype(numpy.int32) + margin
+        sensor_angle = numpy.float32(settings.sensor_angle)
+
+        weight_left = self.sense(sensor_map, settings.sensor_distance, x_texel, y_texel, angle + sensor_angle)
+        weight_forward = self.sense(sensor_map, settings.sensor_distance, x_texel, y_texel, angle)
+        weight_right = self.sense(sensor_map, settings.sensor_distance, x_texel, y_texel, angle - sensor_angle)
+
+        random_steer_strength = random(x * frame_time * angle, y * frame_time * angle)
+
+        # adjust the angles based on those values, the conditions are checked in the same order as in the shader
+        forward = (weight_forward > weight_left) & (weight_forward > weight_right)
+        random_steering = ~forward & (weight_forward < weight_left) & (weight_forward < weight_right)
+        steer_right = ~forward & ~random_steering & (weight_right > weight_left)
+        steer_left = ~forward & ~random_steering & ~steer_right & (weight_left > weight_right)
+
+        steering = numpy.where(random_steering, random_steer_strength - numpy.float32(0.5), numpy.float32(0))
+        steering *= numpy.float32(2)
+        steering += numpy.where(steer_left, random_steer_strength, numpy.float32(0))
+        steering -= numpy.where(steer_right, random_steer_strength, numpy.float32(0))
+        angle += steering * (numpy.float32(settings.rotation_speed) * frame_time)
+
+        # calculate the direction and position
+        step = numpy.float32(settings.movement_speed) * frame_time
+        new_x = x + numpy.cos(angle) * step
+        new_y = y + numpy.sin(angle) * step
+
+        # handle wall collision: clamp the position and pick a random angle
+        collided = (new_x < 0.0) | (new_x >= width) | (new_y < 0.0) | (new_y >= height)
+        if collided.any():
+            new_x[collided] = numpy.minimum(width - 0.1, numpy.maximum(0.0, new_x[collided]))
+            new_y[collided] = numpy.minimum(height - 0.1, numpy.maximum(0.0, new_y[collided]))
+            angle[collided] = random(new_x[collided], new_y[collided]) * numpy.float32(2 * numpy.pi)
+
+        x[:] = new_x
+        y[:] = new_y
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='run the numpy slime mold engine and report the step rate')
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--frame-time', type=float, default=1 / 60)
+    parser.add_argument('--agents', type=int, default=None)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    arguments = parser.parse_args()
+
+    engine = NumpySlimeMoldEngine(dimensions=(arguments.width, arguments.height), agent_count=arguments.agents)
+    steps_per_second = engine.run(arguments.steps, arguments.frame_time)
+    print(f'{engine.agent_count} agents, {engine.dimensions[0]}x{engine.dimensions[1]}: '
+          f'{steps_per_second:.2f} steps/s')
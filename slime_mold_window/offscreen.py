@@ -0,0 +1,168 @@
+from logging import getLogger
+from config import SlimeMoldWindowConfig
+from .simulation import SlimeMoldSimulation, SHADER_DIRECTORY, TEXTURE_DIMENSIONS, GL_VERSION
+from .checkpoint import COMPRESSIONS, save_checkpoint, load_checkpoint, read_checkpoint_header
+from rendering import WorkgroupSizeTuner, enable_driver_shader_cache
+import numpy
+from time import perf_counter
+import moderngl as mgl
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+def create_standalone_context(backend: str = None) -> mgl.Context:
+    """
+    Creates a standalone OpenGL context without a window.
+    If no backend is given, the default backend is tried first and EGL is used as a fallback
+    (e.g. for Mesa llvmpipe on a machine without a display).
+    """
+    require = GL_VERSION[0] * 100 + GL_VERSION[1] * 10
+
+    if backend is not None:
+        return mgl.create_standalone_context(require=require, backend=backend)
+
+    try:
+        return mgl.create_standalone_context(require=require)
+    except Exception as e:
+        logger.debug(f'no default standalone context available, falling back to egl: {e}')
+        return mgl.create_standalone_context(require=require, backend='egl')
+
+
+"""
+offscreen simulation
+"""
+
+
+class OffscreenSlimeMoldRunner:
+    """
+    Runs the slime mold simulation on a standalone moderngl context:
+    the same texture, agent buffer and compute shaders as the SlimeMoldWindow,
+    but without a window, imgui, the textured quad or vsync.
+    """
+    def __init__(self, config: SlimeMoldWindowConfig = None, texture_dimensions: tuple = None,
+                 shader_directory: str = None, backend: str = None, tune_group_sizes: bool = True) -> None:
+        """Creates the standalone context and the simulation."""
+        self.config = config if config is not None else SlimeMoldWindowConfig()
+        self.texture_dimensions = texture_dimensions if texture_dimensions is not None else TEXTURE_DIMENSIONS
+
+        enable_driver_shader_cache()  # before the context is created
+        self.ctx = create_standalone_context(backend)
+        logger.info(f'offscreen context: {self.ctx.info["GL_RENDERER"]}')
+
+        self.simulation = SlimeMoldSimulation(
+            self.ctx,
+            SHADER_DIRECTORY,
+            shader_directory if shader_directory is not None else self.config.most_recent_shader_directory,
+            self.texture_dimensions,
+            self.config,
+            tuner=WorkgroupSizeTuner(self.ctx) if tune_group_sizes else None
+        )
+
+        self.steps = 0
+        self.steps_per_second = 0.0
+
+    def step(self, steps: int = 1, frame_time: float = None) -> float:
+        """
+        Advances the simulation by the given number of steps as fast as possible, returns the steps per second.
+        Every step advances the simulation by frame_time, the time step of the config by default.
+        """
+        if frame_time is None:
+            frame_time = self.config.simulation_time_step
+
+        start = perf_counter()
+        for _ in range(steps):
+            self.simulation.step(frame_time)
+        self.ctx.finish()  # wait for the GPU, otherwise only the submission would be measured
+
+        self.steps += steps
+        self.steps_per_second = steps / max(perf_counter() - start, 1e-9)
+        return self.steps_per_second
+
+    def run(self, steps: int, frame_time: float = None) -> numpy.ndarray:
+        """Advances the simulation by the given number of steps and returns the final trail map."""
+        self.step(steps, frame_time)
+        logger.info(f'{steps} steps with {self.simulation.agent_count} agents: {self.steps_per_second:.2f} steps/s')
+
+        return self.simulation.read_trail_map()
+
+    def save_checkpoint(self, path: str, compression: str = 'none') -> None:
+        """writes the state of the simulation and the number of steps to a checkpoint file"""
+        save_checkpoint(path, self.simulation, compression, extra={'steps': self.steps})
+
+    def load_checkpoint(self, path: str) -> None:
+        """restores the state of the simulation and the number of steps from a checkpoint file"""
+        header = load_checkpoint(path, self.simulation)
+        self.steps = header['extra'].get('steps', 0)
+
+    @classmethod
+    def resume(cls, path: str, config: SlimeMoldWindowConfig = None, backend: str = None,
+               tune_group_sizes: bool = True) -> 'OffscreenSlimeMoldRunner':
+        """creates a runner with the texture dimensions and shader directory of a checkpoint and restores it"""
+        header = read_checkpoint_header(path)
+        runner = cls(config, tuple(header['texture_dimensions']), header['shader_directory'],
+                     backend, tune_group_sizes)
+        runner.load_checkpoint(path)
+        return runner
+
+    def release(self) -> None:
+        """Releases the standalone context."""
+        self.ctx.release()
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='run the slime mold simulation offscreen and report the step rate')
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--frame-time', type=float, default=None, help='time step, the config value by default')
+    parser.add_argument('--agents', type=int, default=None)
+    parser.add_argument('--sort-interval', type=int, default=None, help='sort the agents every n steps (0: never)')
+    parser.add_argument('--width', type=int, default=TEXTURE_DIMENSIONS[0])
+    parser.add_argument('--height', type=int, default=TEXTURE_DIMENSIONS[1])
+    parser.add_argument('--backend', default=None, help='glcontext backend, e.g. egl')
+    parser.add_argument('--no-tuning', action='store_true', help='use the default local group sizes')
+    parser.add_argument('--output', default=None, help='save the final trail map as .npy')
+    parser.add_argument('--resume', default=None, help='continue from a checkpoint (overrides --agents and the size)')
+    parser.add_argument('--checkpoint', default=None, help='save a checkpoint after the last step')
+    parser.add_argument('--compression', default='none', choices=COMPRESSIONS)
+    arguments = parser.parse_args()
+
+    offscreen_config = SlimeMoldWindowConfig()
+    if arguments.agents is not None:
+        offscreen_config.number_of_agents = arguments.agents
+
+    if arguments.resume is not None:
+        runner = OffscreenSlimeMoldRunner.resume(arguments.resume, offscreen_config, backend=arguments.backend,
+                                                 tune_group_sizes=not arguments.no_tuning)
+    else:
+        runner = OffscreenSlimeMoldRunner(offscreen_config, (arguments.width, arguments.height),
+                                          backend=arguments.backend, tune_group_sizes=not arguments.no_tuning)
+    if arguments.sort_interval is not None:  # after resuming, a checkpoint brings its own interval
+        runner.config.agent_sort_interval = arguments.sort_interval
+
+    trail_map = runner.run(arguments.steps, arguments.frame_time)
+    width, height = runner.texture_dimensions
+    print(f'{runner.simulation.agent_count} agents, {width}x{height}: '
+          f'{runner.steps_per_second:.2f} steps/s ({runner.ctx.info["GL_RENDERER"]}), {runner.steps} steps in total')
+    if runner.config.agent_sort_interval:
+        print(f'sorted every {runner.config.agent_sort_interval} steps: {runner.simulation.sort_statistics}')
+
+    if arguments.output is not None:
+        numpy.save(arguments.output, trail_map)
+
+    if arguments.checkpoint is not None:
+        runner.save_checkpoint(arguments.checkpoint, arguments.compression)
+
+    runner.release()
@@ -0,0 +1,53 @@
+import numpy
+
+
+"""
+palettes
+"""
+
+
+# the colors of a palette at positions along the trail intensity, the background color is added at 0.0
+PALETTES = {
+    'none': None,  # every species is blended over the background in its own color
+    'fire': [(0.25, (0.5, 0.0, 0.0)), (0.5, (1.0, 0.45, 0.0)), (0.8, (1.0, 0.9, 0.3)), (1.0, (1.0, 1.0, 1.0))],
+    'inferno': [(0.3, (0.35, 0.05, 0.45)), (0.6, (0.85, 0.25, 0.25)), (0.85, (1.0, 0.75, 0.2)),
+                (1.0, (1.0, 1.0, 0.8))],
+    'ocean': [(0.3, (0.0, 0.15, 0.35)), (0.65, (0.0, 0.55, 0.75)), (1.0, (0.65, 1.0, 1.0))],
+    'aurora': [(0.3, (0.0, 0.35, 0.3)), (0.6, (0.2, 0.95, 0.55)), (1.0, (0.75, 0.55, 1.0))]
+}
+
+# the number of texels of a palette texture
+PALETTE_SIZE = 256
+
+
+def palette_lut(name: str, clr_bg: tuple, size: int = PALETTE_SIZE) -> numpy.ndarray:
+    """
+    The lookup table of a palette: rgb (uint8) of shape (size, 3), from the background color at trail intensity 0
+    to the last color of the palette at intensity 1. The 'none' palette (and an unknown one) is a gradient
+    from the background to white.
+    """
+    stops = PALETTES.get(name) or [(1.0, (1.0, 1.0, 1.0))]
+    positions = [0.0] + [position for position, _ in stops]
+    colors = numpy.array([clr_bg] + [color for _, color in stops], dtype='f4')
+
+    intensity = numpy.linspace(0.0, 1.0, size)
+    lut = numpy.stack([numpy.interp(intensity, positions, colors[:, channel]) for channel in range(3)], axis=-1)
+    return numpy.clip(lut * 255.0 + 0.5, 0, 255).astype(numpy.uint8)
+
+
+def colorize(trail_map: numpy.ndarray, clr_bg: tuple, species_colors: list, palette: str = 'none') -> numpy.ndarray:
+    """
+    The colors of fragment_shader.glsl on the host, e.g. for images of a trail map that has been read back:
+    trail_map (height, width, channels) in [0, 1] -> rgb (uint8) of shape (height, width, 3).
+    """
+    trail_map = numpy.clip(trail_map.astype('f4'), 0.0, 1.0)
+    if PALETTES.get(palette) is not None:
+        lut = palette_lut(palette, clr_bg)
+        return lut[numpy.rint(trail_map.sum(axis=-1).clip(0.0, 1.0) * (len(lut) - 1)).astype(numpy.intp)]
+
+    color = numpy.empty(trail_map.shape[:2] + (3,), dtype='f4')
+    color[:] = clr_bg
+    for channel, species_color in enumerate(species_colors[:trail_map.shape[-1]]):
+        weight = trail_map[..., channel, None]
+        color += (numpy.array(species_color, dtype='f4') - color) * weight
+    return numpy.clip(color * 255.0 + 0.5, 0, 255).astype(numpy.uint8)
@@ -1,31 +1,60 @@
 #version 430
 
-// local group size
-layout( local_size_x = 1, local_size_y = 1 ) in;
-
-// input texture (format!)
-layout( rgba8, location = 0 ) uniform image2D destTex;
-
-// variables to get from the python program running this
-uniform float frame_time;
-uniform float diffusion_speed;  // blur-specific values from here on
-uniform float evaporation_speed;
-
-float blur( ivec2 xy ) {  // weighted average of the eight pixel sourrounding the pixel at xy and the pixel itself
-    return (  // devide the sum of all values by the number of values
-        imageLoad( destTex, xy).a +
-        imageLoad( destTex, xy + ivec2( -1, -1 ) ).a +
-        imageLoad( destTex, xy + ivec2( -1, 0 ) ).a +
-        imageLoad( destTex, xy + ivec2( -1, 1 ) ).a +
-        imageLoad( destTex, xy + ivec2( 0, -1 ) ).a +
-        imageLoad( destTex, xy + ivec2( 0, 1 ) ).a +
-        imageLoad( destTex, xy + ivec2( 1, -1 ) ).a +
-        imageLoad( destTex, xy + ivec2( 1, 0 ) ).a +
-        imageLoad( destTex, xy + ivec2( 1, 1 ) ).a
-    ) / 9;
+// local group size (updated by the python program running this)
+#define group_size_x 8
+#define group_size_y 8
+layout( local_size_x = group_size_x, local_size_y = group_size_y ) in;
+
+// the format of the trail map: one float channel per species (updated by the python program running this),
+// a texel is blurred as the type with as many components as the format has channels
+#define trail_format r16f
+#define trail_type float
+#define trail_swizzle x
+
+// input texture: the trail map of the previous step
+layout( trail_format, binding = 0 ) readonly uniform image2D srcTex;
+// output texture: the trail map of this step, the textures are swapped after every step
+layout( trail_format, binding = 1 ) writeonly uniform image2D destTex;
+
+// the parameters of the simulation, a uniform buffer that is updated by the python program running this;
+// the fields of the block are generated from PARAMETER_FIELDS (simulation.py), they replace parameter_fields
+#define max_species_count 4
+#define parameter_fields float frame_time;
+layout( std140, binding = 0 ) uniform Parameters { parameter_fields };
+
+// the texels of the work group plus a border (halo) of one texel, shared by all invocations of the work group
+#define tile_width ( group_size_x + 2 )
+#define tile_height ( group_size_y + 2 )
+shared trail_type tile[ tile_height ][ tile_width ];
+
+// widen a texel to the vec4 of imageStore (the components beyond the channels of the format are dropped)
+vec4 to_texel( float value ) { return vec4( value, 0.0, 0.0, 0.0 ); }
+vec4 to_texel( vec2 value ) { return vec4( value, 0.0, 0.0 ); }
+vec4 to_texel( vec4 value ) { return value; }
+
+void load_tile( ivec2 tileOrigin, ivec2 size ) {  // every invocation loads one or more texels of the tile
+    for ( uint i = gl_LocalInvocationIndex; i < tile_width * tile_height; i += group_size_x * group_size_y ) {
+        ivec2 tilePos = ivec2( i % tile_width, i / tile_width );
+        ivec2 texelPos = tileOrigin + tilePos;
+
+        // texels outside of the texture count as 0
+        bool inside = all( greaterThanEqual( texelPos, ivec2( 0 ) ) ) && all( lessThan( texelPos, size ) );
+        tile[ tilePos.y ][ tilePos.x ] = inside ? imageLoad( srcTex, texelPos ).trail_swizzle : trail_type( 0.0 );
+    }
 }
 
-float diffuse( float value, float value_blurred ) {  // linearly interpolate between the values
+// weighted average of the eight pixel sourrounding the pixel at xy and the pixel itself
+trail_type blur( ivec2 tilePos ) {
+    trail_type sum = trail_type( 0.0 );
+    for ( int offset_y = -1; offset_y <= 1; offset_y++ ) {
+        for ( int offset_x = -1; offset_x <= 1; offset_x++ ) {
+            sum += tile[ tilePos.y + offset_y ][ tilePos.x + offset_x ];
+        }
+    }
+    return sum / 9;  // devide the sum of all values by the number of values
+}
+
+trail_type diffuse( trail_type value, trail_type value_blurred ) {  // linearly interpolate between the values
     return mix(
         value,  // start of the interpolation range
         value_blurred,  // end of the interpolation range
@@ -33,33 +62,32 @@ float diffuse( float value, float value_blurred ) {  // linearly interpolate bet
     );
 }
 
-float evaporate( float value_diffused ) {
+trail_type evaporate( trail_type value_diffused ) {
     return max(
-        0,  // the lowest possible value should be 0
+        trail_type( 0 ),  // the lowest possible value should be 0
         value_diffused - evaporation_speed * frame_time  // subtract the evaporated quantity
     );
 }
 
 // what will be done for each texel
 void main() {
+    ivec2 size = imageSize( srcTex );
+
+    // stage the tile in shared memory, every texel is loaded once instead of nine times
+    load_tile( ivec2( gl_WorkGroupID.xy * gl_WorkGroupSize.xy ) - ivec2( 1 ), size );
+    memoryBarrierShared();
+    barrier();
+
     // get coordinates of the textel
     ivec2 texelPos = ivec2( gl_GlobalInvocationID.xy );
+    if ( any( greaterThanEqual( texelPos, size ) ) ) {  // the last work groups can overhang
+        return;
+    }
+    ivec2 tilePos = ivec2( gl_LocalInvocationID.xy ) + ivec2( 1 );
 
-    // get the value that is stored for the texel in the image
-    float texelOldVal = imageLoad( destTex, texelPos ).a;
-
-    // calculate the new value: blur -> diffusion -> evaporation
-    float texelNewVal = evaporate( diffuse( texelOldVal, blur( texelPos ) ) );
+    // calculate the new value of every channel: blur -> diffusion -> evaporation
+    trail_type texelNewVal = evaporate( diffuse( tile[ tilePos.y ][ tilePos.x ], blur( tilePos ) ) );
 
     // store the value that has been calculated for the texel in the image
-    imageStore(
-        destTex,
-        texelPos,
-        vec4(
-            imageLoad( destTex, texelPos ).r,
-            imageLoad( destTex, texelPos ).g,
-            imageLoad( destTex, texelPos ).b,
-            texelNewVal
-        )
-    );
+    imageStore( destTex, texelPos, to_texel( texelNewVal ) );
 }
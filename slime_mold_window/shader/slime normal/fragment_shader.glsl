@@ -1,9 +1,31 @@
-#version 330
+#version 430
 
-uniform sampler2D texture0;
+// the parameters of the simulation, a uniform buffer that is updated by the python program running this;
+// the fields of the block are generated from PARAMETER_FIELDS (simulation.py), they replace parameter_fields
+#define max_species_count 4
+#define parameter_fields float frame_time;
+layout( std140, binding = 0 ) uniform Parameters { parameter_fields };
+
+uniform sampler2D texture0;  // the trail map: one float channel per species
+layout( binding = 1 ) uniform sampler2D palette;  // the colors along the trail intensity, from the background color
 out vec4 fragColor;
 in vec2 uv;
 
 void main() {
-    fragColor = texture( texture0, uv );
+    vec4 trail = texture( texture0, uv );
+
+    vec3 color = clr_bg;
+    if ( use_palette != 0 ) {  // the summed trail of all species looks up the palette
+        vec4 used_channels = vec4( lessThan( ivec4( 0, 1, 2, 3 ), ivec4( species_count ) ) );
+        float intensity = clamp( dot( trail, used_channels ), 0.0, 1.0 );
+        float size = float( textureSize( palette, 0 ).x );
+        color = texture( palette, vec2( ( intensity * ( size - 1.0 ) + 0.5 ) / size, 0.5 ) ).rgb;
+    }
+    else {  // blend the color of every species over the background, weighted by its trail
+        for ( int index = 0; index < species_count; index++ ) {
+            color = mix( color, species_colors[ index ], trail[ index ] );
+        }
+    }
+
+    fragColor = vec4( color, 1.0 );
 }
@@ -0,0 +1,113 @@
+#version 430
+
+// local group size (updated by the python program running this)
+#define group_size_x 64
+layout( local_size_x = group_size_x, local_size_y = 1 ) in;
+
+// data type: agent - each agent has a position, an angle and the index of its species
+struct Agent {
+    float x, y, angle, species;
+};
+
+// constants
+#define pi 3.141592653
+#define width 1920  // the following constants will be updated by the python program running this
+#define height 1080
+#define nOA 1000000 // number of agents
+
+// the layout of the agent buffer (updated by the python program running this):
+//   0: every agent is stored as four floats (16 bytes)
+//   1: every agent is packed into two uints (8 bytes): x and y as 24 bit fixed point numbers (position_scale steps
+//      per pixel), the angle in 12 bits and the species in 4 bits, see store_agent() and load_agent()
+#define packed_agents 0
+#define position_scale 8192.0
+#define angle_steps 4096.0
+
+#if packed_agents
+// buffer containing agent data, the agents are grouped by species
+layout( std430, binding = 1 ) restrict writeonly buffer buffer_agent_data {
+    uvec2 agents[];
+} AgentBuffer;
+
+void store_agent( uint index, Agent agent ) {  // round to the closest representable agent
+    uvec2 position = uvec2( clamp( round( vec2( agent.x, agent.y ) * position_scale ), 0.0, 16777215.0 ) );
+    uint angle = uint( round( fract( agent.angle / ( 2 * pi ) ) * angle_steps ) ) & 0xfffu;
+    AgentBuffer.agents[ index ] = uvec2(
+        position.x << 8u | angle & 0xffu,
+        uint( agent.species ) << 28u | angle >> 8u << 24u | position.y
+    );
+}
+#else
+// buffer containing agent data, the agents are grouped by species
+layout( std430, binding = 1 ) restrict writeonly buffer buffer_agent_data {
+    Agent agents[];
+} AgentBuffer;
+
+void store_agent( uint index, Agent agent ) {
+    AgentBuffer.agents[ index ] = agent;
+}
+#endif
+
+// spawn layouts
+#define LAYOUT_UNIFORM 0
+#define LAYOUT_DISC 1
+#define LAYOUT_RING 2
+#define LAYOUT_CENTRE_FACING 3
+
+// the parameters of the simulation, a uniform buffer that is updated by the python program running this;
+// the fields of the block are generated from PARAMETER_FIELDS (simulation.py), they replace parameter_fields
+#define max_species_count 4
+#define parameter_fields float frame_time;
+layout( std140, binding = 0 ) uniform Parameters { parameter_fields };
+
+// generating pseudo random numbers: pcg hash
+uint hash( uint value ) {
+    uint state = value * 747796405u + 2891336453u;
+    uint word = ( ( state >> ( ( state >> 28u ) + 4u ) ) ^ state ) * 277803737u;
+    return ( word >> 22u ) ^ word;
+}
+
+float random( inout uint state ) {  // random values range from 0.0 to 1.0 (exclusive)
+    state = hash( state );
+    return float( state >> 8u ) / 16777216.0;
+}
+
+// what will be done for each agent
+void main() {
+    // one invocation per agent, dispatched as a 1D grid
+    uint index = gl_GlobalInvocationID.x;
+    if ( index >= nOA ) {
+        return;
+    }
+    uint state = hash( index ^ hash( seed ) );
+
+    Agent agent;
+    vec2 center = vec2( width, height ) / 2.0;
+
+    if ( spawn_layout == LAYOUT_UNIFORM ) {
+        agent.x = random( state ) * width;
+        agent.y = random( state ) * height;
+    }
+    else {
+        // the square root makes the density of the disc uniform, the ring is the outer 20% of the disc
+        float radius = random( state );
+        radius = ( spawn_layout == LAYOUT_RING ? 0.8 + 0.2 * radius : sqrt( radius ) )
+                 * min( width, height ) / 2.0 * 0.9;
+        float theta = random( state ) * 2 * pi;
+
+        agent.x = center.x + cos( theta ) * radius;
+        agent.y = center.y + sin( theta ) * radius;
+    }
+
+    if ( spawn_layout == LAYOUT_CENTRE_FACING ) {  // every agent looks at the center
+        agent.angle = atan( center.y - agent.y, center.x - agent.x );
+    }
+    else {
+        agent.angle = random( state ) * 2 * pi;
+    }
+
+    // the agents are grouped by species (the product fits into 32 bits for up to 2^30 agents of 4 species)
+    agent.species = float( index * uint( species_count ) / uint( nOA ) );
+
+    store_agent( index, agent );
+}
@@ -16,36 +16,98 @@
 // copies or substantial portions of the Software.
 
 
-// local group size
-layout( local_size_x = 1, local_size_y = 1 ) in;
+// local group size (updated by the python program running this)
+#define group_size_x 64
+layout( local_size_x = group_size_x, local_size_y = 1 ) in;
 
-// input texture (format!)
-layout( rgba8, location = 0 ) uniform image2D destTex;
+// the format of the trail map: one float channel per species (updated by the python program running this)
+#define trail_format r16f
 
-// data type: agent - each agent has a position and an angle
+// input texture: one trail channel per species, the channels beyond the format read as 0 and are not written
+layout( trail_format, location = 0 ) uniform image2D destTex;
+
+// data type: agent - each agent has a position, an angle and the index of its species
 struct Agent {
     float x, y, angle, species;
 };
 
-// buffer containing agent data
-layout( std430, binding = 1 ) restrict buffer buffer_agent_data {
-    Agent agents[];
-} AgentBuffer;
+// data type: species - the parameters that are shared by all agents of a species
+struct Species {
+    vec4 color;
+    vec4 trail_channel;  // the channel of the trail map this species deposits into (one-hot)
+    vec4 trail_weights;  // attraction (+) or repulsion (-) of the sensors by each channel of the trail map
+    float movement_speed;
+    float rotation_speed;
+    float sensor_angle;  // spacing between the sensors (offset)
+    float sensor_distance;
+    float sensor_size;
+    float padding_0, padding_1, padding_2;
+};
+
+// buffer containing the parameters of every species
+layout( std430, binding = 2 ) restrict readonly buffer buffer_species_data {
+    Species species[];
+} SpeciesBuffer;
 
 // constants
 #define pi 3.141592653
 #define width 1920  // the following constants will be updated by the python program running this
 #define height 1080
 #define nOA 1000000 // number of agents
+#define agent_lanes 64  // of every agent_lanes agents, the first active_lanes are simulated (see Parameters)
+
+// the layout of the agent buffer (updated by the python program running this):
+//   0: every agent is stored as four floats (16 bytes)
+//   1: every agent is packed into two uints (8 bytes): x and y as 24 bit fixed point numbers (position_scale steps
+//      per pixel), the angle in 12 bits and the species in 4 bits, see store_agent() and load_agent()
+#define packed_agents 0
+#define position_scale 8192.0
+#define angle_steps 4096.0
+
+#if packed_agents
+// buffer containing agent data, the agents are grouped by species
+layout( std430, binding = 1 ) restrict buffer buffer_agent_data {
+    uvec2 agents[];
+} AgentBuffer;
+
+void store_agent( uint index, Agent agent ) {  // round to the closest representable agent
+    uvec2 position = uvec2( clamp( round( vec2( agent.x, agent.y ) * position_scale ), 0.0, 16777215.0 ) );
+    uint angle = uint( round( fract( agent.angle / ( 2 * pi ) ) * angle_steps ) ) & 0xfffu;
+    AgentBuffer.agents[ index ] = uvec2(
+        position.x << 8u | angle & 0xffu,
+        uint( agent.species ) << 28u | angle >> 8u << 24u | position.y
+    );
+}
+
+Agent load_agent( uint index ) {
+    uvec2 words = AgentBuffer.agents[ index ];
+    return Agent(
+        float( words.x >> 8u ) / position_scale,
+        float( words.y & 0xffffffu ) / position_scale,
+        float( ( words.y >> 24u & 0xfu ) << 8u | words.x & 0xffu ) * ( 2 * pi / angle_steps ),
+        float( words.y >> 28u )
+    );
+}
+#else
+// buffer containing agent data, the agents are grouped by species
+layout( std430, binding = 1 ) restrict buffer buffer_agent_data {
+    Agent agents[];
+} AgentBuffer;
+
+void store_agent( uint index, Agent agent ) {
+    AgentBuffer.agents[ index ] = agent;
+}
+
+Agent load_agent( uint index ) {
+    return AgentBuffer.agents[ index ];
+}
+#endif
 
-// variables to get from the python program running this
-uniform float frame_time;
-uniform vec3 clr_fg;
-uniform float movement_speed;  // slime-specific values from here on
-uniform float rotation_speed;
-uniform float sensor_angle;  // spacing between the sensors (offset)
-uniform int sensor_distance;
-uniform int sensor_size;
+// the parameters of the simulation, a uniform buffer that is updated by the python program running this;
+// the fields of the block are generated from PARAMETER_FIELDS (simulation.py), they replace parameter_fields
+#define max_species_count 4
+#define parameter_fields float frame_time;
+layout( std140, binding = 0 ) uniform Parameters { parameter_fields };
 
 // generating pseudo random numbers
 // TODO: better random function
@@ -54,10 +116,11 @@ float random( vec2 position ){
 }
 
 // TODO: make the agents smarter
-float get_sensor_value( Agent agent, float sensor_angle ) {
+float get_sensor_value( Agent agent, Species settings, float sensor_angle ) {
     float agent_sensor_angle = agent.angle + sensor_angle;
     vec2 sensor_direction = vec2( cos( agent_sensor_angle ), sin( agent_sensor_angle ));
-    ivec2 sensor_center = ivec2( agent.x, agent.y ) + ivec2( sensor_direction * sensor_distance);
+    ivec2 sensor_center = ivec2( agent.x, agent.y ) + ivec2( sensor_direction * int( settings.sensor_distance ) );
+    int sensor_size = int( settings.sensor_size );
 
     float sensor_value = 0;
     for ( int offset_x = -sensor_size; offset_x <= sensor_size; offset_x++ ) {
@@ -65,7 +128,7 @@ float get_sensor_value( Agent agent, float sensor_angle ) {
             ivec2 position = sensor_center + ivec2( offset_x, offset_y );
 
             if ( position.x >= 0 && position.x < width && position.y >=0 && position.y < height ) {
-                sensor_value += imageLoad( destTex, position ).a;
+                sensor_value += dot( imageLoad( destTex, position ), settings.trail_weights );
             }
         }
     }
@@ -74,17 +137,18 @@ float get_sensor_value( Agent agent, float sensor_angle ) {
 
 // what will be done for each agent
 void main() {
-    // get coordinates of the textel
-    int index = int( gl_GlobalInvocationID );
-    if (index >= nOA) {
+    // one invocation per agent, dispatched as a 1D grid
+    int index = int( gl_GlobalInvocationID.x );
+    if (index >= nOA || index % agent_lanes >= active_lanes) {  // the inactive agents keep their state
         return;
     }
-    Agent agent = AgentBuffer.agents[index];
+    Agent agent = load_agent( index );
+    Species settings = SpeciesBuffer.species[ clamp( int( agent.species ), 0, SpeciesBuffer.species.length() - 1 ) ];
 
     // get the sensor values and determine the weights
-    float weight_left = get_sensor_value( agent, sensor_angle );
-    float weight_forward = get_sensor_value( agent, 0 );
-    float weight_right = get_sensor_value( agent, -sensor_angle );
+    float weight_left = get_sensor_value( agent, settings, settings.sensor_angle );
+    float weight_forward = get_sensor_value( agent, settings, 0 );
+    float weight_right = get_sensor_value( agent, settings, -settings.sensor_angle );
 
     float random_steer_strentgh = random( vec2( agent.x, agent.y )* frame_time * agent.angle );
 
@@ -93,18 +157,19 @@ void main() {
         // keep angle
     }
     else if ( weight_forward < weight_left && weight_forward < weight_right ) {  // weight left or right is the biggest
-        agent.angle += ( random_steer_strentgh - 0.5 ) * 2 * rotation_speed * frame_time;  // a bit of random steering
+        // a bit of random steering
+        agent.angle += ( random_steer_strentgh - 0.5 ) * 2 * settings.rotation_speed * frame_time;
     }
     else if ( weight_right > weight_left ) {  // weight right is the biggest
-        agent.angle -= random_steer_strentgh * rotation_speed * frame_time;  // subtract from the current angle
+        agent.angle -= random_steer_strentgh * settings.rotation_speed * frame_time;  // subtract from the current angle
     }
     else if ( weight_left > weight_right ) {  // weigh left is the biggest
-        agent.angle += random_steer_strentgh * rotation_speed * frame_time;  // add to the current angle
+        agent.angle += random_steer_strentgh * settings.rotation_speed * frame_time;  // add to the current angle
     }
 
     // calculate the direction and position
     vec2 direction = vec2( cos( agent.angle ), sin( agent.angle ) );
-    vec2 new_position = vec2( agent.x, agent.y ) + ( direction * movement_speed * frame_time );
+    vec2 new_position = vec2( agent.x, agent.y ) + ( direction * settings.movement_speed * frame_time );
 
     // handle wall collision
     if ( new_position.x < 0.0 || new_position.x >= width || new_position.y < 0.0 || new_position.y >= height ) {
@@ -117,11 +182,12 @@ void main() {
     agent.x = new_position.x;
     agent.y = new_position.y;
 
-    // store the calculated values in the buffer and the texture
-    AgentBuffer.agents[index] = agent;
+    // store the calculated values in the buffer and the texture (full brightness in the channel of the species)
+    store_agent( index, agent );
+    ivec2 texelPos = ivec2( agent.x, agent.y );
     imageStore(
         destTex,
-        ivec2( agent.x, agent.y ),
-        vec4( clr_fg.r, clr_fg.g, clr_fg.b, 1.0 )
+        texelPos,
+        max( imageLoad( destTex, texelPos ), settings.trail_channel )
     );
 }
@@ -0,0 +1,118 @@
+#version 430
+
+// sorts the agents by species and by the tile of their position along a z-order (morton) curve, so that
+// neighbouring invocations of the slime compute shader read and write neighbouring texels of the trail map.
+// a counting sort in three passes (every pass is compiled from this file with another sort_pass):
+//   0: count the agents of every bin, 1: turn the counts into the first index of every bin (exclusive prefix sum),
+//   2: copy every agent to the next free index of its bin
+#define sort_pass 0
+
+// local group size (updated by the python program running this), the prefix sum runs in a single work group
+#define group_size_x 64
+#define scan_group_size 1024
+#if sort_pass == 1
+layout( local_size_x = scan_group_size, local_size_y = 1 ) in;
+#else
+layout( local_size_x = group_size_x, local_size_y = 1 ) in;
+#endif
+
+// constants
+#define nOA 1000000 // number of agents (the following constants will be updated by the python program running this)
+#define packed_agents 0
+#define position_scale 8192.0
+#define tile_size 16  // the agents of a tile of tile_size x tile_size texels share a bin
+#define morton_bits 7  // the tiles along the longer side of the trail map fit into morton_bits bits
+#define max_species_count 4
+#define bin_count ( max_species_count << ( 2 * morton_bits ) )
+
+// the agents are copied as they are, only their position and species are decoded (see slime_compute_shader.glsl)
+#if packed_agents
+#define agent_type uvec2
+#else
+#define agent_type vec4  // x, y, angle, species
+#endif
+
+layout( std430, binding = 1 ) restrict readonly buffer buffer_agent_data {
+    agent_type agents[];
+} AgentBuffer;
+
+layout( std430, binding = 3 ) restrict writeonly buffer buffer_sorted_agent_data {
+    agent_type agents[];
+} SortedAgentBuffer;
+
+// the number of agents per bin (pass 0), then the next free index of every bin (passes 1 and 2)
+layout( std430, binding = 4 ) restrict buffer buffer_sort_bins {
+    uint bins[];
+} SortBins;
+
+uint spread_bits( uint value ) {  // insert a 0 bit after every bit of a 16 bit value
+    value = ( value | ( value << 8u ) ) & 0x00ff00ffu;
+    value = ( value | ( value << 4u ) ) & 0x0f0f0f0fu;
+    value = ( value | ( value << 2u ) ) & 0x33333333u;
+    value = ( value | ( value << 1u ) ) & 0x55555555u;
+    return value;
+}
+
+uint bin( agent_type agent ) {  // species first, so the agents stay grouped by species
+#if packed_agents
+    uvec2 tile = uvec2( agent.x >> 8u, agent.y & 0xffffffu ) / uint( position_scale * tile_size );
+    uint species = agent.y >> 28u;
+#else
+    uvec2 tile = uvec2( max( agent.xy, vec2( 0.0 ) ) ) / uint( tile_size );
+    uint species = uint( agent.w );
+#endif
+    tile = min( tile, uvec2( ( 1u << morton_bits ) - 1u ) );
+    return min( species, uint( max_species_count - 1 ) ) << ( 2u * morton_bits ) |
+           spread_bits( tile.x ) | spread_bits( tile.y ) << 1u;
+}
+
+#if sort_pass == 1
+shared uint sums[ scan_group_size ];
+#endif
+
+void main() {
+#if sort_pass == 1
+    // every invocation sums a contiguous range of bins, the sums are scanned in shared memory
+    uint invocation = gl_LocalInvocationIndex;
+    uint bins_per_invocation = ( bin_count + scan_group_size - 1 ) / scan_group_size;
+    uint start = min( invocation * bins_per_invocation, bin_count );
+    uint end = min( start + bins_per_invocation, bin_count );
+
+    uint sum = 0;
+    for ( uint index = start; index < end; index++ ) {
+        sum += SortBins.bins[ index ];
+    }
+    sums[ invocation ] = sum;
+    memoryBarrierShared();
+    barrier();
+
+    for ( uint offset = 1; offset < scan_group_size; offset <<= 1 ) {  // inclusive scan (hillis-steele)
+        uint previous = invocation >= offset ? sums[ invocation - offset ] : 0u;
+        memoryBarrierShared();
+        barrier();
+        sums[ invocation ] += previous;
+        memoryBarrierShared();
+        barrier();
+    }
+
+    uint first = sums[ invocation ] - sum;
+    for ( uint index = start; index < end; index++ ) {
+        uint count = SortBins.bins[ index ];
+        SortBins.bins[ index ] = first;
+        first += count;
+    }
+#else
+    // one invocation per agent, dispatched as a 1D grid
+    uint index = gl_GlobalInvocationID.x;
+    if ( index >= nOA ) {
+        return;
+    }
+    agent_type agent = AgentBuffer.agents[ index ];
+
+#if sort_pass == 0
+    atomicAdd( SortBins.bins[ bin( agent ) ], 1u );
+#else
+    SortedAgentBuffer.agents[ atomicAdd( SortBins.bins[ bin( agent ) ], 1u ) ] = agent;
+#endif
+#endif
+}
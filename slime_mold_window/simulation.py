@@ -0,0 +1,598 @@
+from logging import getLogger
+from config import SlimeMoldWindowConfig
+from rendering import load_shader_source
+from rendering import WorkgroupSizeTuner, group_size_defines, group_count
+from rendering import DEFAULT_GROUP_SIZE_1D, DEFAULT_GROUP_SIZE_2D, GROUP_SIZES_1D, GROUP_SIZES_2D
+from rendering import FrameProfiler, ProgramCache, ParameterBlock, glsl_fields
+from .agents import SPAWN_LAYOUTS, AGENT_LAYOUTS, stream_agent_data, position_fraction_bits, convert_agents
+from .palettes import PALETTES
+import numpy
+from pathlib import Path
+import moderngl as mgl
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+utility
+"""
+
+
+def species_trail_weights(species_count: int) -> numpy.ndarray:
+    """
+    How strongly the sensors of each species (rows) are attracted (+1) or repelled (-1)
+    by the trail of each species (columns): every species follows its own trail and avoids the others.
+    """
+    return numpy.eye(species_count, dtype='f4') * 2 - 1 if species_count > 1 else numpy.ones((1, 1), dtype='f4')
+
+
+def generate_species_data(config: SlimeMoldWindowConfig, species_count: int) -> numpy.array:
+    """the parameters of the active species in the layout of the Species struct (std430: 20 floats each)"""
+    data = numpy.zeros((species_count, 20), dtype='f4')
+    weights = species_trail_weights(species_count)
+
+    for index, species in enumerate(config.species[:species_count]):
+        data[index, 0:4] = (*species.clr_rgb, 1.0)  # color
+        data[index, 4 + index] = 1.0  # trail_channel
+        data[index, 8:8 + species_count] = weights[index]  # trail_weights
+        data[index, 12:17] = (species.movement_speed, species.rotation_speed, species.sensor_angle,
+                              species.sensor_distance, species.sensor_size)
+
+    return data
+
+
+def trail_channels(species_count: int) -> int:
+    """the number of channels of the trail map: one per species (image formats have 1, 2 or 4 channels)"""
+    return 1 if species_count <= 1 else 2 if species_count == 2 else 4
+
+
+# the trail map formats per number of channels: image format (of the shaders), type and swizzle of a texel
+TRAIL_FORMATS = {
+    1: ('r', 'float', 'x'),
+    2: ('rg', 'vec2', 'xy'),
+    4: ('rgba', 'vec4', 'xyzw')
+}
+
+# the shader directories, the default size of the trail map and the OpenGL version that the simulation needs
+# (the window and the headless runners share them, the headless ones without importing the window)
+SHADER_DIRECTORY = (Path(__file__).parent / 'shader').resolve()
+TEXTURE_DIMENSIONS = (640, 360)  # (1920, 1080)
+GL_VERSION = (4, 3)
+
+# the dtypes of the trail map per precision
+TRAIL_DTYPES = {16: 'f2', 32: 'f4'}
+
+# the agents of a tile of SORT_TILE_SIZE x SORT_TILE_SIZE texels share a bin of the spatial sort
+SORT_TILE_SIZE = 16
+
+# the passes of sort_compute_shader.glsl: histogram, prefix sum, scatter
+SORT_PASSES = 3
+
+
+def morton_bits(dimensions: tuple, tile_size: int = SORT_TILE_SIZE) -> int:
+    """the number of bits of a tile coordinate along the longer side of the trail map"""
+    return max(1, int(numpy.ceil(numpy.log2(numpy.ceil(max(dimensions) / tile_size)))))
+
+
+"""
+simulation
+"""
+
+
+# of every AGENT_LANES neighbouring agents, the first active_lanes are simulated (the others keep their state),
+# so the number of simulated agents can change without reallocating or reseeding the agent buffer
+AGENT_LANES = 64
+
+# the fields of the Parameters uniform block of the shaders, in the order of the declaration: [config section]
+PARAMETER_FIELDS = [
+    ('clr_bg', 'vec3'),  # [color_bg]
+    ('frame_time', 'float'),  # [simulation] time_step
+    ('diffusion_speed', 'float'),  # [blur]
+    ('evaporation_speed', 'float'),
+    ('species_count', 'int'),  # [agent]
+    ('spawn_layout', 'int'),
+    ('seed', 'uint'),
+    ('use_palette', 'int'),  # [trail] palette
+    ('active_lanes', 'int'),  # the share of the agents that is simulated (see AGENT_LANES)
+    ('species_colors', 'vec3', SlimeMoldWindowConfig.max_species_count)  # [species_n] color
+]
+
+# the shaders declare the Parameters block with the parameter_fields define, so the fields are only listed here
+PARAMETER_DEFINES = {'parameter_fields': glsl_fields(PARAMETER_FIELDS)}
+
+
+class SlimeMoldSimulation:
+    """
+    The GPU side of the slime mold simulation: the trail texture, the agent buffer and the compute shaders.
+    It only needs a moderngl context, so it can be driven by the SlimeMoldWindow
+    as well as by a standalone (offscreen) context.
+    If a tuner is given, the local group sizes of the compute shaders are tuned for the GL renderer.
+    If a profiler is given, the blur and slime passes are timed on the GPU.
+    The compute shaders are taken from the given program cache (e.g. the one of the window), or from an own one.
+
+    Every config.agent_sort_interval steps, the agents are sorted by species and by the tile of their position
+    (if the shader directory has a sort compute shader), so that neighbouring invocations of the slime compute shader
+    touch neighbouring texels. The slime pass is timed right before and right after every sort (sort_statistics).
+    """
+    def __init__(self, ctx: mgl.Context, resource_dir: Path, shader_directory: str,
+                 texture_dimensions: tuple, config: SlimeMoldWindowConfig,
+                 tuner: WorkgroupSizeTuner = None, profiler: FrameProfiler = None,
+                 programs: ProgramCache = None) -> None:
+        """Creates the texture and the agent buffer and loads the compute shaders."""
+        self.ctx = ctx
+        self.resource_dir = resource_dir
+        self.texture_dimensions = texture_dimensions
+        self.config = config
+        self.tuner = tuner
+        self.profiler = profiler if profiler is not None else FrameProfiler(ctx, enabled=False)
+        self.programs = programs if programs is not None else ProgramCache(ctx, resource_dir)
+
+        self.shader_directory = shader_directory
+        self.agent_count = self.config.number_of_agents
+        self.species_count = self.config.species_count
+        self.agent_layout = self.config.agent_storage if self.config.agent_storage in AGENT_LAYOUTS else 'float'
+
+        self.seed = None
+        self.active_lanes = AGENT_LANES
+
+        self.trail_channels = None
+        self.trail_precision = None
+        self.trail_textures = []
+        self.trail_framebuffers = []
+        self.buffer_agent_data = None
+        self.buffer_species_data = None
+        self.blur_compute_shader = None
+        self.slime_compute_shader = None
+        self.seed_compute_shader = None
+        self.sort_compute_shaders = None  # one per pass, None: the shader directory can not sort the agents
+        self.blur_group_size = DEFAULT_GROUP_SIZE_2D
+        self.slime_group_size = DEFAULT_GROUP_SIZE_1D
+        self.seed_group_size = DEFAULT_GROUP_SIZE_1D
+        self.sort_group_size = DEFAULT_GROUP_SIZE_1D
+
+        # the spatial sort: the buffers are created by the first sort, the timer queries alternate between sorts
+        self.buffer_sorted_agent_data = None
+        self.buffer_sort_bins = None
+        self.steps_since_sort = 0
+        self.sort_queries = [[ctx.query(time=True), ctx.query(time=True)] for _ in range(2)]
+        self.sort_queries_used = [[False, False] for _ in range(2)]
+        # the sorts so far and the moving averages of the slime pass right before and after a sort (ms)
+        self.sort_statistics = {'sorts': 0, 'unsorted': 0.0, 'sorted': 0.0}
+
+        self.create_textures()
+
+        # create a buffer to store position, angle and species of every agent (slime) in the agent layout,
+        # the agents are written into it by the seeding pass
+        self.buffer_agent_data = self.ctx.buffer(reserve=self.agent_count * AGENT_LAYOUTS[self.agent_layout])
+
+        # create a buffer to store the parameters of every species
+        self.buffer_species_data = self.ctx.buffer(data=generate_species_data(self.config, self.species_count))
+
+        # the parameters that all shaders read from a uniform buffer, a reloaded program sees them right away
+        self.parameters = ParameterBlock(ctx, PARAMETER_FIELDS)
+        self.apply_config()
+
+        self.load_programs(shader_directory)
+
+    def create_textures(self) -> None:
+        """
+        (re)create the textures that represent our canvas as a grid with the dimensions map_size = (x, y):
+        the trail map is double buffered, every step reads one texture, writes the other one and swaps them.
+        It has one float channel per species (16 or 32 bits), so slow evaporation is not rounded away
+        and the passes only move the channels that are in use, the colors are applied by the fragment shader.
+        """
+        self.trail_channels = trail_channels(self.species_count)
+        self.trail_precision = self.config.trail_precision
+        for framebuffer in self.trail_framebuffers:
+            framebuffer.release()
+        for texture in self.trail_textures:
+            texture.release()
+
+        self.trail_textures = [
+            self.ctx.texture(self.texture_dimensions, self.trail_channels, dtype=TRAIL_DTYPES[self.trail_precision])
+            for _ in range(2)
+        ]
+        for texture in self.trail_textures:
+            texture.repeat_x, texture.repeat_y = False, False
+            texture.filter = mgl.NEAREST, mgl.NEAREST  # weighted average of the four closest
+            # texture elements
+
+        # the framebuffers are only used to clear the textures on the GPU
+        self.trail_framebuffers = [self.ctx.framebuffer(color_attachments=[texture]) for texture in self.trail_textures]
+        self.clear_textures()
+
+    def clear_textures(self) -> None:
+        """clear both trail textures in place"""
+        for framebuffer in self.trail_framebuffers:
+            framebuffer.clear()
+
+    @property
+    def displayed_texture(self) -> mgl.Texture:
+        """the texture that contains the latest state of the trail map"""
+        return self.trail_textures[0]
+
+    @property
+    def displayed_framebuffer(self) -> mgl.Framebuffer:
+        """the framebuffer of the displayed texture (e.g. for reading it back in bands)"""
+        return self.trail_framebuffers[0]
+
+    def load_compute_shader(self, path: Path, defines: dict = None) -> mgl.ComputeShader:
+        """Compiles a compute shader from the resource dir with the given defines (uncached, e.g. for the tuner)."""
+        return self.ctx.compute_shader(load_shader_source(self.resource_dir / path, defines))
+
+    def shader_paths(self, shader_directory: str) -> tuple:
+        """the blur, slime, seed and sort compute shaders of a shader directory"""
+        return (Path(shader_directory) / 'blur_compute_shader.glsl',
+                Path(shader_directory) / 'slime_compute_shader.glsl',
+                Path(shader_directory) / 'seed_compute_shader.glsl',
+                Path(shader_directory) / 'sort_compute_shader.glsl')
+
+    def tuned_group_size(self, path: Path, dimensions: tuple, group_size: tuple) -> tuple:
+        """
+        the group size that the tuner found for a compute shader and the size of its dispatch before,
+        the given one if there is none
+        """
+        if self.tuner is None:
+            return group_size
+        tuned_group_size = self.tuner.cached_group_size(path.as_posix(), dimensions)
+        return tuned_group_size if tuned_group_size is not None else group_size
+
+    def precompile(self, shader_directory: str) -> None:
+        """queue the compute shaders of a shader directory in the program cache, with the defines they will get"""
+        blur_path, slime_path, seed_path, sort_path = self.shader_paths(shader_directory)
+        blur_group_size = self.tuned_group_size(blur_path, self.texture_dimensions, self.blur_group_size)
+        slime_group_size = self.tuned_group_size(slime_path, (self.agent_count,), self.slime_group_size)
+        self.programs.precompile_compute_shader(blur_path, self.blur_defines(blur_group_size))
+        self.programs.precompile_compute_shader(slime_path, self.slime_defines(slime_group_size))
+        if (self.resource_dir / seed_path).is_file():
+            self.programs.precompile_compute_shader(seed_path, self.slime_defines(self.seed_group_size))
+        if (self.resource_dir / sort_path).is_file():
+            for sort_pass in range(SORT_PASSES):
+                self.programs.precompile_compute_shader(sort_path, self.sort_defines(sort_pass))
+
+    def load_programs(self, shader_directory: str, tune: bool = True) -> None:
+        """
+        load the compute shaders from the given shader directory and pass the uniforms to them,
+        the seeding compute shader is optional (the agents are generated on the host without it),
+        so is the sort compute shader (the agents are not sorted without it);
+        without tune, the group sizes that have been tuned before are used (or the current ones)
+        """
+        self.shader_directory = shader_directory
+        blur_path, slime_path, seed_path, sort_path = self.shader_paths(shader_directory)
+
+        self.sort_compute_shaders = [
+            self.programs.compute_shader(sort_path, self.sort_defines(sort_pass)) for sort_pass in range(SORT_PASSES)
+        ] if (self.resource_dir / sort_path).is_file() else None
+
+        # seed compute shader (it is not tuned, seeding only runs on a restart)
+        self.seed_compute_shader = \
+            self.programs.compute_shader(seed_path, self.slime_defines(self.seed_group_size)) \
+            if (self.resource_dir / seed_path).is_file() else None
+
+        if self.seed is None:  # the agent buffer has not been seeded yet
+            self.seed_agents()
+
+        if self.tuner is not None and tune:  # the tuner runs the candidates on the actual textures and buffer
+            self.bind_blur()
+            self.blur_group_size = self.tuner.tune(
+                blur_path.as_posix(),
+                lambda group_size: self.load_compute_shader(blur_path, self.blur_defines(group_size)),
+                self.run_blur,
+                GROUP_SIZES_2D,
+                DEFAULT_GROUP_SIZE_2D,
+                self.texture_dimensions
+            )
+            self.bind_slime()
+            self.slime_group_size = self.tuner.tune(
+                slime_path.as_posix(),
+                lambda group_size: self.load_compute_shader(slime_path, self.slime_defines(group_size)),
+                self.run_slime,
+                GROUP_SIZES_1D,
+                DEFAULT_GROUP_SIZE_1D,
+                (self.agent_count,)
+            )
+        else:  # e.g. a resize, which must not run the candidates on the simulation in the middle of a session
+            self.blur_group_size = self.tuned_group_size(blur_path, self.texture_dimensions, self.blur_group_size)
+            self.slime_group_size = self.tuned_group_size(slime_path, (self.agent_count,), self.slime_group_size)
+
+        # blur compute shader
+        self.blur_compute_shader = self.programs.compute_shader(blur_path, self.blur_defines(self.blur_group_size))
+
+        # slime compute shader
+        self.slime_compute_shader = self.programs.compute_shader(slime_path,
+                                                                 self.slime_defines(self.slime_group_size))
+
+        # the parameter block of the shaders has to match PARAMETER_FIELDS
+        for program in (self.blur_compute_shader, self.slime_compute_shader, self.seed_compute_shader):
+            if program is not None:
+                self.parameters.check(program)
+
+    def trail_defines(self) -> dict:
+        """the image format, the type and the swizzle of the texels of the trail map"""
+        prefix, texel_type, swizzle = TRAIL_FORMATS[self.trail_channels]
+        return {
+            'trail_format': f'{prefix}{self.trail_precision}f',
+            'trail_type': texel_type,
+            'trail_swizzle': swizzle
+        }
+
+    def blur_defines(self, group_size: tuple) -> dict:
+        """the defines of the blur compute shader"""
+        return {
+            'destText': 0,
+            **self.trail_defines(),
+            **PARAMETER_DEFINES,
+            **group_size_defines(group_size)
+        }
+
+    def slime_defines(self, group_size: tuple) -> dict:
+        """the defines of the slime compute shader"""
+        return {
+            'destText': 0,
+            **self.trail_defines(),
+            'width': self.texture_dimensions[0],
+            'height': self.texture_dimensions[1],
+            'nOA': self.agent_count,
+            'packed_agents': int(self.agent_layout == 'packed'),
+            'position_scale': f'{float(1 << position_fraction_bits(self.texture_dimensions))}',
+            **PARAMETER_DEFINES,
+            **group_size_defines(group_size)
+        }
+
+    def sort_defines(self, sort_pass: int) -> dict:
+        """the defines of a pass of the sort compute shader"""
+        return {
+            'sort_pass': sort_pass,
+            'nOA': self.agent_count,
+            'packed_agents': int(self.agent_layout == 'packed'),
+            'position_scale': f'{float(1 << position_fraction_bits(self.texture_dimensions))}',
+            'tile_size': SORT_TILE_SIZE,
+            'morton_bits': morton_bits(self.texture_dimensions),
+            **group_size_defines(self.sort_group_size)
+        }
+
+    def apply_config(self) -> None:
+        """pass the config to the shaders: the parameter block and the species buffer"""
+        self.apply_parameters()
+        self.update_species()
+
+    def apply_parameters(self) -> None:
+        """copy the config into the parameter block, only the changed fields are uploaded (by the next step)"""
+        self.parameters.update({
+            'clr_bg': self.config.clr_bg_rgb,
+            'diffusion_speed': self.config.blur_diffusion_speed,
+            'evaporation_speed': self.config.blur_evaporation_speed,
+            'species_count': self.species_count,
+            'use_palette': int(PALETTES.get(self.config.trail_palette) is not None),
+            'active_lanes': self.active_lanes,
+            'species_colors': [species.clr_rgb for species in self.config.species]
+        })
+
+    @property
+    def active_agent_count(self) -> int:
+        """the number of agents that are simulated"""
+        full_groups, remainder = divmod(self.agent_count, AGENT_LANES)
+        return full_groups * self.active_lanes + min(remainder, self.active_lanes)
+
+    def set_active_agents(self, fraction: float) -> None:
+        """simulate the given share of the agents (at least one agent of every AGENT_LANES), from the next step on"""
+        self.active_lanes = min(max(round(fraction * AGENT_LANES), 1), AGENT_LANES)
+        self.parameters['active_lanes'] = self.active_lanes
+
+    def update_species(self) -> None:
+        """write the parameters of the species to their buffer (called whenever they change)"""
+        self.buffer_species_data.write(generate_species_data(self.config, self.species_count))
+
+    def seed_agents(self) -> None:
+        """
+        write a new set of agents into the agent buffer: on the GPU by the seeding compute shader if the shader
+        directory has one, otherwise streamed from the host in fixed-size chunks
+        """
+        # a seed of 0 in the config means a new seed on every restart
+        self.seed = self.config.spawn_seed or int(numpy.random.default_rng().integers(1, 2 ** 32))
+        layout = self.config.spawn_layout if self.config.spawn_layout in SPAWN_LAYOUTS else SPAWN_LAYOUTS[0]
+
+        if self.seed_compute_shader is None:
+            stream_agent_data(self.buffer_agent_data, self.agent_count, self.texture_dimensions,
+                              self.species_count, layout, self.seed, self.agent_layout)
+            return
+
+        self.parameters.update({
+            'seed': self.seed,
+            'spawn_layout': SPAWN_LAYOUTS.index(layout),
+            'species_count': self.species_count
+        })
+        self.parameters.upload()
+        self.buffer_agent_data.bind_to_storage_buffer(1)
+        self.run_slime(self.seed_compute_shader, self.seed_group_size)
+        self.ctx.memory_barrier()  # the slime compute shader reads the agents
+
+    def clear(self) -> None:
+        """reset the textures and generate a new set of agents without reallocating anything that kept its size"""
+        self.steps_since_sort = 0
+
+        agent_count, species_count, agent_layout = self.agent_count, self.species_count, self.agent_layout
+        trail_format = self.trail_channels, self.trail_precision
+        self.agent_count = self.config.number_of_agents
+        self.species_count = self.config.species_count
+        self.agent_layout = self.config.agent_storage if self.config.agent_storage in AGENT_LAYOUTS else 'float'
+        agents_changed = (self.agent_count, self.agent_layout) != (agent_count, agent_layout)
+
+        if self.species_count != species_count:
+            self.buffer_species_data.orphan(self.species_count * 20 * 4)  # buffer re-specification
+        self.apply_config()
+
+        trail_format_changed = (trail_channels(self.species_count), self.config.trail_precision) != trail_format
+        if trail_format_changed:
+            self.create_textures()
+        else:
+            self.clear_textures()
+
+        if agents_changed:
+            self.buffer_agent_data.orphan(self.agent_count * AGENT_LAYOUTS[self.agent_layout])
+
+        if agents_changed or trail_format_changed:
+            self.seed = None
+            # the number and the layout of the agents and the trail format are compiled into the compute shaders,
+            # reloading them seeds the new buffer
+            self.load_programs(self.shader_directory)
+        else:
+            self.seed_agents()
+
+    def resize(self, texture_dimensions: tuple, resample: bool = True) -> None:
+        """
+        change the dimensions of the trail map without restarting: the trail map is resampled (nearest texel)
+        and the positions of the agents are scaled on the host, the compute shaders are reloaded with the new
+        dimensions (the program cache keeps the previous ones, switching back is cheap);
+        without resample nothing is read back, the trail map is cleared and the agents are left for the caller
+        to overwrite (e.g. by a checkpoint)
+        """
+        texture_dimensions = tuple(int(length) for length in texture_dimensions)
+        if texture_dimensions == tuple(self.texture_dimensions):
+            return
+        (width, height), (new_width, new_height) = self.texture_dimensions, texture_dimensions
+
+        if resample:
+            trail_map = self.read_trail_map()
+            rows = ((numpy.arange(new_height) + 0.5) * height / new_height).astype(numpy.intp)
+            columns = ((numpy.arange(new_width) + 0.5) * width / new_width).astype(numpy.intp)
+            trail_map = trail_map[rows[:, None], columns[None, :]]
+
+            agents = self.read_agents().copy()
+            agents[:, 0] *= new_width / width
+            agents[:, 1] *= new_height / height
+
+        self.texture_dimensions = texture_dimensions
+        self.create_textures()
+        if resample:
+            self.displayed_texture.write(numpy.ascontiguousarray(trail_map).tobytes())
+            self.buffer_agent_data.write(convert_agents(agents, 'float', self.agent_layout, self.texture_dimensions))
+        if self.buffer_sort_bins is not None:  # the number of bins depends on the dimensions
+            self.buffer_sort_bins.release()
+            self.buffer_sort_bins = None
+
+        # the group sizes are tuned at the start, a resize only recompiles the programs
+        self.load_programs(self.shader_directory, tune=False)
+        logger.info(f'resized the trail map from {width}x{height} to {new_width}x{new_height}')
+
+    # ----------
+    # simulation
+    # ----------
+
+    def step(self, frame_time: float) -> None:
+        """advance the simulation by one step"""
+        # pass the frame time to the compute shaders (uploaded only if it changed)
+        self.parameters['frame_time'] = frame_time
+        self.parameters.upload()
+
+        # first blur the texture, then render the agents to display the agents at full brightness
+        with self.profiler.gpu('blur'):
+            self.bind_blur()
+            self.run_blur(self.blur_compute_shader, self.blur_group_size)
+            self.ctx.memory_barrier()  # the slime compute shader reads what the blur compute shader has written
+
+        # sort the agents every sort_interval steps, the slime pass right before and right after a sort is timed
+        sort_interval = self.config.agent_sort_interval if self.sort_compute_shaders is not None else 0
+        self.steps_since_sort = self.steps_since_sort + 1 if sort_interval > 0 else 0
+        query = None
+        if sort_interval > 0 and self.steps_since_sort >= sort_interval:
+            self.collect_sort_statistics()
+            self.sort_agents()
+            query = self.use_sort_query(1)
+            self.sort_statistics['sorts'] += 1
+        elif sort_interval > 0 and self.steps_since_sort == sort_interval - 1:
+            query = self.use_sort_query(0)
+
+        # a gpu timer can not be nested, the timed slime passes are missing from the profiler
+        with query if query is not None else self.profiler.gpu('slime'):
+            self.bind_slime()
+            self.run_slime(self.slime_compute_shader, self.slime_group_size)
+            self.ctx.memory_barrier()
+
+        # the written texture contains the latest state now
+        self.trail_textures.reverse()
+        self.trail_framebuffers.reverse()
+
+    # ----------
+    # simulation: spatial sort
+    # ----------
+
+    def sort_agents(self) -> None:
+        """reorder the agent buffer by species and the morton order of the tiles of the agents (a counting sort)"""
+        if self.buffer_sorted_agent_data is None or self.buffer_sorted_agent_data.size != self.buffer_agent_data.size:
+            if self.buffer_sorted_agent_data is not None:
+                self.buffer_sorted_agent_data.release()
+            self.buffer_sorted_agent_data = self.ctx.buffer(reserve=self.buffer_agent_data.size)
+        if self.buffer_sort_bins is None:
+            bin_count = SlimeMoldWindowConfig.max_species_count << 2 * morton_bits(self.texture_dimensions)
+            self.buffer_sort_bins = self.ctx.buffer(reserve=bin_count * 4)
+
+        histogram, prefix_sum, scatter = self.sort_compute_shaders
+        with self.profiler.gpu('sort'):
+            self.buffer_sort_bins.clear()
+            self.buffer_agent_data.bind_to_storage_buffer(1)
+            self.buffer_sorted_agent_data.bind_to_storage_buffer(3)
+            self.buffer_sort_bins.bind_to_storage_buffer(4)
+
+            self.run_slime(histogram, self.sort_group_size)
+            self.ctx.memory_barrier()
+            prefix_sum.run(1)
+            self.ctx.memory_barrier()
+            self.run_slime(scatter, self.sort_group_size)
+            self.ctx.memory_barrier()
+
+        # the sorted copy becomes the agent buffer
+        self.buffer_agent_data, self.buffer_sorted_agent_data = self.buffer_sorted_agent_data, self.buffer_agent_data
+        self.steps_since_sort = 0
+
+    def use_sort_query(self, index: int) -> mgl.Query:
+        """the timer query of the slime pass before (0) or after (1) the next sort, the queries alternate by sort"""
+        queries = self.sort_statistics['sorts'] % 2
+        self.sort_queries_used[queries][index] = True
+        return self.sort_queries[queries][index]
+
+    def collect_sort_statistics(self) -> None:
+        """read the timer queries of the previous sort (sort_interval steps ago, so reading them does not wait)"""
+        previous = (self.sort_statistics['sorts'] + 1) % 2
+        for index, name in enumerate(('unsorted', 'sorted')):
+            if self.sort_queries_used[previous][index]:
+                milliseconds = self.sort_queries[previous][index].elapsed / 1e6
+                average = self.sort_statistics[name]
+                self.sort_statistics[name] = milliseconds if average == 0.0 else 0.8 * average + 0.2 * milliseconds
+                self.sort_queries_used[previous][index] = False
+
+    def bind_blur(self) -> None:
+        """bind the textures and the buffer so that the blur compute shader can access them"""
+        self.trail_textures[0].bind_to_image(0, read=True, write=False)
+        self.trail_textures[1].bind_to_image(1, read=False, write=True)
+
+    def bind_slime(self) -> None:
+        """bind the blurred texture and the buffer so that the slime compute shader can access them"""
+        self.trail_textures[1].bind_to_image(0, read=True, write=True)
+        self.buffer_agent_data.bind_to_storage_buffer(1)
+        self.buffer_species_data.bind_to_storage_buffer(2)
+
+    def run_blur(self, program: mgl.ComputeShader, group_size: tuple) -> None:
+        """run the blur compute shader: one invocation per texel"""
+        program.run(*group_count(self.texture_dimensions, group_size))
+
+    def run_slime(self, program: mgl.ComputeShader, group_size: tuple) -> None:
+        """run the slime compute shader: one invocation per agent, dispatched as a 1D grid"""
+        program.run(group_count((self.agent_count, 1), group_size)[0])
+
+    def read_trail_map(self) -> numpy.ndarray:
+        """read the texture back from the GPU: float texels, one channel per species, shape (height, width, channels)"""
+        return numpy.frombuffer(self.displayed_texture.read(), dtype=TRAIL_DTYPES[self.trail_precision]).reshape(
+            self.texture_dimensions[1], self.texture_dimensions[0], self.trail_channels
+        )
+
+    def read_agents(self) -> numpy.ndarray:
+        """read the agents back from the GPU as [[x, y, angle, species], ...] (float32), whatever their layout"""
+        return convert_agents(self.buffer_agent_data.read(), self.agent_layout, 'float', self.texture_dimensions)
@@ -1,9 +1,18 @@
 from logging import getLogger
 from config import SlimeMoldWindowConfig
-import numpy
+from logger import get_metrics
+from rendering import WorkgroupSizeTuner, SimulationClock
+from rendering import WindowCapture
+from rendering import FrameProfiler, ProgramCache, enable_driver_shader_cache
+from rendering import AdaptiveQualityController, FramePacer
+from rendering.ui import render_capture_window, render_performance_window, render_frame_pacing_window
+from .simulation import SlimeMoldSimulation, SHADER_DIRECTORY, TEXTURE_DIMENSIONS, GL_VERSION, PARAMETER_DEFINES
+from .agents import SPAWN_LAYOUTS, AGENT_LAYOUTS
+from .palettes import PALETTES, PALETTE_SIZE, palette_lut
+from .checkpoint import COMPRESSIONS, save_checkpoint, load_checkpoint
 from pathlib import Path
 from os import walk
-import moderngl as mgl
+from time import perf_counter
 from moderngl_window import WindowConfig
 import moderngl_window.integrations.imgui
 from moderngl_window.geometry import quad_fs
@@ -26,29 +35,8 @@ config
 # read and format the config
 config = SlimeMoldWindowConfig()
 
-
-"""
-utility
-"""
-
-
-def generate_agent_data(agent_count: int = config.number_of_agents, dimensions: tuple = (1920, 1080)) -> numpy.array:
-    # generate a list of x coordinates
-    x = [dimensions[0]] * numpy.random.random(agent_count)
-    # generate a list of y coordinates
-    y = [dimensions[1]] * numpy.random.random(agent_count)
-    # generate a list of angles (unit: radians -> 2 * pi * random); random values range from 0.0 to 1.0
-    angle = 2 * numpy.pi * numpy.random.random(agent_count)
-
-    # slime species: currently there is only one...
-    species = numpy.array([1] * agent_count)
-
-    # translate slice objects to concatenation along the second axis:
-    # array([[x, y, angle, species]
-    #        [x, y, angle, species]
-    #        [x, y, angle, species]
-    #        [...]])
-    return numpy.c_[x, y, angle, species]
+# the driver keeps the compiled programs on disk across launches (it reads this when the context is created)
+enable_driver_shader_cache()
 
 
 """
@@ -58,17 +46,24 @@ rendering and gui
 
 class SlimeMoldWindow(WindowConfig):
     title = 'Visual Simulations - Slime Mold Simulations'
-    gl_version = (4, 3)
+    gl_version = GL_VERSION
 
     window_size = (1440, 720)  # (1440, 720)
     aspect_ratio = None
+    vsync = config.frame_pacing_vsync
 
-    resource_dir = (Path(__file__).parent / 'shader').resolve()
+    resource_dir = SHADER_DIRECTORY
     # get a list of all the available shaders in the resource dir
     shader_dirs = list(next(walk(resource_dir), ([], None, None))[1])
 
-    texture_dimensions = (640, 360)  # (1920, 1080)
-    group_size = (1, 1)
+    texture_dimensions = TEXTURE_DIMENSIONS
+    # the steps of the adaptive quality controller: scales of texture_dimensions and shares of the simulated agents
+    resolution_scales = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 2.5, 3.0)
+    agent_fractions = (0.125, 0.25, 0.5, 0.75, 1.0)
+    tune_group_sizes = True  # benchmark the local group sizes of the compute shaders (cached per GL renderer)
+
+    capture_directory = Path('./captures')  # recordings of the rendered frames (without the ui)
+    profile_directory = Path('./logger/log')  # CSV files of the performance window
 
     def __init__(self, **kwargs) -> None:
         """initialization"""
@@ -79,78 +74,161 @@ class SlimeMoldWindow(WindowConfig):
         # initialize a renderer for rendering the imgui elements in the moderngl-window window
         self.imgui_renderer = moderngl_window.integrations.imgui.ModernglWindowRenderer(self.wnd)
 
-        # create a texture that represents our canvas as a grid with the dimensions map_size = (x, y)
-        self.displayed_texture = self.ctx.texture(self.texture_dimensions, 4)
-        self.displayed_texture.repeat_x, self.displayed_texture.repeat_y = False, False
-        self.displayed_texture.filter = mgl.NEAREST, mgl.NEAREST    # weighted average of the four closest
-        # texture elements
-
-        # create a buffer to store position and angle of every agent (slime)
-        self.buffer_agent_data = self.ctx.buffer(
-            data=generate_agent_data(
-                config.number_of_agents,
-                self.texture_dimensions
-            ).astype('f4')
+        # performance window: the profiler only measures while it is shown
+        self.show_performance = False
+        self.profiler = FrameProfiler(self.ctx, enabled=False)
+
+        # per-frame numbers, written by a background thread (discarded if the process has no metrics file)
+        self.metrics = get_metrics()
+
+        # vsync, fps cap and the record of the frame times (the stutters are logged with what happened)
+        self.show_frame_pacing = False
+        self.pacer = FramePacer(self.wnd, config.frame_pacing_vsync, config.frame_pacing_fps_cap,
+                                config.frame_pacing_simulation_only, config.frame_pacing_stutter_factor)
+
+        # compiled programs, shared with the simulation
+        self.programs = ProgramCache(self.ctx, self.resource_dir)
+
+        # create the texture, the agent buffer and the compute shaders
+        self.simulation = SlimeMoldSimulation(
+            self.ctx,
+            self.resource_dir,
+            config.most_recent_shader_directory,
+            self.texture_dimensions,
+            config,
+            tuner=WorkgroupSizeTuner(self.ctx) if self.tune_group_sizes else None,
+            profiler=self.profiler,
+            programs=self.programs
         )
 
+        # fixed-timestep clock: decides how many simulation steps are run per displayed frame
+        self.clock = SimulationClock(config.simulation_time_step, config.simulation_substeps)
+
+        # lowers and raises the resolution, the simulated agents and the substeps to hold the target frame time
+        self.quality = None
+        self.create_quality_controller()
+
         # quad fragments
         self.quad_fs = quad_fs()
 
-        # textured quad rendering
-        self.texture_renderer = self.load_program(
-            vertex_shader=f'{config.most_recent_shader_directory}/vertex_shader.glsl',
-            fragment_shader=f'{config.most_recent_shader_directory}/fragment_shader.glsl'
-        )
+        # frame capture of the framebuffer
+        self.recorder = WindowCapture(self.ctx, self.wnd, self.capture_directory, 'slime_mold_window')
 
-        # blur compute shader
-        self.blur_compute_shader = self.load_compute_shader(
-            f'{config.most_recent_shader_directory}/blur_compute_shader.glsl',
-            defines={
-                'destText': 0
-            }
-        )
-        # These values need to be passed to the compute shader initially, because they are uniforms
-        self.blur_compute_shader['diffusion_speed'] = config.blur_diffusion_speed
-        self.blur_compute_shader['evaporation_speed'] = config.blur_evaporation_speed
-
-        # slime compute shader
-        self.slime_compute_shader = self.load_compute_shader(
-            f'{config.most_recent_shader_directory}/slime_compute_shader.glsl',
-            defines={
-                'destText': 0,
-                'width': self.texture_dimensions[0],
-                'height': self.texture_dimensions[1],
-                'nOA': config.number_of_agents
-            }
+        # textured quad rendering
+        self.texture_renderer = None
+        self.load_texture_renderer(config.most_recent_shader_directory)
+
+        # the palette of the fragment shader (a 1D lookup table), rewritten when the palette or the background changes
+        self.palette_texture = self.ctx.texture((PALETTE_SIZE, 1), 3)
+        self.palette_texture.repeat_x, self.palette_texture.repeat_y = False, False
+        self.palette_key = None
+        self.update_palette()
+
+        self.checkpoint_status = ''  # result of the last save or load, shown in the ui
+
+        # compile the programs of every shader directory over the next frames, switching between them is instant then
+        for shader_dir in self.shader_dirs:
+            self.programs.precompile_program(f'{shader_dir}/vertex_shader.glsl', f'{shader_dir}/fragment_shader.glsl',
+                                             PARAMETER_DEFINES)
+            self.simulation.precompile(shader_dir)
+
+    def load_texture_renderer(self, shader_dir: str) -> None:
+        """the program of the textured quad of a shader directory (it reads the parameter block)"""
+        self.texture_renderer = self.programs.program(
+            f'{shader_dir}/vertex_shader.glsl',
+            f'{shader_dir}/fragment_shader.glsl',
+            PARAMETER_DEFINES
         )
-        # These values need to be passed to the compute shader initially, because they are uniforms
-        self.slime_compute_shader['clr_fg'] = config.clr_fg_rgb
-        self.slime_compute_shader['movement_speed'] = config.slime_movement_speed
-        self.slime_compute_shader['rotation_speed'] = config.slime_rotation_speed
-        self.slime_compute_shader['sensor_distance'] = config.slime_sensor_distance
-        self.slime_compute_shader['sensor_angle'] = config.slime_sensor_angle
-        self.slime_compute_shader['sensor_size'] = config.slime_sensor_size
+        self.simulation.parameters.check(self.texture_renderer)
+
+    def update_palette(self) -> None:
+        """write the lookup table of the selected palette to the palette texture (if it changed)"""
+        palette_key = config.trail_palette, tuple(config.clr_bg_rgb)
+        if palette_key != self.palette_key:
+            self.palette_texture.write(palette_lut(config.trail_palette, config.clr_bg_rgb).tobytes())
+            self.palette_key = palette_key
+            self.pacer.mark('palette change')
+
+    def create_quality_controller(self) -> None:
+        """
+        (re)create the adaptive quality controller from the config, starting at the current quality:
+        the substeps are lowered first, then the simulated agents, then the resolution
+        """
+        scales = [scale for scale in self.resolution_scales
+                  if config.quality_min_resolution_scale <= scale <= config.quality_max_resolution_scale] or [1.0]
+        fractions = [fraction for fraction in self.agent_fractions
+                     if fraction >= config.quality_min_agent_fraction] or [1.0]
+        knobs = {
+            'substeps': list(range(1, config.simulation_substeps + 1)),
+            'agents': fractions,
+            'resolution': scales
+        }
+        start = {'resolution': 1.0} if self.quality is None else self.quality.values
+        self.quality = AdaptiveQualityController(knobs, start, config.quality_target_frame_time / 1000)
+        self.quality.enabled = config.quality_adaptive
+        if self.quality.enabled:
+            self.apply_quality(self.quality.values)
+
+    def apply_quality(self, values: dict) -> None:
+        """pass the values of the quality controller to the simulation and the clock"""
+        if 'substeps' in values:
+            self.clock.substeps = values['substeps']
+        if 'agents' in values:
+            self.simulation.set_active_agents(values['agents'])
+        if values:
+            self.pacer.mark('quality change')
+        if 'resolution' in values:
+            self.simulation.resize((round(self.texture_dimensions[0] * values['resolution']),
+                                    round(self.texture_dimensions[1] * values['resolution'])))
+
+    def set_adaptive_quality(self, enabled: bool) -> None:
+        """turn the adaptive quality on (at the current quality) or off (back at full quality)"""
+        config.quality_adaptive = enabled
+        self.quality.enabled = enabled
+        if enabled:
+            self.quality.reset()
+        else:
+            self.apply_quality({'substeps': config.simulation_substeps, 'agents': 1.0, 'resolution': 1.0})
+            self.quality = None
+            self.create_quality_controller()
 
     def clear(self):
-        # release and redefine the texture
-        self.displayed_texture.release()
-        self.displayed_texture = self.ctx.texture(self.texture_dimensions, 4)
-        self.displayed_texture.repeat_x, self.displayed_texture.repeat_y = False, False
-        self.displayed_texture.filter = mgl.NEAREST, mgl.NEAREST
-
-        # generate new dataset and override the old one
-        self.buffer_agent_data.clear()
-        self.buffer_agent_data.orphan(config.number_of_agents * 4 * 4)  # buffer re-specification
-        self.buffer_agent_data.write(
-            data=generate_agent_data(
-                config.number_of_agents,
-                self.texture_dimensions
-            ).astype('f4')
-        )
+        """restart the simulation"""
+        self.pacer.mark('restart')
+        self.simulation.clear()
+        self.clock.reset()
+        self.quality.reset()  # the restart stalls a frame
+
+    def save_checkpoint(self) -> None:
+        """write the state of the simulation to the checkpoint file"""
+        self.pacer.mark('checkpoint save')
+        try:
+            save_checkpoint(config.checkpoint_path, self.simulation, config.checkpoint_compression,
+                            extra={'steps': self.clock.steps, 'time': self.clock.time})
+            self.checkpoint_status = f'saved at step {self.clock.steps}'
+        except (OSError, ValueError) as e:
+            logger.exception(e)
+            self.checkpoint_status = f'saving failed: {e}'
 
-        # override the data stored for the compute shaders
-        self.displayed_texture.bind_to_image(0, read=True, write=True)
-        self.buffer_agent_data.bind_to_storage_buffer(1)
+    def load_checkpoint(self) -> None:
+        """restore the state of the simulation from the checkpoint file"""
+        self.pacer.mark('checkpoint load')
+        try:
+            header = load_checkpoint(config.checkpoint_path, self.simulation)
+        except (OSError, ValueError, KeyError) as e:
+            logger.exception(e)
+            self.checkpoint_status = f'loading failed: {e}'
+            return
+
+        self.clock.time_step, self.clock.substeps = config.simulation_time_step, config.simulation_substeps
+        self.clock.steps = header['extra'].get('steps', 0)
+        self.clock.time = header['extra'].get('time', 0.0)
+        self.checkpoint_status = f'loaded step {self.clock.steps}'
+
+        # the checkpoint brings its own resolution, the controller continues at its current quality
+        if self.quality.enabled:
+            self.apply_quality(self.quality.values)
+            self.quality.reset()
 
     # ----------
     # rendering
@@ -158,43 +236,68 @@ class SlimeMoldWindow(WindowConfig):
 
     def render(self, time: float, frame_time: float) -> None:
         """called every frame - render everything"""
-        self.render_simulation_frame(frame_time)
-        self.render_ui_frame()
+        self.pacer.begin_frame(frame_time)
+        if self.programs.precompile_next():
+            self.pacer.mark('shader precompile')
+
+        with self.profiler.cpu('frame'):
+            self.render_simulation_frame(frame_time)
+            with self.profiler.cpu('ui'):
+                self.render_ui_frame()
+        self.profiler.end_frame()
+        self.profiler.enabled = self.show_performance
+        self.metrics.record('frame', frame_time=frame_time, steps=self.clock.steps)
+
+        # the changes of the quality controller take effect with the next frame;
+        # it only gets the frames that stepped the simulation at the normal pace (not paused, minimized or
+        # in the simulation only mode, which redraws the window a few times per second)
+        if not self.clock.paused and not self.pacer.simulation_only and min(self.wnd.buffer_size) > 0:
+            self.apply_quality(self.quality.update(frame_time))
+        self.pacer.end_frame()  # sleeps if the frame rate is capped
 
     # ----------
     # rendering: simulation
     # ----------
 
     def render_simulation_frame(self, frame_time: float) -> None:
-        """render the textures"""
+        """render the textures, the simulation catches up with the frame time (s)"""
         # clear screen (background color)
         self.ctx.clear(*config.clr_bg_rgb)
 
-        # pass the frame time to the compute shader s
-        try:
-            self.slime_compute_shader['frame_time'] = frame_time
-        except Exception as e:
-            logger.exception(e)
-
-        try:
-            self.blur_compute_shader['frame_time'] = frame_time
-        except Exception as e:
-            logger.exception(e)
-
-        # bind texture and buffer to storage so that the compute shaders can access them
-        self.displayed_texture.bind_to_image(0, read=True, write=True)
-        # ^^^ automatically binds as a GL_R32F / r32f (read from the texture)
-        self.buffer_agent_data.bind_to_storage_buffer(1)
-
-        # run the compute shaders and let them compute values for EVERY GODDAMN PIXEL
-        # first blur the texture, then render the agents to display the agents at full brightness
-        # TODO: implement group sizes
-        self.blur_compute_shader.run(self.texture_dimensions[0], self.texture_dimensions[1])
-        self.slime_compute_shader.run(self.texture_dimensions[0], self.texture_dimensions[1])
+        # the sliders change the config, the changed parameters are uploaded once per frame
+        self.simulation.apply_parameters()
+        if self.simulation.parameters.dirty:
+            self.pacer.mark('config change')
+        self.simulation.parameters.upload()
+        self.update_palette()
+
+        # advance the simulation by a fixed time step, as often as the clock demands during this frame;
+        # intermediate steps are never displayed
+        sorts = self.simulation.sort_statistics['sorts']
+        with self.profiler.cpu('simulation'):
+            if self.pacer.simulation_only:  # uncapped: simulate until the window is due to be redrawn
+                start = perf_counter()
+                while perf_counter() - start < self.pacer.display_interval:
+                    steps = self.clock.tick()
+                    if steps == 0:  # paused
+                        break
+                    for _ in range(steps):
+                        self.simulation.step(self.clock.time_step)
+                    self.ctx.finish()  # otherwise only the submission of the steps would be timed
+            else:
+                for _ in range(self.clock.tick(frame_time)):
+                    self.simulation.step(self.clock.time_step)
+        if self.simulation.sort_statistics['sorts'] != sorts:
+            self.pacer.mark('agent sort')
 
         # render texture
-        self.displayed_texture.use(location=0)
-        self.quad_fs.render(self.texture_renderer)
+        self.simulation.displayed_texture.use(location=0)
+        self.palette_texture.use(location=1)
+        with self.profiler.gpu('quad'):
+            self.quad_fs.render(self.texture_renderer)
+
+        # record the frame before the ui is rendered on top of it
+        self.recorder.capture_frame()
 
     # ----------
     # rendering: imgui ui
@@ -209,6 +312,9 @@ class SlimeMoldWindow(WindowConfig):
         if imgui.begin('COMPUTE SHADERS'):
             imgui.push_item_width(imgui.get_window_width() * 0.75)  # max item with: 75% of the window from the left
 
+            _, self.show_performance = imgui.checkbox('Show performance', self.show_performance)
+            _, self.show_frame_pacing = imgui.checkbox('Show frame pacing', self.show_frame_pacing)
+
             imgui.text('Restart the Simulation: ')
             imgui.begin_child('restart_simulation', 0, 42, True)
             if imgui.button('[RESTART]', 0, 25):  # load the compute shader if the button is clicked
@@ -230,95 +336,174 @@ class SlimeMoldWindow(WindowConfig):
                             config.most_recent_shader_directory = shader_dir  # to the selected shader dir
 
                         # textured quad rendering
-                        self.texture_renderer = self.load_program(
-                            vertex_shader=f'{shader_dir}/vertex_shader.glsl',
-                            fragment_shader=f'{shader_dir}/fragment_shader.glsl'
-                        )
-
-                        # blur compute shader
-                        self.blur_compute_shader = self.load_compute_shader(
-                            f'{config.most_recent_shader_directory}/blur_compute_shader.glsl',
-                            defines={
-                                'destText': 0
-                            }
-                        )
-
-                        # compute shader
-                        self.slime_compute_shader = self.load_compute_shader(
-                            f'{shader_dir}/compute_shader.glsl',
-                            defines={
-                                'destText': 0
-                            }
-                        )
-                        # clr_fg needs to be passed to the compute shader initially, because it is a uniform
-                        self.slime_compute_shader['clr_fg'] = config.clr_fg_rgb
+                        self.load_texture_renderer(shader_dir)
+
+                        # compute shaders
+                        self.pacer.mark('shader load')
+                        self.simulation.load_programs(shader_dir)
             imgui.end_child()
 
             imgui.pop_item_width()
             imgui.end()  # close current window context
 
-        if imgui.begin('COLORS'):
+        if imgui.begin('SIMULATION [clock]'):
             imgui.push_item_width(imgui.get_window_width() * 0.75)
 
-            imgui.text('Foreground Color')
-            imgui.begin_child('clr_fg', 0, 35, True)  # child region with border
-            changed, config.clr_fg_rgb = imgui.color_edit3(
-                "fg", *config.clr_fg_rgb
+            if imgui.button('[RESUME]' if self.clock.paused else '[PAUSE]', 0, 25):
+                self.clock.toggle_pause()
+                self.quality.reset()  # the frame times of a paused simulation do not tell its cost
+            imgui.same_line()
+            if imgui.button('[STEP]', 0, 25):  # advance a paused simulation by a single step
+                self.clock.single_step()
+            imgui.same_line()
+            imgui.text(f'step {self.clock.steps} | time {self.clock.time:.2f}s')
+
+            changed, config.simulation_time_step = imgui.slider_float(
+                'Time Step', config.simulation_time_step, 0.001, 0.1
             )
-            imgui.end_child()
-            if changed:  # pass the new value to the compute shader
-                self.slime_compute_shader['clr_fg'] = config.clr_fg_rgb
+            if changed:
+                self.clock.time_step = config.simulation_time_step
 
-            imgui.spacing()
+            changed, config.simulation_substeps = imgui.slider_int(
+                'Steps per Time Step', config.simulation_substeps, 1, 16
+            )
+            if changed:
+                self.clock.substeps = config.simulation_substeps
+                self.create_quality_controller()  # the substeps are one of the knobs of the controller
 
-            imgui.text('Background Color')
-            imgui.begin_child('clr_bg', 0, 35, True)
-            changed, config.clr_bg_rgb = imgui.color_edit3(
-                "bg", *config.clr_bg_rgb
+            _, self.clock.fast_forward = imgui.slider_int(
+                'Fast-Forward', self.clock.fast_forward, 1, 64
             )
-            imgui.end_child()
 
             imgui.pop_item_width()
             imgui.end()
 
-        # TODO: dialogues for changing the sliders min and max values
-        if imgui.begin('SLIMES [agents]'):
+        if imgui.begin('QUALITY [adaptive]'):
             imgui.push_item_width(imgui.get_window_width() * 0.75)
 
-            changed, config.slime_movement_speed = imgui.slider_float(
-                'Movement Speed', config.slime_movement_speed, 0.0, 2
-            )
+            changed, adaptive = imgui.checkbox('Adaptive Quality', config.quality_adaptive)
             if changed:
-                self.slime_compute_shader['movement_speed'] = config.slime_movement_speed
-
-            changed, config.slime_rotation_speed = imgui.slider_float(
-                'Rotation Speed', config.slime_rotation_speed, 0.0, 2
+                self.set_adaptive_quality(adaptive)
+            changed, config.quality_target_frame_time = imgui.slider_float(
+                'Target Frame Time (ms)', config.quality_target_frame_time, 4.0, 50.0
             )
             if changed:
-                self.slime_compute_shader['rotation_speed'] = config.slime_rotation_speed
+                self.quality.target_frame_time = config.quality_target_frame_time / 1000
 
-            changed, config.slime_sensor_angle = imgui.slider_float(
-                'Sensor Angle', config.slime_sensor_angle, 0.0, 6.5
-            )
-            if changed:
-                self.slime_compute_shader['sensor_angle'] = config.slime_sensor_angle
+            width, height = self.simulation.texture_dimensions
+            imgui.text(f'trail map {width}x{height} | agents {self.simulation.active_agent_count} '
+                       f'of {self.simulation.agent_count} | steps per time step {self.clock.substeps}')
+            if self.quality.enabled:
+                imgui.text(f'frame time (median of {self.quality.window_frames} frames): '
+                           f'{self.quality.measured * 1000:.1f} ms')
+                for decision in self.quality.decisions:
+                    imgui.text(decision)
 
-            changed, config.slime_sensor_distance = imgui.slider_int(
-                'Sensor Distance', config.slime_sensor_distance, 1, 10
-            )
-            if changed:
-                self.slime_compute_shader['sensor_distance'] = config.slime_sensor_distance
+            imgui.pop_item_width()
+            imgui.end()
+
+        if imgui.begin('COLORS'):
+            imgui.push_item_width(imgui.get_window_width() * 0.75)
 
-            changed, config.slime_sensor_size = imgui.slider_int(
-                'Sensor Size', config.slime_sensor_size, 1, 10
+            imgui.text('Background Color')
+            imgui.begin_child('clr_bg', 0, 35, True)  # child region with border
+            _, config.clr_bg_rgb = imgui.color_edit3(
+                "bg", *config.clr_bg_rgb
             )
-            if changed:
-                self.slime_compute_shader['sensor_size'] = config.slime_sensor_size
+            imgui.end_child()
+
+            # the trail map is colored by the fragment shader, changing the colors costs nothing in the simulation
+            palettes = list(PALETTES)
+            palette = palettes.index(config.trail_palette) if config.trail_palette in palettes else 0
+            _, palette = imgui.combo('Palette', palette, palettes)
+            config.trail_palette = palettes[palette]
+
+            precisions = [f'{precision} bit' for precision in config.trail_precisions]
+            precision = config.trail_precisions.index(config.trail_precision) \
+                if config.trail_precision in config.trail_precisions else 0
+            _, precision = imgui.combo('Trail Precision', precision, precisions)
+            config.trail_precision = config.trail_precisions[precision]
+            if config.trail_precision != self.simulation.trail_precision:
+                imgui.text('(applied on restart)')
+
+            imgui.pop_item_width()
+            imgui.end()
+
+        # TODO: dialogues for changing the sliders min and max values
+        if imgui.begin('SLIMES [agents]'):
+            imgui.push_item_width(imgui.get_window_width() * 0.75)
 
             changed, config.number_of_agents = imgui.slider_int(
-                'Number of Agents', config.number_of_agents, 10000, 500000
+                'Number of Agents', config.number_of_agents, 10000, 4000000
+            )
+            changed, config.species_count = imgui.slider_int(
+                'Number of Species', config.species_count, 1, config.max_species_count
+            )
+            layout = SPAWN_LAYOUTS.index(config.spawn_layout) if config.spawn_layout in SPAWN_LAYOUTS else 0
+            _, layout = imgui.combo('Spawn Layout', layout, SPAWN_LAYOUTS)
+            config.spawn_layout = SPAWN_LAYOUTS[layout]
+            _, config.spawn_seed = imgui.input_int('Seed (0: random)', config.spawn_seed)
+            config.spawn_seed = max(0, config.spawn_seed)
+            # packed: half of the memory traffic of the agents, for fixed point positions and 4096 angles
+            storages = list(AGENT_LAYOUTS)
+            storage = storages.index(config.agent_storage) if config.agent_storage in storages else 0
+            _, storage = imgui.combo('Agent Storage', storage, [f'{name} ({AGENT_LAYOUTS[name]} bytes)'
+                                                                for name in storages])
+            config.agent_storage = storages[storage]
+            imgui.text('In order to change the number of slime agents or species, the spawn layout,\n'
+                       'the seed or the agent storage, you will have to restart the simulation.')
+
+            # sorting the agents by their position makes the memory accesses of the slime pass coherent
+            _, config.agent_sort_interval = imgui.slider_int(
+                'Sort every n Steps (0: never)', config.agent_sort_interval, 0, 120
             )
-            imgui.text('In order to change the number of slime agents, \nyou will have to restart the simulation.')
+            statistics = self.simulation.sort_statistics
+            if config.agent_sort_interval and statistics['unsorted'] and statistics['sorted']:
+                speedup = statistics['unsorted'] / statistics['sorted']
+                imgui.text(f'slime pass: {statistics["unsorted"]:.3f} ms before sorting, '
+                           f'{statistics["sorted"]:.3f} ms after ({speedup:.2f}x)')
+
+            # every species has its own set of parameters
+            for index, species in enumerate(config.species[:self.simulation.species_count]):
+                expanded, _ = imgui.collapsing_header(f'Species {index + 1}')
+                if not expanded:
+                    continue
+
+                imgui.push_id(f'species_{index}')
+                changed_species = False
+
+                changed, species.clr_rgb = imgui.color_edit3('Color', *species.clr_rgb)
+                changed_species |= changed
+
+                changed, species.movement_speed = imgui.slider_float(
+                    'Movement Speed', species.movement_speed, 0.0, 2
+                )
+                changed_species |= changed
+
+                changed, species.rotation_speed = imgui.slider_float(
+                    'Rotation Speed', species.rotation_speed, 0.0, 2
+                )
+                changed_species |= changed
+
+                changed, species.sensor_angle = imgui.slider_float(
+                    'Sensor Angle', species.sensor_angle, 0.0, 6.5
+                )
+                changed_species |= changed
+
+                changed, species.sensor_distance = imgui.slider_int(
+                    'Sensor Distance', species.sensor_distance, 1, 10
+                )
+                changed_species |= changed
+
+                changed, species.sensor_size = imgui.slider_int(
+                    'Sensor Size', species.sensor_size, 1, 10
+                )
+                changed_species |= changed
+
+                if changed_species:  # pass the new values to the species buffer
+                    self.pacer.mark('config change')
+                    self.simulation.update_species()
+                imgui.pop_id()
 
             imgui.pop_item_width()
             imgui.end()
@@ -326,28 +511,59 @@ class SlimeMoldWindow(WindowConfig):
         if imgui.begin('PHEREMONES [blur]'):
             imgui.push_item_width(imgui.get_window_width() * 0.75)
 
-            changed, config.blur_diffusion_speed = imgui.slider_float(
+            _, config.blur_diffusion_speed = imgui.slider_float(
                 'Diffusion Speed', config.blur_diffusion_speed, 0.0, 50.0
             )
-            if changed:
-                self.blur_compute_shader['diffusion_speed'] = config.blur_diffusion_speed
-
-            changed, config.blur_evaporation_speed = imgui.slider_float(
+            _, config.blur_evaporation_speed = imgui.slider_float(
                 'Evaporation Speed', config.blur_evaporation_speed, 0.0, 10
             )
-            if changed:
-                self.blur_compute_shader['evaporation_speed'] = config.blur_evaporation_speed
 
             imgui.pop_item_width()
             imgui.end()
 
+        if imgui.begin('CHECKPOINT'):
+            imgui.push_item_width(imgui.get_window_width() * 0.75)
+
+            _, config.checkpoint_path = imgui.input_text('File', config.checkpoint_path, 256)
+            compression = COMPRESSIONS.index(config.checkpoint_compression) \
+                if config.checkpoint_compression in COMPRESSIONS else 0
+            _, compression = imgui.combo('Compression', compression, COMPRESSIONS)
+            config.checkpoint_compression = COMPRESSIONS[compression]
+            _, config.checkpoint_save_on_close = imgui.checkbox('Save on close', config.checkpoint_save_on_close)
+
+            if imgui.button('[SAVE]', 0, 25):
+                self.save_checkpoint()
+            imgui.same_line()
+            if imgui.button('[LOAD]', 0, 25):
+                self.load_checkpoint()
+            imgui.text(self.checkpoint_status)
+
+            imgui.pop_item_width()
+            imgui.end()
+
+        if render_capture_window(self.recorder):
+            self.pacer.mark('capture start')
+
+        if self.show_performance:
+            self.show_performance = render_performance_window(
+                self.profiler, self.profile_directory, 'slime_mold_window'
+            )
+        if self.show_frame_pacing:
+            simulation_only = self.pacer.simulation_only
+            self.show_frame_pacing = render_frame_pacing_window(
+                self.pacer, config, self.profile_directory, 'slime_mold_window', simulation_only=True
+            )
+            if self.pacer.simulation_only != simulation_only:
+                self.quality.reset()  # the frames of the other mode do not tell the cost of a frame
+
         # close imgui frame context
         imgui.end_frame()
 
         # pass all drawing commands to the rendering pipeline:
         #   render imgui elements and display them in the moderngl-window window
         imgui.render()
-        self.imgui_renderer.render(imgui.get_draw_data())
+        with self.profiler.gpu('ui'):
+            self.imgui_renderer.render(imgui.get_draw_data())
 
     # ----------
     # ui events
@@ -379,10 +595,19 @@ class SlimeMoldWindow(WindowConfig):
 
     def resize(self, width: int, height: int) -> None:
         """forward resize event to imgui"""
+        self.pacer.mark('resize')
         self.imgui_renderer.resize(width, height)
+        self.recorder.resize()
 
     def close(self):
-        """write changes to the config file when the window is closed"""
+        """stop recording and write changes to the config file (and the checkpoint) when the window is closed"""
+        self.recorder.stop()
+        self.profiler.release()
+        self.programs.release()
+        self.palette_texture.release()
+
+        if config.checkpoint_save_on_close:
+            self.save_checkpoint()
         config.save()
 
 
@@ -0,0 +1,298 @@
+from logging import getLogger
+from config import SlimeMoldWindowConfig
+from .palettes import colorize
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from itertools import product
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+import numpy
+import json
+import os
+
+
+"""
+logging
+"""
+
+
+# inherit the logger from the parent
+logger = getLogger(__name__)
+
+
+"""
+parameters
+"""
+
+
+# the parameters that can be swept: name -> type, the species parameters apply to every species
+# (species_<n>.<name> to a single one)
+SPECIES_PARAMETERS = {
+    'movement_speed': float,
+    'rotation_speed': float,
+    'sensor_angle': float,
+    'sensor_distance': int,
+    'sensor_size': int
+}
+BLUR_PARAMETERS = {
+    'diffusion_speed': float,
+    'evaporation_speed': float
+}
+
+# the columns of the summary metrics of a run (see trail_metrics())
+METRICS = ('mean', 'std', 'coverage', 'edges', 'steps_per_second', 'seconds')
+
+
+def parameter_type(name: str) -> type:
+    """the type of a sweepable parameter, raises a ValueError for an unknown one"""
+    name = name.split('.', 1)[-1]
+    if name in SPECIES_PARAMETERS:
+        return SPECIES_PARAMETERS[name]
+    if name in BLUR_PARAMETERS:
+        return BLUR_PARAMETERS[name]
+    raise ValueError(f'unknown parameter {name}, expected one of {list(SPECIES_PARAMETERS) + list(BLUR_PARAMETERS)}')
+
+
+def parse_grid(text: str) -> tuple:
+    """
+    'name=0.1,0.2,0.4' (the given values) or 'name=0.1:0.5:5' (5 values from 0.1 to 0.5)
+    -> (name, [values])
+    """
+    name, values = text.split('=', 1)
+    cast = parameter_type(name)
+    if ':' in values:
+        start, stop, count = values.split(':')
+        values = numpy.linspace(float(start), float(stop), int(count)).tolist()
+    else:
+        values = [float(value) for value in values.split(',')]
+    return name, list(dict.fromkeys(cast(round(value)) if cast is int else value for value in values))
+
+
+def parse_range(text: str) -> tuple:
+    """'name=0.1:0.5' -> (name, (0.1, 0.5)), the range of a randomly sampled parameter"""
+    name, values = text.split('=', 1)
+    parameter_type(name)
+    low, high = values.split(':')
+    return name, (float(low), float(high))
+
+
+def parameter_sets(grid: dict, ranges: dict = None, samples: int = 1, seed: int = 0) -> list:
+    """
+    every combination of the grid values, each one combined with samples random draws of the ranged parameters
+    (uniform, integers are rounded), e.g. an empty grid and 200 samples: 200 random parameter sets
+    """
+    ranges = ranges or {}
+    rng = numpy.random.default_rng(seed)
+
+    sets = []
+    for values in product(*grid.values()):
+        for _ in range(samples if ranges else 1):
+            parameters = dict(zip(grid, values))
+            for name, (low, high) in ranges.items():
+                value = rng.uniform(low, high)
+                parameters[name] = int(round(value)) if parameter_type(name) is int else float(value)
+            sets.append(parameters)
+    return sets
+
+
+def apply_sweep_parameters(config: SlimeMoldWindowConfig, parameters: dict) -> None:
+    """write a parameter set to a config"""
+    for name, value in parameters.items():
+        if name in BLUR_PARAMETERS:
+            setattr(config, f'blur_{name}', value)
+        elif '.' in name:  # species_<n>.<name>
+            section, name = name.split('.', 1)
+            setattr(config.species[int(section.split('_')[1])], name, value)
+        else:
+            for species in config.species:
+                setattr(species, name, value)
+
+
+def trail_metrics(trail_map: numpy.ndarray) -> dict:
+    """
+    summary metrics of a trail map (height, width, channels): the mean and the standard deviation of the summed trail,
+    the share of the texels with a visible trail and the mean gradient (how much structure there is)
+    """
+    trail = numpy.clip(trail_map.astype('f4').sum(axis=-1), 0.0, 1.0)
+    return {
+        'mean': float(trail.mean()),
+        'std': float(trail.std()),
+        'coverage': float((trail > 0.05).mean()),
+        'edges': float(numpy.abs(numpy.diff(trail, axis=0)).mean() + numpy.abs(numpy.diff(trail, axis=1)).mean())
+    }
+
+
+"""
+runs
+"""
+
+
+def run_sweep_case(index: int, parameters: dict, settings: dict) -> dict:
+    """
+    Runs a single parameter set on a standalone context (in a worker process): writes its thumbnail
+    (<index>.png) and its summary (<index>.json) to the results directory and returns the summary.
+    """
+    from slime_mold_window.offscreen import OffscreenSlimeMoldRunner
+    from PIL import Image  # pillow is a dependency of moderngl-window
+
+    directory = Path(settings['directory'])
+    summary = {'index': index, 'parameters': parameters}
+    try:
+        config = SlimeMoldWindowConfig()
+        config.number_of_agents = settings['agents']
+        config.species_count = settings['species']
+        config.spawn_seed = settings['seed']  # every run starts from the same agents
+        config.agent_sort_interval = 0
+        apply_sweep_parameters(config, parameters)
+
+        start = perf_counter()
+        runner = OffscreenSlimeMoldRunner(config, tuple(settings['size']), backend=settings['backend'],
+                                          tune_group_sizes=False)
+        try:
+            trail_map = runner.run(settings['steps'], settings['frame_time'])
+        finally:  # the worker runs the next sets, a failed run must not keep its context
+            runner.release()
+        summary.update(trail_metrics(trail_map), steps_per_second=runner.steps_per_second,
+                       seconds=perf_counter() - start)
+
+        image = colorize(trail_map, config.clr_bg_rgb, [species.clr_rgb for species in config.species],
+                         settings['palette'])
+        image = Image.fromarray(numpy.ascontiguousarray(image[::-1]), 'RGB')  # the texture starts at the bottom
+        image.thumbnail((settings['thumbnail_width'], settings['thumbnail_width']))
+        image.save(directory / f'{index:04d}.png')
+    except Exception as e:  # e.g. no OpenGL 4.3 context, the other runs go on
+        logger.exception(e)
+        summary['error'] = f'{type(e).__name__}: {e}'
+
+    (directory / f'{index:04d}.json').write_text(json.dumps(summary, indent=4))
+    return summary
+
+
+def write_index(directory: Path, summaries: list) -> None:
+    """one line per run (index, parameters, metrics) in index.csv, sorted by index"""
+    names = list(dict.fromkeys(name for summary in summaries for name in summary['parameters']))
+    lines = [','.join(['index'] + names + list(METRICS) + ['error'])]
+    for summary in sorted(summaries, key=lambda summary: summary['index']):
+        lines.append(','.join([str(summary['index'])] +
+                              [str(summary['parameters'].get(name, '')) for name in names] +
+                              [str(summary.get(metric, '')) for metric in METRICS] +
+                              [summary.get('error', '').replace(',', ';')]))
+    (directory / 'index.csv').write_text('\n'.join(lines) + '\n')
+
+
+def write_contact_sheet(directory: Path, summaries: list, columns: int = 8) -> Path:
+    """the thumbnails of the runs on a single image, labeled with their index, in the order of the index"""
+    from PIL import Image, ImageDraw
+
+    thumbnails = [(summary['index'], directory / f'{summary["index"]:04d}.png')
+                  for summary in sorted(summaries, key=lambda summary: summary['index'])]
+    thumbnails = [(index, Image.open(path)) for index, path in thumbnails if path.is_file()]
+    if not thumbnails:
+        return None
+
+    width = max(image.width for _, image in thumbnails)
+    height = max(image.height for _, image in thumbnails)
+    columns = min(columns, len(thumbnails))
+    rows = (len(thumbnails) + columns - 1) // columns
+
+    sheet = Image.new('RGB', (columns * width, rows * height))
+    draw = ImageDraw.Draw(sheet)
+    for position, (index, image) in enumerate(thumbnails):
+        x, y = position % columns * width, position // columns * height
+        sheet.paste(image, (x, y))
+        draw.text((x + 4, y + 2), f'{index:04d}', fill=(255, 255, 255))
+        image.close()
+
+    path = directory / 'contact_sheet.png'
+    sheet.save(path)
+    return path
+
+
+def sweep(sets: list, directory: Path, steps: int = 500, size: tuple = (320, 180), agents: int = 100000,
+          species: int = 1, seed: int = 1, frame_time: float = 1 / 60, workers: int = 0, backend: str = None,
+          palette: str = 'none', thumbnail_width: int = 160, columns: int = 8) -> list:
+    """
+    Runs every parameter set on a pool of worker processes (0: one per core) and writes the results:
+    sweep.json (the settings and the sets), a thumbnail and a summary per run, index.csv and contact_sheet.png.
+    Runs that already have a summary in the directory are skipped, so an interrupted sweep can be continued.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    settings = {
+        'directory': str(directory), 'steps': steps, 'size': list(size), 'agents': agents, 'species': species,
+        'seed': seed, 'frame_time': frame_time, 'backend': backend, 'palette': palette,
+        'thumbnail_width': thumbnail_width
+    }
+    (directory / 'sweep.json').write_text(json.dumps(
+        {'created': datetime.now().isoformat(timespec='seconds'), 'settings': settings, 'sets': sets}, indent=4
+    ))
+
+    summaries = []
+    pending = []
+    for index, parameters in enumerate(sets):
+        path = directory / f'{index:04d}.json'
+        summary = json.loads(path.read_text()) if path.is_file() else None
+        if summary is not None and summary['parameters'] == parameters and 'error' not in summary:
+            summaries.append(summary)
+        else:
+            pending.append((index, parameters))
+    if summaries:
+        logger.info(f'{len(summaries)} of {len(sets)} runs found in {directory}, they are skipped')
+
+    # fresh interpreters, every worker creates its own standalone contexts
+    start = perf_counter()
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=get_context('spawn')) as executor:
+        futures = [executor.submit(run_sweep_case, index, parameters, settings) for index, parameters in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            summary = future.result()
+            summaries.append(summary)
+            print(format_summary(summary) + f' [{done}/{len(pending)}, {perf_counter() - start:.0f} s]', flush=True)
+
+    write_index(directory, summaries)
+    write_contact_sheet(directory, summaries, columns)
+    return summaries
+
+
+def format_summary(summary: dict) -> str:
+    """one line per run"""
+    parameters = ' '.join(f'{name}={value:.4g}' for name, value in summary['parameters'].items())
+    if 'error' in summary:
+        return f'{summary["index"]:04d} {parameters}: {summary["error"]}'
+    return f'{summary["index"]:04d} {parameters}: coverage {summary["coverage"]:.3f}, edges {summary["edges"]:.4f}, ' \
+           f'{summary["steps_per_second"]:.1f} steps/s'
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    from benchmark.runner import parse_size
+
+    parser = ArgumentParser(description='run the slime mold simulation for a grid or a random sample of parameters '
+                                        'and write a thumbnail and summary metrics per run')
+    parser.add_argument('directory', help='the results directory (an interrupted sweep is continued)')
+    parser.add_argument('--grid', nargs='*', type=parse_grid, default=[],
+                        help="name=v1,v2,... or name=start:stop:count, e.g. sensor_angle=0.3:1.2:4")
+    parser.add_argument('--random', nargs='*', type=parse_range, default=[],
+                        help="name=low:high, sampled --samples times per grid combination")
+    parser.add_argument('--samples', type=int, default=16)
+    parser.add_argument('--sample-seed', type=int, default=0, help='the seed of the random parameters')
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--size', type=parse_size, default=(320, 180))
+    parser.add_argument('--agents', type=int, default=100000)
+    parser.add_argument('--species', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1, help='the spawn seed of every run')
+    parser.add_argument('--frame-time', type=float, default=1 / 60)
+    parser.add_argument('--workers', type=int, default=0, help='worker processes, 0: one per core')
+    parser.add_argument('--backend', default=None, help='glcontext backend, e.g. egl')
+    parser.add_argument('--palette', default='none')
+    parser.add_argument('--thumbnail-width', type=int, default=160)
+    parser.add_argument('--columns', type=int, default=8, help='thumbnails per row of the contact sheet')
+    arguments = parser.parse_args()
+
+    sweep_sets = parameter_sets(dict(arguments.grid), dict(arguments.random), arguments.samples, arguments.sample_seed)
+    print(f'{len(sweep_sets)} parameter sets')
+    sweep_summaries = sweep(sweep_sets, Path(arguments.directory), arguments.steps, arguments.size, arguments.agents,
+                            arguments.species, arguments.seed, arguments.frame_time, arguments.workers,
+                            arguments.backend, arguments.palette, arguments.thumbnail_width, arguments.columns)
+    failed = sum('error' in summary for summary in sweep_summaries)
+    print(f'{len(sweep_summaries)} runs ({failed} failed) in {arguments.directory}: index.csv, contact_sheet.png')
@@ -0,0 +1,48 @@
+from mandelbrot_set_window.tile_cache import DiskTier
+import numpy
+import json
+
+
+TILE_SIZE = 4
+TILE_BYTES = TILE_SIZE * TILE_SIZE * 4
+
+
+def tile(value: float) -> numpy.ndarray:
+    return numpy.full((TILE_SIZE, TILE_SIZE), value, dtype=numpy.float32)
+
+
+def test_reloading_a_sparse_index_keeps_the_slots_apart(tmp_path):
+    disk = DiskTier(tmp_path, TILE_SIZE, limit=4 * TILE_BYTES)
+    for value in range(3):  # slots 0, 1 and 2
+        disk.put((0, value, 0, 100), tile(value))
+    disk.close()
+
+    # drop the tile in slot 1, the index is sparse then
+    index = json.loads((tmp_path / 'index.json').read_text())
+    index['slots'] = [entry for entry in index['slots'] if entry[-1] != 1]
+    (tmp_path / 'index.json').write_text(json.dumps(index))
+
+    disk = DiskTier(tmp_path, TILE_SIZE, limit=4 * TILE_BYTES)
+    disk.put((0, 3, 0, 100), tile(3))
+    disk.put((0, 4, 0, 100), tile(4))
+
+    assert len(set(disk.slots.values())) == len(disk.slots) == 4
+    for value in (0, 2, 3, 4):
+        assert (disk.get((0, value, 0, 100)) == value).all()
+    disk.close()
+
+
+def test_reloading_with_a_smaller_limit_evicts_instead_of_sharing_slots(tmp_path):
+    disk = DiskTier(tmp_path, TILE_SIZE, limit=8 * TILE_BYTES)
+    for value in range(6):
+        disk.put((0, value, 0, 100), tile(value))
+    disk.close()
+
+    disk = DiskTier(tmp_path, TILE_SIZE, limit=3 * TILE_BYTES)
+    assert sorted(disk.slots.values()) == [0, 1, 2]
+    disk.put((0, 6, 0, 100), tile(6))
+
+    assert len(set(disk.slots.values())) == len(disk.slots) == 3
+    for key in list(disk.slots):
+        assert (disk.get(key) == key[1]).all()
+    disk.close()
@@ -1,7 +1,9 @@
 #version 430
 
-// local group size
-layout( local_size_x = 1, local_size_y = 1 ) in;
+// local group size (updated by the python program running this)
+#define group_size_x 8
+#define group_size_y 8
+layout( local_size_x = group_size_x, local_size_y = group_size_y ) in;
 
 // input texture (format!)
 layout( rgba8, location = 0 ) uniform image2D destTex;
@@ -15,12 +17,15 @@ uniform vec3 clr_fg;
 void main() {
     // get coordinates of the textel
     ivec2 texelPos = ivec2( gl_GlobalInvocationID.xy );
+    if ( any( greaterThanEqual( texelPos, imageSize( destTex ) ) ) ) {  // the last work groups can overhang
+        return;
+    }
 
     // get the value that is stored for the texel in the image
     // float texelOldVal = imageLoad( destTex, texelPos ).a;
 
     // waveeeeeee
-    float texelNewVal = sin( float( gl_WorkGroupID.x + gl_WorkGroupID.y ) * 0.01 + time ) / 2.0 + 0.5;
+    float texelNewVal = sin( float( texelPos.x + texelPos.y ) * 0.01 + time ) / 2.0 + 0.5;
 
     // store the value that has been calculated for the texel in the image
     imageStore( destTex, texelPos, vec4( clr_fg.r, clr_fg.g, clr_fg.b, texelNewVal ) );
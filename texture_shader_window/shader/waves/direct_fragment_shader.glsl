@@ -0,0 +1,20 @@
+#version 330
+
+// the same image as compute_shader.glsl, computed for every pixel of the framebuffer in a single pass
+// (used because shader.ini declares this shader directory as stateless)
+
+// variables to get from the python program running this
+uniform float time;
+uniform vec3 clr_fg;
+
+out vec4 fragColor;
+
+void main() {
+    // the pixel of the framebuffer, it matches the texel of the texture that follows the size of the window
+    ivec2 texelPos = ivec2( gl_FragCoord.xy );
+
+    // waveeeeeee
+    float texelNewVal = sin( float( texelPos.x + texelPos.y ) * 0.01 + time ) / 2.0 + 0.5;
+
+    fragColor = vec4( clr_fg.r, clr_fg.g, clr_fg.b, texelNewVal );
+}
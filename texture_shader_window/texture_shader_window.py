@@ -1,6 +1,14 @@
 from logging import getLogger
-from config import TextureShaderWindowConfig
+from config import TextureShaderWindowConfig, TextureShaderConfig
+from logger import get_metrics
+from rendering import WorkgroupSizeTuner, group_size_defines, group_count
+from rendering import DEFAULT_GROUP_SIZE_2D, GROUP_SIZES_2D
+from rendering import WindowCapture
+from rendering import FrameProfiler, ProgramCache, enable_driver_shader_cache
+from rendering import FramePacer
+from rendering.ui import render_capture_window, render_performance_window, render_frame_pacing_window
 from pathlib import Path
+from time import sleep
 from os import walk
 import moderngl as mgl
 from moderngl_window import WindowConfig
@@ -25,6 +33,9 @@ config
 # read and format the config
 config = TextureShaderWindowConfig()
 
+# the driver keeps the compiled programs on disk across launches (it reads this when the context is created)
+enable_driver_shader_cache()
+
 
 """
 rendering and gui
@@ -37,13 +48,18 @@ class TextureShaderWindow(WindowConfig):
 
     window_size = (1440, 720)
     aspect_ratio = None
+    vsync = config.frame_pacing_vsync
 
     resource_dir = (Path(__file__).parent / 'shader').resolve()
     # get a list of all the available shaders in the resource dir
     shader_dirs = list(next(walk(resource_dir), ([], None, None))[1])
 
-    texture_dimensions = (1920, 1080)
-    group_size = (1, 1, 1)
+    tune_group_sizes = True  # benchmark the local group size of the compute shader (cached per GL renderer)
+
+    capture_directory = Path('./captures')  # recordings of the rendered frames (without the ui)
+    profile_directory = Path('./logger/log')  # CSV files of the performance window
+
+    minimized_frame_interval = 0.1  # s, the frames of a minimized window only sleep
 
     def __init__(self, **kwargs) -> None:
         """initialization"""
@@ -54,39 +70,167 @@ class TextureShaderWindow(WindowConfig):
         # initialize a renderer for rendering the imgui elements in the moderngl-window window
         self.imgui_renderer = moderngl_window.integrations.imgui.ModernglWindowRenderer(self.wnd)
 
-        # create a texture that represents our canvas as a grid with the dimensions map_size = (x, y)
+        # the texture follows the size of the window, one pixel per texel (only stateful shaders need it)
+        self.texture_dimensions = self.wnd.buffer_size
+        self.displayed_texture = None
+        self.minimized = False
+
+        # a stateful compute shader only runs when the time, a uniform or the size has changed since its last run
+        self.shader_config = None
+        self.shader_time = 0.0
+        self.paused = False
+        self.dirty = True
+        self.dispatches = 0
+
+        # quad fragments
+        self.quad_fs = quad_fs()
+
+        # performance window: the profiler only measures while it is shown
+        self.show_performance = False
+        self.profiler = FrameProfiler(self.ctx, enabled=False)
+
+        # per-frame numbers, written by a background thread (discarded if the process has no metrics file)
+        self.metrics = get_metrics()
+
+        # vsync, fps cap and the record of the frame times (the stutters are logged with what happened)
+        self.show_frame_pacing = False
+        self.pacer = FramePacer(self.wnd, config.frame_pacing_vsync, config.frame_pacing_fps_cap,
+                                stutter_factor=config.frame_pacing_stutter_factor)
+
+        # frame capture of the framebuffer
+        self.recorder = WindowCapture(self.ctx, self.wnd, self.capture_directory, 'texture_shader_window')
+
+        self.tuner = WorkgroupSizeTuner(self.ctx) if self.tune_group_sizes else None
+        self.group_size = DEFAULT_GROUP_SIZE_2D
+
+        self.texture_renderer = None
+        self.compute_shader = None
+        self.direct_renderer = None  # the single pass of a stateless shader directory
+        self.programs = ProgramCache(self.ctx, self.resource_dir)
+        self.load_programs(config.most_recent_shader_directory)
+
+        # compile the programs of every shader directory over the next frames, switching between them is instant then
+        for shader_dir in self.shader_dirs:
+            self.precompile_programs(shader_dir)
+
+    def create_texture(self) -> None:
+        """(re)create the texture that represents our canvas with the size of the window"""
+        if self.displayed_texture is not None:
+            self.displayed_texture.release()
+
         self.displayed_texture = self.ctx.texture(self.texture_dimensions, 4)
         self.displayed_texture.repeat_x, self.displayed_texture.repeat_y = False, False
         self.displayed_texture.filter = mgl.NEAREST, mgl.NEAREST    # weighted average of the four closest
         # texture elements
+        self.dirty = True
+
+    def release_texture(self) -> None:
+        """a stateless shader directory does not need the texture"""
+        if self.displayed_texture is not None:
+            self.displayed_texture.release()
+            self.displayed_texture = None
+
+    def load_programs(self, shader_dir: str) -> None:
+        """load the programs of the given shader directory, the way its shader.ini declares"""
+        self.pacer.mark('shader load')
+        self.shader_config = TextureShaderConfig(self.resource_dir / shader_dir)
+        self.dirty = True
+
+        if self.shader_config.stateless:
+            self.release_texture()
+            self.texture_renderer = self.compute_shader = None
+            self.direct_renderer = self.programs.program(
+                f'{shader_dir}/vertex_shader.glsl',
+                f'{shader_dir}/direct_fragment_shader.glsl'
+            )
+            self.set_uniform(self.direct_renderer, 'clr_fg', config.clr_fg_rgb)
+            return
 
-        # quad fragments
-        self.quad_fs = quad_fs()
+        self.direct_renderer = None
+        if self.displayed_texture is None:
+            self.create_texture()
 
         # textured quad rendering
-        self.texture_renderer = self.load_program(
-            vertex_shader=f'{config.most_recent_shader_directory}/vertex_shader.glsl',
-            fragment_shader=f'{config.most_recent_shader_directory}/fragment_shader.glsl'
+        self.texture_renderer = self.programs.program(
+            f'{shader_dir}/vertex_shader.glsl',
+            f'{shader_dir}/fragment_shader.glsl'
         )
 
         # compute shader
-        self.compute_shader = self.load_compute_shader(
-            f'{config.most_recent_shader_directory}/compute_shader.glsl',
-            defines={
-                'destText': 0
-            }
+        if self.tuner is not None:
+            self.displayed_texture.bind_to_image(0, read=True, write=True)
+            self.group_size = self.tuner.tune(
+                f'{shader_dir}/compute_shader.glsl',
+                lambda group_size: self.load_compute_shader(  # uncached, the tuner releases the candidates
+                    f'{shader_dir}/compute_shader.glsl',
+                    defines=self.compute_shader_defines(group_size)
+                ),
+                lambda program, group_size: program.run(*group_count(self.texture_dimensions, group_size), 1),
+                GROUP_SIZES_2D,
+                DEFAULT_GROUP_SIZE_2D,
+                self.texture_dimensions
+            )
+
+        self.compute_shader = self.programs.compute_shader(
+            f'{shader_dir}/compute_shader.glsl',
+            self.compute_shader_defines(self.group_size)
         )
         # clr_fg needs to be passed to the compute shader initially, because it is a uniform
-        self.compute_shader['clr_fg'] = config.clr_fg_rgb
+        self.set_uniform(self.compute_shader, 'clr_fg', config.clr_fg_rgb)
+
+    @staticmethod
+    def set_uniform(program, name: str, value) -> None:
+        """set a uniform of a program, if the program uses it (unused uniforms are optimized away)"""
+        if program is not None and program.get(name, None) is not None:
+            program[name] = value
+
+    @staticmethod
+    def compute_shader_defines(group_size: tuple) -> dict:
+        """the defines of the compute shader"""
+        return {
+            'destText': 0,
+            **group_size_defines(group_size)
+        }
+
+    def precompile_programs(self, shader_dir: str) -> None:
+        """queue the programs of a shader directory in the program cache (the ones that it will be rendered with)"""
+        if TextureShaderConfig(self.resource_dir / shader_dir).stateless:
+            self.programs.precompile_program(f'{shader_dir}/vertex_shader.glsl',
+                                             f'{shader_dir}/direct_fragment_shader.glsl')
+            return
+
+        self.programs.precompile_program(f'{shader_dir}/vertex_shader.glsl', f'{shader_dir}/fragment_shader.glsl')
+        self.programs.precompile_compute_shader(f'{shader_dir}/compute_shader.glsl',
+                                                self.compute_shader_defines(self.group_size))
 
     # ----------
     # rendering
     # ----------
 
     def render(self, time: float, frame_time: float) -> None:
-        """called every frame - render everything"""
-        self.render_simulation_frame(time)
-        self.render_ui_frame()
+        """called every frame - render everything (a minimized window only sleeps)"""
+        if self.minimized or min(self.wnd.buffer_size) == 0:
+            self.pacer.skip_frame()
+            sleep(self.minimized_frame_interval)
+            return
+
+        self.pacer.begin_frame(frame_time)
+        if self.programs.precompile_next():
+            self.pacer.mark('shader precompile')
+
+        # the time of the shaders stands still while they are paused
+        if not self.paused:
+            self.shader_time += frame_time
+            self.dirty |= self.shader_config.animated
+
+        with self.profiler.cpu('frame'):
+            self.render_simulation_frame(self.shader_time)
+            with self.profiler.cpu('ui'):
+                self.render_ui_frame()
+        self.profiler.end_frame()
+        self.profiler.enabled = self.show_performance
+        self.metrics.record('frame', frame_time=frame_time)
+        self.pacer.end_frame()  # sleeps if the frame rate is capped
 
     # ----------
     # rendering: simulation
@@ -97,20 +241,29 @@ class TextureShaderWindow(WindowConfig):
         # clear screen (background color)
         self.ctx.clear(*config.clr_bg_rgb)
 
-        # pass the time to the compute shader
-        try:
-            self.compute_shader['time'] = time
-        except Exception as e:
-            logger.exception(e)
-
-        # automatically binds as a GL_R32F / r32f (read from the texture)
-        self.displayed_texture.bind_to_image(0, read=True, write=True)
-        # run the compute shader and let it compute a value for EVERY GODDAMN PIXEL
-        self.compute_shader.run(self.texture_dimensions[0], self.texture_dimensions[1], 1)
-
-        # render texture
-        self.displayed_texture.use(location=0)
-        self.quad_fs.render(self.texture_renderer)
+        if self.shader_config.stateless:  # a single pass straight into the framebuffer
+            self.set_uniform(self.direct_renderer, 'time', time)
+            with self.profiler.gpu('direct'):
+                self.quad_fs.render(self.direct_renderer)
+        else:
+            if self.dirty:  # only if the time, a uniform or the size has changed
+                self.set_uniform(self.compute_shader, 'time', time)
+
+                # automatically binds as a GL_R32F / r32f (read from the texture)
+                self.displayed_texture.bind_to_image(0, read=True, write=True)
+                # run the compute shader and let it compute a value for EVERY GODDAMN PIXEL
+                with self.profiler.gpu('compute'):
+                    self.compute_shader.run(*group_count(self.texture_dimensions, self.group_size), 1)
+                self.dirty = False
+                self.dispatches += 1
+
+            # render texture
+            self.displayed_texture.use(location=0)
+            with self.profiler.gpu('quad'):
+                self.quad_fs.render(self.texture_renderer)
+
+        # record the frame before the ui is rendered on top of it
+        self.recorder.capture_frame()
 
     # ----------
     # rendering: imgui ui
@@ -125,6 +278,16 @@ class TextureShaderWindow(WindowConfig):
         if imgui.begin('COMPUTE SHADERS'):
             imgui.push_item_width(imgui.get_window_width() * 0.75)  # max item with: 75% of the window from the left
 
+            _, self.show_performance = imgui.checkbox('Show performance', self.show_performance)
+            _, self.show_frame_pacing = imgui.checkbox('Show frame pacing', self.show_frame_pacing)
+            _, self.paused = imgui.checkbox('Pause', self.paused)
+
+            width, height = self.texture_dimensions
+            if self.shader_config.stateless:
+                imgui.text(f'stateless: rendered directly, {width}x{height}')
+            else:
+                imgui.text(f'stateful: {width}x{height} texture, computed {self.dispatches} times')
+
             visible = True
             expanded, visible = imgui.collapsing_header('Select a compute shader.', visible)
             if expanded:  # create a button for every available compute shader
@@ -133,21 +296,7 @@ class TextureShaderWindow(WindowConfig):
                         if config.most_recent_shader_directory != shader_dir:  # change the most recent shader dir
                             config.most_recent_shader_directory = shader_dir   # to the selected shader dir
 
-                        # textured quad rendering
-                        self.texture_renderer = self.load_program(
-                            vertex_shader=f'{shader_dir}/vertex_shader.glsl',
-                            fragment_shader=f'{shader_dir}/fragment_shader.glsl'
-                        )
-
-                        # compute shader
-                        self.compute_shader = self.load_compute_shader(
-                            f'{shader_dir}/compute_shader.glsl',
-                            defines={
-                                'destText': 0
-                            }
-                        )
-                        # clr_fg needs to be passed to the compute shader initially, because it is a uniform
-                        self.compute_shader['clr_fg'] = config.clr_fg_rgb
+                        self.load_programs(shader_dir)
 
             imgui.pop_item_width()
             imgui.end()  # close current window context
@@ -161,8 +310,11 @@ class TextureShaderWindow(WindowConfig):
                 "fg", *config.clr_fg_rgb
             )
             imgui.end_child()
-            if changed:  # pass the new value to the compute shader
-                self.compute_shader['clr_fg'] = config.clr_fg_rgb
+            if changed:  # pass the new value to the shaders
+                self.pacer.mark('color change')
+                self.set_uniform(self.compute_shader, 'clr_fg', config.clr_fg_rgb)
+                self.set_uniform(self.direct_renderer, 'clr_fg', config.clr_fg_rgb)
+                self.dirty = True
 
             imgui.dummy(0, 5)  # spacing
 
@@ -176,13 +328,26 @@ class TextureShaderWindow(WindowConfig):
             imgui.pop_item_width()
             imgui.end()
 
+        if render_capture_window(self.recorder):
+            self.pacer.mark('capture start')
+
+        if self.show_performance:
+            self.show_performance = render_performance_window(
+                self.profiler, self.profile_directory, 'texture_shader_window'
+            )
+        if self.show_frame_pacing:
+            self.show_frame_pacing = render_frame_pacing_window(
+                self.pacer, config, self.profile_directory, 'texture_shader_window'
+            )
+
         # close imgui frame context
         imgui.end_frame()
 
         # pass all drawing commands to the rendering pipeline:
         #   render imgui elements and display them in the moderngl-window window
         imgui.render()
-        self.imgui_renderer.render(imgui.get_draw_data())
+        with self.profiler.gpu('ui'):
+            self.imgui_renderer.render(imgui.get_draw_data())
 
     # ----------
     # ui events
@@ -213,11 +378,26 @@ class TextureShaderWindow(WindowConfig):
         self.imgui_renderer.unicode_char_entered(char)
 
     def resize(self, width: int, height: int) -> None:
-        """forward resize event to imgui"""
+        """forward resize event to imgui, the texture follows the size of the window"""
+        self.pacer.mark('resize')
         self.imgui_renderer.resize(width, height)
+        self.recorder.resize()
+
+        if min(self.wnd.buffer_size) > 0 and self.wnd.buffer_size != self.texture_dimensions:  # not minimized
+            self.texture_dimensions = self.wnd.buffer_size
+            if self.displayed_texture is not None:
+                self.create_texture()
+
+    def iconify(self, iconified: bool) -> None:
+        """nothing is rendered while the window is minimized"""
+        self.minimized = iconified
 
     def close(self):
-        """write changes to the config file when the window is closed"""
+        """stop recording and write changes to the config file when the window is closed"""
+        self.recorder.stop()
+        self.profiler.release()
+        self.programs.release()
+
         config.save()
 
 